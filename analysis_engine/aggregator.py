@@ -4,7 +4,7 @@ Updated to handle the new structured output format with titles,
 suggested fixes, references, and the enhanced finding categories.
 """
 
-from typing import Dict, List, Any, Optional
+from typing import Dict, Iterable, List, Any, Optional
 from models import Finding
 
 
@@ -39,6 +39,31 @@ class ReviewAggregator:
 
     # ── finding creation ────────────────────────────────────────────────
 
+    def combine_pass_results(
+        self,
+        pass_results: Dict[str, Dict[str, Any]],
+        exclude: Iterable[Dict[str, Any]] = (),
+    ) -> Dict[str, Any]:
+        """Merge the per-pass LLM results into one ``build_finding_rows`` input.
+
+        ``findings`` is the concatenation of every pass's findings, minus
+        the ``exclude`` objects (matched by identity — e.g. carried-over
+        findings that were folded into the results for scoring and are
+        stored separately). The legacy keys (missing_features,
+        vulnerabilities, ...) are taken from whichever pass produced them.
+        """
+        skip = {id(f) for f in exclude}
+        combined: Dict[str, Any] = {}
+        findings: List[Dict[str, Any]] = []
+        for result in pass_results.values():
+            for key, value in result.items():
+                if isinstance(value, list):
+                    value = [item for item in value if id(item) not in skip]
+                combined[key] = value
+            findings.extend(f for f in result.get("findings", []) if id(f) not in skip)
+        combined["findings"] = findings
+        return combined
+
     def create_findings_from_structured(
         self,
         review_id: int,
@@ -49,67 +74,69 @@ class ReviewAggregator:
         Each LLM review method now returns a `findings` list with
         full structured objects (title, description, suggested_fix, etc.).
         """
-        findings: List[Finding] = []
-
-        # Collect findings from all review results
-        all_findings = llm_results.get("findings", [])
-
-        for f in all_findings:
-            finding = Finding(
-                review_id=review_id,
-                category=f.get("category", "code_quality"),
-                severity=f.get("severity", "medium"),
-                title=f.get("title", ""),
-                description=f.get("description", ""),
-                file_path=self._extract_file(f.get("file_path", "")),
-                line_number=self._extract_line(f),
-                confidence_score=float(f.get("confidence_score", 0.7)),
-                code_snippet=f.get("code_snippet", ""),
-                suggestion=f.get("suggested_fix", f.get("suggestion", "")),
-                suggested_fix=f.get("suggested_fix", ""),
-                references=f.get("references", []),
-            )
-            findings.append(finding)
-
-        return findings
+        return [
+            Finding(**self._structured_row(review_id, f))
+            for f in llm_results.get("findings", [])
+        ]
 
     def create_findings(
         self,
         review_id: int,
         llm_results: dict,
         static_results: dict,
+        diff_index=None,
     ) -> List[Finding]:
         """Convert analysis results to database findings.
 
         Supports both the legacy format and the new structured format.
         """
-        findings: List[Finding] = []
+        return [
+            Finding(**row)
+            for row in self.build_finding_rows(review_id, llm_results, static_results, diff_index)
+        ]
+
+    def build_finding_rows(
+        self,
+        review_id: int,
+        llm_results: dict,
+        static_results: dict,
+        diff_index=None,
+    ) -> List[Dict[str, Any]]:
+        """Convert analysis results to plain Finding column mappings.
+
+        Same conversion as `create_findings`, but without building ORM
+        instances, so callers can persist every row in a single
+        executemany-style INSERT.
+
+        With a ``diff_index`` (analysis_engine.diff_index.DiffIndex), line
+        numbers for files in the diff are snapped onto changed lines, so
+        missing (0) or out-of-hunk lines still point at the change.
+
+        Local scanner issues in ``static_results["issues"]`` become rows
+        too, except where an LLM finding already covers the same
+        (file, line, category).
+        """
+        rows: List[Dict[str, Any]] = []
 
         # ── New structured findings (from upgraded templates) ──
-        for key in ("findings",):
-            for f in llm_results.get(key, []):
-                if isinstance(f, dict) and "title" in f:
-                    finding = Finding(
-                        review_id=review_id,
-                        category=f.get("category", "code_quality"),
-                        severity=f.get("severity", "medium"),
-                        title=f.get("title", ""),
-                        description=f.get("description", ""),
-                        file_path=self._extract_file(f.get("file_path", "")),
-                        line_number=self._extract_line(f),
-                        confidence_score=float(f.get("confidence_score", 0.7)),
-                        code_snippet=f.get("code_snippet", ""),
-                        suggestion=f.get("suggested_fix", f.get("suggestion", "")),
-                        suggested_fix=f.get("suggested_fix", ""),
-                        references=f.get("references", []),
-                    )
-                    findings.append(finding)
+        # Structured vulnerabilities / performance issues are normally the
+        # same objects as the pass's findings; any that aren't are kept too
+        structured = [f for f in llm_results.get("findings", []) if isinstance(f, dict)]
+        listed = {id(f) for f in structured}
+        for key in ("vulnerabilities", "performance_issues"):
+            structured.extend(
+                f for f in llm_results.get(key, [])
+                if isinstance(f, dict) and "title" in f and id(f) not in listed
+            )
+        for f in structured:
+            if "title" in f:
+                rows.append(self._structured_row(review_id, f))
 
         # ── Legacy: missing_features ──
         for feature in llm_results.get("missing_features", []):
             if isinstance(feature, dict) and "title" not in feature:
-                finding = Finding(
-                    review_id=review_id,
+                rows.append(self._row(
+                    review_id,
                     category="requirement_drift",
                     severity="high",
                     title=f"Missing: {feature.get('requirement', 'Unknown')}",
@@ -117,14 +144,13 @@ class ReviewAggregator:
                     file_path="",
                     line_number=0,
                     confidence_score=0.8,
-                )
-                findings.append(finding)
+                ))
 
         # ── Legacy: scope_creep ──
         for creep in llm_results.get("scope_creep", []):
             if isinstance(creep, dict):
-                finding = Finding(
-                    review_id=review_id,
+                rows.append(self._row(
+                    review_id,
                     category="requirement_drift",
                     severity="medium",
                     title=f"Scope creep: {creep.get('description', 'Unspecified')[:60]}",
@@ -132,14 +158,13 @@ class ReviewAggregator:
                     file_path=creep.get("code_location", creep.get("file_path", "")),
                     line_number=0,
                     confidence_score=0.7,
-                )
-                findings.append(finding)
+                ))
 
         # ── Legacy: vulnerabilities ──
         for vuln in llm_results.get("vulnerabilities", []):
             if isinstance(vuln, dict) and "title" not in vuln:
-                finding = Finding(
-                    review_id=review_id,
+                rows.append(self._row(
+                    review_id,
                     category="security",
                     severity=vuln.get("severity", "medium"),
                     title=f"Security: {vuln.get('type', 'vulnerability')}",
@@ -148,14 +173,13 @@ class ReviewAggregator:
                     line_number=self._extract_line_from_location(vuln.get("location", "")),
                     confidence_score=0.9,
                     suggested_fix=vuln.get("fix_suggestion", ""),
-                )
-                findings.append(finding)
+                ))
 
         # ── Legacy: performance_issues ──
         for perf in llm_results.get("performance_issues", []):
             if isinstance(perf, dict) and "title" not in perf:
-                finding = Finding(
-                    review_id=review_id,
+                rows.append(self._row(
+                    review_id,
                     category="performance",
                     severity="high",
                     title=f"Performance: {perf.get('issue_type', 'issue')}",
@@ -164,10 +188,52 @@ class ReviewAggregator:
                     line_number=self._extract_line_from_location(perf.get("location", "")),
                     confidence_score=0.85,
                     suggested_fix=perf.get("fix", ""),
-                )
-                findings.append(finding)
+                ))
+
+        if diff_index is not None:
+            for row in rows:
+                if row["file_path"]:
+                    row["line_number"] = diff_index.map_line(row["file_path"], row["line_number"])
 
-        return findings
+        # ── Local static scanner issues (already on added lines) ──
+        seen = {(row["file_path"], row["line_number"], row["category"]) for row in rows}
+        for issue in static_results.get("issues", []):
+            row = self._structured_row(review_id, issue)
+            key = (row["file_path"], row["line_number"], row["category"])
+            if key not in seen:
+                seen.add(key)
+                rows.append(row)
+
+        return rows
+
+    def _structured_row(self, review_id: int, f: dict) -> Dict[str, Any]:
+        return self._row(
+            review_id,
+            category=f.get("category", "code_quality"),
+            severity=f.get("severity", "medium"),
+            title=f.get("title", ""),
+            description=f.get("description", ""),
+            file_path=self._extract_file(f.get("file_path", "")),
+            line_number=self._extract_line(f),
+            confidence_score=float(f.get("confidence_score", 0.7)),
+            code_snippet=f.get("code_snippet", ""),
+            suggestion=f.get("suggested_fix", f.get("suggestion", "")),
+            suggested_fix=f.get("suggested_fix", ""),
+            references=f.get("references", []),
+        )
+
+    @staticmethod
+    def _row(review_id: int, **columns: Any) -> Dict[str, Any]:
+        """Full column mapping, so every row in a bulk INSERT has the same keys."""
+        row = {
+            "review_id": review_id,
+            "code_snippet": None,
+            "suggestion": None,
+            "suggested_fix": None,
+            "references": None,
+        }
+        row.update(columns)
+        return row
 
     # ── helpers ─────────────────────────────────────────────────────────
 
@@ -0,0 +1,412 @@
+"""Single-pass, pluggable AST metrics.
+
+``MetricsEngine`` walks a tree once. For every node it calls the handlers
+that metric plugins registered for the node's type (or any of its base
+classes, e.g. ``ast.stmt``). The engine tracks what every metric needs to
+know about a node's position:
+
+  * ``scope``: the innermost function's ``FunctionMetrics`` record (or the
+    module record for top-level code). Each metric is attributed to
+    exactly one scope, so file totals are plain sums.
+  * ``depth``: block nesting within that scope (an ``if`` body is one
+    deeper than the ``if``; ``elif`` chains stay level).
+  * ``logic``: the nesting level used by cognitive complexity. It counts
+    branches, loops, ``except``, ``match`` and lambdas, but not
+    ``try``/``with``.
+
+Each plugin fills ``scope.values`` in ``finish`` and may add file-level
+figures in ``totals``. Results come back per function, with file totals
+alongside.
+"""
+
+import ast
+import math
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+_FUNCTION_NODES = (ast.FunctionDef, ast.AsyncFunctionDef)
+
+# Node type -> fields whose children sit one block deeper
+_NESTED_FIELDS: Dict[type, Tuple[str, ...]] = {
+    ast.If: ("body", "orelse"),
+    ast.For: ("body", "orelse"),
+    ast.AsyncFor: ("body", "orelse"),
+    ast.While: ("body", "orelse"),
+    ast.Try: ("body", "orelse", "finalbody"),
+    ast.ExceptHandler: ("body",),
+    ast.With: ("body",),
+    ast.AsyncWith: ("body",),
+    ast.ClassDef: ("body",),
+    ast.Lambda: ("body",),
+}
+if hasattr(ast, "TryStar"):  # Python 3.11+
+    _NESTED_FIELDS[ast.TryStar] = ("body", "orelse", "finalbody")
+if hasattr(ast, "Match"):  # Python 3.10+
+    _NESTED_FIELDS[ast.Match] = ("cases",)
+    _NESTED_FIELDS[ast.match_case] = ("body",)
+
+# Nodes that also raise the cognitive-complexity nesting level
+_LOGIC_NESTING = {ast.If, ast.For, ast.AsyncFor, ast.While, ast.ExceptHandler, ast.Lambda}
+if hasattr(ast, "Match"):
+    _LOGIC_NESTING.add(ast.Match)
+
+
+def _is_elif_chain(node: ast.If) -> bool:
+    return len(node.orelse) == 1 and isinstance(node.orelse[0], ast.If)
+
+
+class FunctionMetrics:
+    """Metrics of one function (or of a file's top-level code)."""
+
+    __slots__ = ("name", "qualname", "line", "end_line", "values", "state")
+
+    def __init__(self, name: str, qualname: str, line: int = 0, end_line: int = 0):
+        self.name = name
+        self.qualname = qualname
+        self.line = line
+        self.end_line = end_line
+        self.values: Dict[str, Any] = {}
+        self.state: Dict[str, Any] = {}  # per-plugin scratch space
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"name": self.qualname, "line": self.line, "end_line": self.end_line, **self.values}
+
+
+class Context:
+    """Position of the node being handled (one instance, updated per node)."""
+
+    __slots__ = ("scope", "depth", "logic", "is_elif")
+
+    def __init__(self):
+        self.scope: Optional[FunctionMetrics] = None
+        self.depth = 0
+        self.logic = 0
+        self.is_elif = False
+
+
+class MetricPlugin:
+    """Base class for metrics; override what you need."""
+
+    def handlers(self) -> Dict[type, Callable[[ast.AST, Context], None]]:
+        """Node type (or base class) -> handler."""
+        return {}
+
+    def begin(self, scope: FunctionMetrics) -> None:
+        pass
+
+    def finish(self, scope: FunctionMetrics) -> None:
+        pass
+
+    def totals(self, module: FunctionMetrics, functions: List[FunctionMetrics]) -> Dict[str, Any]:
+        return {}
+
+
+class CyclomaticComplexity(MetricPlugin):
+    """McCabe complexity: 1 + decision points per scope."""
+
+    def handlers(self):
+        branch = lambda node, ctx: self._add(ctx, 1)
+        table = {
+            ast.If: branch, ast.IfExp: branch, ast.For: branch, ast.AsyncFor: branch,
+            ast.While: branch, ast.ExceptHandler: branch,
+            ast.BoolOp: lambda node, ctx: self._add(ctx, len(node.values) - 1),
+            ast.comprehension: lambda node, ctx: self._add(ctx, 1 + len(node.ifs)),
+        }
+        if hasattr(ast, "match_case"):
+            table[ast.match_case] = self._case
+        return table
+
+    @staticmethod
+    def _add(ctx: Context, n: int) -> None:
+        ctx.scope.state["cc"] += n
+
+    def _case(self, node, ctx):
+        # An unguarded `case _:` is the fall-through, not a branch
+        wildcard = isinstance(node.pattern, ast.MatchAs) and node.pattern.pattern is None
+        if node.guard is not None or not wildcard:
+            self._add(ctx, 1)
+
+    def begin(self, scope):
+        scope.state["cc"] = 1
+
+    def finish(self, scope):
+        scope.values["cyclomatic_complexity"] = scope.state["cc"]
+
+    def totals(self, module, functions):
+        scopes = [module] + functions
+        return {"cyclomatic_complexity": 1 + sum(s.state["cc"] - 1 for s in scopes)}
+
+
+class CognitiveComplexity(MetricPlugin):
+    """Cognitive complexity: structures cost 1 plus their nesting level."""
+
+    def handlers(self):
+        nested = lambda node, ctx: self._add(ctx, 1 + ctx.logic)
+        table = {
+            ast.If: self._if, ast.IfExp: nested, ast.ExceptHandler: nested,
+            ast.For: self._loop, ast.AsyncFor: self._loop, ast.While: self._loop,
+            # Each run of like boolean operators costs 1
+            ast.BoolOp: lambda node, ctx: self._add(ctx, 1),
+            ast.comprehension: lambda node, ctx: self._add(ctx, len(node.ifs)),
+        }
+        if hasattr(ast, "Match"):
+            table[ast.Match] = nested
+        return table
+
+    @staticmethod
+    def _add(ctx: Context, n: int) -> None:
+        ctx.scope.state["cognitive"] += n
+
+    def _if(self, node, ctx):
+        self._add(ctx, 1 if ctx.is_elif else 1 + ctx.logic)
+        if node.orelse and not _is_elif_chain(node):
+            self._add(ctx, 1)
+
+    def _loop(self, node, ctx):
+        self._add(ctx, 1 + ctx.logic + (1 if node.orelse else 0))
+
+    def begin(self, scope):
+        scope.state["cognitive"] = 0
+
+    def finish(self, scope):
+        scope.values["cognitive_complexity"] = scope.state["cognitive"]
+
+    def totals(self, module, functions):
+        return {"cognitive_complexity": sum(s.state["cognitive"] for s in [module] + functions)}
+
+
+class NestingDepth(MetricPlugin):
+    """Deepest block nesting of any statement in the scope."""
+
+    def handlers(self):
+        return {ast.stmt: self._stmt}
+
+    @staticmethod
+    def _stmt(node, ctx):
+        if ctx.depth > ctx.scope.state["nesting"]:
+            ctx.scope.state["nesting"] = ctx.depth
+
+    def begin(self, scope):
+        scope.state["nesting"] = 0
+
+    def finish(self, scope):
+        scope.values["nesting_depth"] = scope.state["nesting"]
+
+    def totals(self, module, functions):
+        return {"nesting_depth": max(s.state["nesting"] for s in [module] + functions)}
+
+
+class LinesOfCode(MetricPlugin):
+    """Statement counts and line spans (source lines covered by code)."""
+
+    def handlers(self):
+        return {ast.stmt: self._stmt}
+
+    @staticmethod
+    def _stmt(node, ctx):
+        state = ctx.scope.state
+        state["statements"] += 1
+        lines = state.get("lines")
+        if lines is not None:
+            lines.update(range(node.lineno, (getattr(node, "end_lineno", None) or node.lineno) + 1))
+
+    def begin(self, scope):
+        scope.state["statements"] = 0
+        if not scope.line:
+            # Top-level code: count the lines its statements cover
+            scope.state["lines"] = set()
+
+    def finish(self, scope):
+        scope.values["statements"] = scope.state["statements"]
+        lines = scope.state.get("lines")
+        scope.values["loc"] = len(lines) if lines is not None else scope.end_line - scope.line + 1
+
+    def totals(self, module, functions):
+        return {
+            "loc": module.values["loc"],
+            "statements": sum(s.state["statements"] for s in [module] + functions),
+        }
+
+
+class HalsteadCounts(MetricPlugin):
+    """Halstead operator/operand counts and the measures derived from them."""
+
+    def handlers(self):
+        return {
+            ast.operator: self._operator, ast.unaryop: self._operator,
+            ast.boolop: self._operator, ast.cmpop: self._operator,
+            ast.Name: lambda node, ctx: self._operand(ctx, node.id),
+            ast.arg: lambda node, ctx: self._operand(ctx, node.arg),
+            ast.Constant: lambda node, ctx: self._operand(ctx, repr(node.value)[:64]),
+        }
+
+    @staticmethod
+    def _operator(node, ctx):
+        state = ctx.scope.state
+        state["operators"].add(type(node).__name__)
+        state["total_operators"] += 1
+
+    @staticmethod
+    def _operand(ctx, value):
+        state = ctx.scope.state
+        state["operands"].add(value)
+        state["total_operands"] += 1
+
+    def begin(self, scope):
+        scope.state.update(operators=set(), operands=set(), total_operators=0, total_operands=0)
+
+    @staticmethod
+    def _measures(n1: int, n2: int, big_n1: int, big_n2: int) -> Dict[str, Any]:
+        vocabulary = n1 + n2
+        volume = (big_n1 + big_n2) * math.log2(vocabulary) if vocabulary > 1 else 0.0
+        difficulty = (n1 / 2) * (big_n2 / n2) if n2 else 0.0
+        return {
+            "distinct_operators": n1,
+            "distinct_operands": n2,
+            "total_operators": big_n1,
+            "total_operands": big_n2,
+            "volume": round(volume, 2),
+            "difficulty": round(difficulty, 2),
+            "effort": round(volume * difficulty, 2),
+        }
+
+    def finish(self, scope):
+        s = scope.state
+        scope.values["halstead"] = self._measures(
+            len(s["operators"]), len(s["operands"]), s["total_operators"], s["total_operands"]
+        )
+
+    def totals(self, module, functions):
+        scopes = [module] + functions
+        operators = set().union(*(s.state["operators"] for s in scopes))
+        operands = set().union(*(s.state["operands"] for s in scopes))
+        return {"halstead": self._measures(
+            len(operators), len(operands),
+            sum(s.state["total_operators"] for s in scopes),
+            sum(s.state["total_operands"] for s in scopes),
+        )}
+
+
+class ImportFanOut(MetricPlugin):
+    """Distinct modules imported (relative imports keep their dots)."""
+
+    def handlers(self):
+        return {ast.Import: self._import, ast.ImportFrom: self._import_from}
+
+    @staticmethod
+    def _import(node, ctx):
+        ctx.scope.state["imports"].update(alias.name for alias in node.names)
+
+    @staticmethod
+    def _import_from(node, ctx):
+        ctx.scope.state["imports"].add("." * (node.level or 0) + (node.module or ""))
+
+    def begin(self, scope):
+        scope.state["imports"] = set()
+
+    def finish(self, scope):
+        scope.values["import_fan_out"] = len(scope.state["imports"])
+
+    def totals(self, module, functions):
+        return {"import_fan_out": len(set().union(*(s.state["imports"] for s in [module] + functions)))}
+
+
+def default_plugins() -> List[MetricPlugin]:
+    return [CyclomaticComplexity(), CognitiveComplexity(), NestingDepth(),
+            LinesOfCode(), HalsteadCounts(), ImportFanOut()]
+
+
+class FileMetrics:
+    """Per-function records plus file totals from one engine run."""
+
+    __slots__ = ("module", "functions", "totals")
+
+    def __init__(self, module: FunctionMetrics, functions: List[FunctionMetrics], totals: Dict[str, Any]):
+        self.module = module
+        self.functions = functions
+        self.totals = totals
+
+    def summary(self) -> Dict[str, Any]:
+        """File totals plus ``function_count`` and the per-function records."""
+        return {
+            **self.totals,
+            "function_count": len(self.functions),
+            "functions": [f.as_dict() for f in self.functions],
+        }
+
+
+class MetricsEngine:
+    """Runs every plugin over a tree in a single traversal."""
+
+    def __init__(self, plugins: Optional[List[MetricPlugin]] = None):
+        self.plugins = plugins if plugins is not None else default_plugins()
+        self._registered = [(node_type, handler)
+                            for plugin in self.plugins
+                            for node_type, handler in plugin.handlers().items()]
+        self._dispatch: Dict[type, List[Callable]] = {}
+
+    def _handlers_for(self, node_type: type) -> List[Callable]:
+        handlers = self._dispatch.get(node_type)
+        if handlers is None:
+            handlers = [h for t, h in self._registered if issubclass(node_type, t)]
+            self._dispatch[node_type] = handlers
+        return handlers
+
+    def _new_scope(self, name: str, qualname: str, line: int = 0, end_line: int = 0) -> FunctionMetrics:
+        scope = FunctionMetrics(name, qualname, line, end_line)
+        for plugin in self.plugins:
+            plugin.begin(scope)
+        return scope
+
+    def run(self, tree: ast.Module) -> FileMetrics:
+        return self.run_nodes((node, "") for node in tree.body)
+
+    def run_nodes(self, nodes: Iterable[Tuple[ast.AST, str]]) -> FileMetrics:
+        """Measure top-level ``(node, qualname prefix)`` pairs as one file."""
+        module = self._new_scope("<module>", "<module>")
+        functions: List[FunctionMetrics] = []
+        ctx = Context()
+
+        # (node, scope, depth, logic, qualname prefix, is_elif); popped in source order
+        stack = [(node, module, 0, 0, prefix, False) for node, prefix in nodes]
+        stack.reverse()
+        while stack:
+            node, scope, depth, logic, prefix, is_elif = stack.pop()
+            ctx.scope, ctx.depth, ctx.logic, ctx.is_elif = scope, depth, logic, is_elif
+            for handler in self._handlers_for(type(node)):
+                handler(node, ctx)
+
+            if isinstance(node, _FUNCTION_NODES):
+                qualname = f"{prefix}{node.name}"
+                scope = self._new_scope(node.name, qualname, node.lineno,
+                                        getattr(node, "end_lineno", None) or node.lineno)
+                functions.append(scope)
+                prefix, depth, logic = f"{qualname}.", 0, 0
+                nested_fields: Tuple[str, ...] = ()
+            else:
+                nested_fields = _NESTED_FIELDS.get(type(node), ())
+                if isinstance(node, ast.ClassDef):
+                    prefix = f"{prefix}{node.name}."
+            bump = 1 if type(node) in _LOGIC_NESTING else 0
+            elif_chain = isinstance(node, ast.If) and _is_elif_chain(node)
+
+            children = []
+            for field, value in ast.iter_fields(node):
+                if elif_chain and field == "orelse":
+                    # The elif sits at the same level as its `if`
+                    children.append((value[0], scope, depth, logic, prefix, True))
+                    continue
+                nested = field in nested_fields
+                child_depth = depth + 1 if nested else depth
+                child_logic = logic + bump if nested else logic
+                for child in value if isinstance(value, list) else (value,):
+                    if isinstance(child, ast.AST):
+                        children.append((child, scope, child_depth, child_logic, prefix, False))
+            stack.extend(reversed(children))
+
+        for scope in [module] + functions:
+            for plugin in self.plugins:
+                plugin.finish(scope)
+        totals: Dict[str, Any] = {}
+        for plugin in self.plugins:
+            totals.update(plugin.totals(module, functions))
+        return FileMetrics(module, functions, totals)
@@ -1,26 +1,61 @@
 import ast
+import hashlib
 import re
-from typing import Dict, List, Any
+from bisect import bisect_left
+from typing import Dict, List, Any, Optional, Set, Tuple, Union
+from analysis_engine.diff_index import DiffIndex, FileDiff, parse_diff
+from analysis_engine.ast_metrics import MetricsEngine, default_plugins
+from analysis_engine.security_scanner import SecurityRules, dedup_issues, issues_from_hits, scan_lines
+from analysis_engine.source_cache import ASTCache, FileVersions, blob_sha
 
 class CodeAnalyzer:
-    """Analyze code changes for various metrics"""
+    """Analyze code changes for various metrics
+
+    Every source is parsed through ``ast_cache`` (keyed by blob SHA), so
+    the symbol diff and the complexity pass share one tree per revision.
+    """
     
-    def analyze_diff(self, diff_text: str) -> Dict[str, Any]:
-        """Analyze code diff for structural changes"""
+    def __init__(self, ast_cache: Optional[ASTCache] = None, engine: Optional[MetricsEngine] = None):
+        self.ast_cache = ast_cache if ast_cache is not None else ASTCache()
+        # The security rules ride along in the metrics traversal
+        self.engine = engine if engine is not None else MetricsEngine(default_plugins() + [SecurityRules()])
+        
+    def parse(self, source: str, sha: Optional[str] = None, filename: str = "<unknown>") -> Optional[ast.Module]:
+        """Parsed module for ``source`` (cached), or None if it doesn't parse"""
+        return self.ast_cache.parse(sha, source, filename)
+        
+    def head_tree(self, versions: Optional[FileVersions]) -> Optional[ast.Module]:
+        """Parsed head revision of a changed file, if available"""
+        if versions is None or versions.head is None:
+            return None
+        return self.parse(versions.head, versions.head_sha, versions.path)
+        
+    def analyze_diff(self, diff: Union[str, DiffIndex],
+                     sources: Optional[Dict[str, FileVersions]] = None) -> Dict[str, Any]:
+        """Analyze code diff for structural changes
+
+        ``sources`` maps filenames to their base/head contents. Python files
+        found there are compared symbol by symbol with ``ast``; anything
+        else falls back to scanning the added lines for new ``def``s.
+        """
         analysis = {
             "functions_added": [],
             "functions_modified": [],
             "functions_removed": [],
             "dependencies_changed": [],
+            "parse_errors": [],
             "complexity_metrics": {}
         }
         
-        # Parse diff to identify changes
-        files = self._parse_diff(diff_text)
+        # Parse diff to identify changes (callers normally pass the shared index)
+        index = diff if isinstance(diff, DiffIndex) else parse_diff(diff)
+        sources = sources or {}
         
-        for file in files:
+        for file_diff in index:
             # Analyze each file
-            file_analysis = self._analyze_file(file)
+            file_analysis, parse_error = self._file_symbols(file_diff, sources.get(file_diff.filename))
+            if parse_error is not None:
+                analysis["parse_errors"].append({"file": file_diff.filename, "error": parse_error})
             analysis["functions_added"].extend(file_analysis["functions_added"])
             analysis["functions_modified"].extend(file_analysis["functions_modified"])
             analysis["functions_removed"].extend(file_analysis["functions_removed"])
@@ -28,31 +63,58 @@ class CodeAnalyzer:
             
         return analysis
         
-    def _parse_diff(self, diff_text: str) -> List[Dict]:
-        """Parse diff text into structured file changes"""
-        files = []
-        current_file = None
+    def analyze_file(self, file_diff: FileDiff, versions: Optional[FileVersions] = None) -> Dict[str, Any]:
+        """Symbol diff and changed-code complexity of one file
+
+        The unit of work for the static stage (analysis_engine.static_stage):
+        everything it needs is in the arguments and the result is plain data.
+        """
+        symbols, parse_error = self._file_symbols(file_diff, versions)
+        complexity = None
+        issues = []
+        if file_diff.filename.endswith(".py") and file_diff.added_text:
+            # Changed statements of the full head file; added lines as code
+            # only when the head isn't available or parseable
+            head_tree = self.head_tree(versions)
+            line_map = None
+            if head_tree is not None:
+                complexity = self.changed_code_complexity(file_diff, head_tree)
+            else:
+                added = file_diff.added_source()
+                if added.strip():
+                    complexity = self.calculate_complexity(added)
+                    line_map = file_diff.added_lines
+            hits = complexity.pop("security_issues", None) if complexity else None
+            if hits is not None:
+                issues = issues_from_hits(file_diff, hits, line_map)
+            issues += scan_lines(file_diff, python_ast=hits is not None)
+        else:
+            issues = scan_lines(file_diff)
+        return {
+            "file": file_diff.filename,
+            "symbols": symbols,
+            "parse_error": parse_error,
+            "complexity": complexity,
+            "issues": dedup_issues(issues),
+        }
         
-        for line in diff_text.split('\n'):
-            if line.startswith('--- a/'):
-                if current_file:
-                    files.append(current_file)
-                filename = line[6:]  # Remove '--- a/'
-                current_file = {
-                    "filename": filename,
-                    "changes": []
-                }
-            elif current_file and (line.startswith('+') or line.startswith('-')):
-                if not line.startswith('+++') and not line.startswith('---'):
-                    current_file["changes"].append(line)
-                    
-        if current_file:
-            files.append(current_file)
-            
-        return files
+    def _file_symbols(self, file_diff: FileDiff,
+                      versions: Optional[FileVersions]) -> Tuple[Dict[str, List], Optional[str]]:
+        """AST symbol diff when sources parse, else the regex fallback (plus the parse error)"""
+        if versions is not None and file_diff.filename.endswith(".py"):
+            symbols = self._diff_symbols(versions)
+            if symbols is not None:
+                return symbols, None
+            errors = [
+                self.ast_cache.error(sha or blob_sha(source))
+                for source, sha in ((versions.head, versions.head_sha), (versions.base, versions.base_sha))
+                if source is not None
+            ]
+            return self._analyze_file(file_diff), next((e for e in errors if e), "unparseable")
+        return self._analyze_file(file_diff), None
         
-    def _analyze_file(self, file_data: Dict) -> Dict[str, List]:
-        """Analyze a single file for changes"""
+    def _analyze_file(self, file_diff: FileDiff) -> Dict[str, List]:
+        """Regex fallback: new ``def``s among the added lines"""
         result = {
             "functions_added": [],
             "functions_modified": [],
@@ -60,65 +122,125 @@ class CodeAnalyzer:
             "dependencies_changed": []
         }
         
-        # This is a simplified analyzer - in practice, you'd use AST parsing
-        content = "\n".join([line[1:] for line in file_data["changes"] if line.startswith('+')])
-        
-        # Simple function detection
-        function_matches = re.findall(r'def\s+(\w+)\s*\(', content)
-        result["functions_added"] = function_matches
+        for lineno, text in zip(file_diff.added_lines, file_diff.added_text):
+            match = re.match(r'\s*(?:async\s+)?def\s+(\w+)\s*\(', text)
+            if match:
+                result["functions_added"].append(
+                    {"file": file_diff.filename, "name": match.group(1), "line": lineno}
+                )
         
         return result
         
-    def calculate_complexity(self, code: str) -> Dict[str, int]:
-        """Calculate code complexity metrics"""
-        try:
-            tree = ast.parse(code)
-            visitor = ComplexityVisitor()
-            visitor.visit(tree)
-            
-            return {
-                "cyclomatic_complexity": visitor.complexity,
-                "function_count": visitor.function_count,
-                "nesting_depth": visitor.max_nesting_depth
-            }
-        except:
-            return {
-                "cyclomatic_complexity": 0,
-                "function_count": 0,
-                "nesting_depth": 0
-            }
+    def _diff_symbols(self, versions: FileVersions) -> Optional[Dict[str, List]]:
+        """Added/removed/modified functions and imports between two revisions.
 
-class ComplexityVisitor(ast.NodeVisitor):
-    """AST visitor to calculate complexity metrics"""
-    
-    def __init__(self):
-        self.complexity = 1
-        self.function_count = 0
-        self.current_nesting = 0
-        self.max_nesting_depth = 0
+        A function counts as modified when the hash of its AST (which
+        ignores line numbers and formatting) differs. Returns None when a
+        side that exists doesn't parse.
+        """
+        trees = []
+        for source, sha in ((versions.base, versions.base_sha), (versions.head, versions.head_sha)):
+            tree = None
+            if source is not None:
+                tree = self.parse(source, sha, versions.path)
+                if tree is None:
+                    return None
+            trees.append(tree)
+        base = _symbol_table(trees[0]) if trees[0] is not None else ({}, set())
+        head = _symbol_table(trees[1]) if trees[1] is not None else ({}, set())
+        (base_funcs, base_imports), (head_funcs, head_imports) = base, head
+        path = versions.path
         
-    def visit_FunctionDef(self, node):
-        self.function_count += 1
-        self.generic_visit(node)
+        def _record(name, info):
+            return {"file": path, "name": name, "line": info[1], "end_line": info[2]}
         
-    def visit_If(self, node):
-        self.complexity += 1
-        self._handle_nested_structure(node)
-        
-    def visit_For(self, node):
-        self.complexity += 1
-        self._handle_nested_structure(node)
-        
-    def visit_While(self, node):
-        self.complexity += 1
-        self._handle_nested_structure(node)
+        return {
+            "functions_added": [
+                _record(name, info) for name, info in head_funcs.items() if name not in base_funcs
+            ],
+            "functions_modified": [
+                _record(name, info) for name, info in head_funcs.items()
+                if name in base_funcs and base_funcs[name][0] != info[0]
+            ],
+            "functions_removed": [
+                _record(name, info) for name, info in base_funcs.items() if name not in head_funcs
+            ],
+            "dependencies_changed": (
+                [{"file": path, "module": m, "change": "added"} for m in sorted(head_imports - base_imports)]
+                + [{"file": path, "module": m, "change": "removed"} for m in sorted(base_imports - head_imports)]
+            ),
+        }
         
-    def visit_Try(self, node):
-        self.complexity += 1
-        self._handle_nested_structure(node)
+    def calculate_complexity(self, code: Union[str, ast.AST]) -> Dict[str, Any]:
+        """Calculate code complexity metrics for source text or a parsed tree
+
+        File totals (cyclomatic/cognitive complexity, nesting, LOC, Halstead,
+        import fan-out) plus a record per function under ``functions``.
+        """
+        tree = self.parse(code) if isinstance(code, str) else code
+        if tree is None:
+            return {
+                "cyclomatic_complexity": 0,
+                "function_count": 0,
+                "nesting_depth": 0,
+                "functions": []
+            }
+        return self.engine.run(tree).summary()
         
-    def _handle_nested_structure(self, node):
-        self.current_nesting += 1
-        self.max_nesting_depth = max(self.max_nesting_depth, self.current_nesting)
-        self.generic_visit(node)
-        self.current_nesting -= 1
\ No newline at end of file
+    def changed_code_complexity(self, file_diff: FileDiff, tree: ast.Module) -> Dict[str, Any]:
+        """Complexity of the statements in ``tree`` that the diff adds lines to.
+
+        Works on the full head revision, so a changed line inside a function
+        is measured as part of the whole (parseable) function rather than as
+        a fragment. Methods are measured individually, not their whole class.
+        """
+        return self.engine.run_nodes(_touched_statements(tree.body, file_diff.added_lines)).summary()
+
+
+def _touched_statements(body: List[ast.stmt], added_lines, prefix: str = "") -> List[Tuple[ast.stmt, str]]:
+    """``(statement, qualname prefix)`` for statements of ``body`` spanning an added line.
+
+    Classes are recursed into, so only their touched members are returned.
+    """
+    touched = []
+    for node in body:
+        end = getattr(node, "end_lineno", None) or node.lineno
+        i = bisect_left(added_lines, node.lineno)
+        if i == len(added_lines) or added_lines[i] > end:
+            continue
+        if isinstance(node, ast.ClassDef):
+            touched.extend(_touched_statements(node.body, added_lines, f"{prefix}{node.name}."))
+        else:
+            touched.append((node, prefix))
+    return touched
+
+
+def _symbol_table(tree: ast.Module) -> Tuple[Dict[str, Tuple[str, int, int]], Set[str]]:
+    """``({qualname: (ast hash, line, end_line)}, {imported module})`` for a module."""
+    functions: Dict[str, Tuple[str, int, int]] = {}
+
+    def _walk(body, prefix):
+        for node in body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                name = f"{prefix}{node.name}"
+                digest = hashlib.sha1(ast.dump(node).encode("utf-8")).hexdigest()
+                functions[name] = (digest, node.lineno, getattr(node, "end_lineno", node.lineno))
+                _walk(node.body, f"{name}.")
+            elif isinstance(node, ast.ClassDef):
+                _walk(node.body, f"{prefix}{node.name}.")
+            elif isinstance(node, (ast.If, ast.Try, ast.With, ast.AsyncWith)):
+                # Conditionally defined functions (e.g. try/except ImportError)
+                for block in ("body", "orelse", "finalbody"):
+                    _walk(getattr(node, block, []) or [], prefix)
+                for handler in getattr(node, "handlers", []) or []:
+                    _walk(handler.body, prefix)
+
+    _walk(tree.body, "")
+
+    imports: Set[str] = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            imports.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            imports.add("." * (node.level or 0) + (node.module or ""))
+    return functions, imports
@@ -37,6 +37,16 @@ class ConfidenceScorer:
         (0, "CHANGES_REQUESTED"),
     ]
 
+    # Highest pass score an open finding of each severity allows
+    SEVERITY_SCORE_CAPS = {"critical": 30, "high": 50, "medium": 70, "low": 85}
+
+    # Finding category -> (pass, score key) it counts against
+    CARRIED_CATEGORIES = {
+        "security": ("security", "security_score"),
+        "performance": ("performance", "performance_score"),
+        "code_quality": ("quality", "quality_score"),
+    }
+
     # ── public API ──────────────────────────────────────────────────────
 
     def calculate_score(
@@ -57,7 +67,8 @@ class ConfidenceScorer:
         performance_result : dict   – output of LLMReviewer.review_performance
         static_result      : dict   – output of CodeAnalyzer.analyze_diff / complexity
         quality_result     : dict   – (optional) output of LLMReviewer code-quality review
-        diff_data          : dict   – (optional) raw diff info for test-file detection
+        diff_data          : dict   – (optional) raw diff info for test-file detection;
+                                      a "diff_index" (DiffIndex) is used when present
         """
         breakdown = {
             "requirement_alignment": self._score_requirement_alignment(requirement_result),
@@ -87,6 +98,50 @@ class ConfidenceScorer:
             "recommendation": recommendation,
         }
 
+    def merge_carried_findings(
+        self,
+        pass_results: Dict[str, Dict[str, Any]],
+        carried_findings: List[Dict[str, Any]],
+        previous_breakdown: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Dict[str, Any]]:
+        """Fold findings kept from unchanged files into an incremental run.
+
+        An incremental re-review only sends the changed files to the
+        security/performance/quality passes. Without this, a finding that
+        still stands in an unchanged file would stop counting against the
+        score. Each carried finding is added to its pass's findings and caps
+        that pass's score by severity (SEVERITY_SCORE_CAPS). The security
+        score also takes the worst of the new and previous ``security_safety``.
+        Requirement findings are skipped: that pass always sees the whole PR.
+
+        ``pass_results`` is keyed like LLMReviewer.review_all's result; a
+        new dict is returned and the inputs are left untouched.
+        """
+        merged = {name: dict(result) for name, result in pass_results.items()}
+        for finding in carried_findings:
+            target = self.CARRIED_CATEGORIES.get(finding.get("category"))
+            if target is None or target[0] not in merged:
+                continue
+            name, score_key = target
+            result = merged[name]
+            result["findings"] = list(result.get("findings", [])) + [finding]
+            if name == "security":
+                result["vulnerabilities"] = list(result.get("vulnerabilities", [])) + [finding]
+            elif name == "performance":
+                result["performance_issues"] = list(result.get("performance_issues", [])) + [finding]
+            cap = self.SEVERITY_SCORE_CAPS.get(finding.get("severity"), 100)
+            if score_key in result:
+                result[score_key] = min(int(result[score_key]), cap)
+            else:
+                result[score_key] = cap
+
+        carried_security = any(f.get("category") == "security" for f in carried_findings)
+        previous_security = (previous_breakdown or {}).get("security_safety")
+        if carried_security and previous_security is not None and "security" in merged:
+            sec = merged["security"]
+            sec["security_score"] = min(int(sec.get("security_score", 50)), int(previous_security))
+        return merged
+
     # ── private scorers ─────────────────────────────────────────────────
 
     def _score_requirement_alignment(self, result: Dict[str, Any]) -> int:
@@ -131,7 +186,8 @@ class ConfidenceScorer:
         if not diff_data:
             return 50  # unknown
 
-        files = diff_data.get("files_changed", [])
+        # Prefer the shared DiffIndex; fall back to pr_data's file list
+        files = diff_data.get("diff_index") or diff_data.get("files_changed", [])
         if not files:
             return 50
 
@@ -142,7 +198,9 @@ class ConfidenceScorer:
         total = len(files)
         test_files = sum(
             1 for f in files
-            if test_patterns.search(f if isinstance(f, str) else f.get("filename", ""))
+            if test_patterns.search(
+                f if isinstance(f, str) else f.get("filename", "") if isinstance(f, dict) else f.filename
+            )
         )
 
         if test_files == 0:
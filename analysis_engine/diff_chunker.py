@@ -0,0 +1,339 @@
+"""Split unified diffs into token-budgeted chunks for map-reduce review.
+
+Replaces head/tail truncation of large diffs: every file and hunk lands
+in some chunk, so the middle of a big PR is reviewed too. Splits happen
+at file boundaries first, then at hunk boundaries, and only as a last
+resort inside a hunk. Each piece of a split file repeats the file header
+so the LLM always knows which file it is looking at.
+
+The input is consumed line by line and chunking stops once
+``max_chunks`` is reached (remaining files are reported as skipped), so
+memory stays bounded by roughly ``max_chunks × max_tokens``.
+"""
+
+import io
+import re
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+
+# Rough chars-per-token ratio for code; good enough for budgeting.
+CHARS_PER_TOKEN = 4
+
+# Old/new line counts of a hunk; an omitted count means 1
+_HUNK_HEADER_RE = re.compile(r"^@@ -\d+(?:,(\d+))? \+\d+(?:,(\d+))? @@")
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class DiffChunk:
+    """One token-budgeted slice of a unified diff."""
+
+    __slots__ = ("files", "parts", "chars")
+
+    def __init__(self):
+        self.files: List[str] = []
+        self.parts: List[str] = []
+        self.chars = 0
+
+    def add(self, filename: str, text: str) -> None:
+        if filename not in self.files:
+            self.files.append(filename)
+        self.parts.append(text)
+        self.chars += len(text)
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+    @property
+    def tokens(self) -> int:
+        return self.chars // CHARS_PER_TOKEN + 1
+
+    def render(self, index: int, total: int) -> str:
+        """Chunk text, prefixed with a partial-view note when total > 1."""
+        if total <= 1:
+            return self.text
+        return (
+            f"[Diff chunk {index + 1}/{total} — files: {', '.join(self.files)}. "
+            "This is a partial view of a larger PR; other chunks are reviewed "
+            "separately. Only judge the code shown here.]\n\n"
+            + self.text
+        )
+
+
+class ChunkPlan:
+    """Result of chunking: the chunks plus any files that didn't fit."""
+
+    __slots__ = ("chunks", "skipped_files")
+
+    def __init__(self, chunks: List[DiffChunk], skipped_files: List[str]):
+        self.chunks = chunks
+        self.skipped_files = skipped_files
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+
+def iter_file_sections(diff_text: Union[str, Iterable[str]]) -> Iterator[Tuple[str, str, List[str]]]:
+    """Yield ``(filename, header, hunks)`` for each file in a unified diff.
+
+    Understands both ``git diff`` output and the ``--- a/ +++ b/`` form the
+    worker builds from per-file patches. ``diff_text`` may also be an
+    iterable of lines (e.g. a streamed HTTP body); each file is yielded as
+    soon as the next one starts.
+    """
+    filename = None
+    header: List[str] = []
+    hunks: List[str] = []
+    current_hunk: List[str] = []
+    in_header = False
+
+    def _flush():
+        if current_hunk:
+            hunks.append("".join(current_hunk))
+
+    for line, starts_file in _iter_lines(diff_text):
+        if starts_file:
+            _flush()
+            if filename is not None:
+                yield filename, "".join(header), hunks
+            filename = _filename_from_header(line)
+            header, hunks, current_hunk = [line], [], []
+            in_header = True
+            continue
+
+        if filename is None:
+            continue
+
+        if in_header and not line.startswith("@@"):
+            header.append(line)
+            if line.startswith("+++ "):
+                name = line[4:].strip()
+                if name.startswith("b/"):
+                    name = name[2:]
+                if name != "/dev/null":
+                    filename = name
+            continue
+
+        if line.startswith("@@"):
+            _flush()
+            current_hunk = [line]
+            in_header = False
+        else:
+            current_hunk.append(line)
+
+    _flush()
+    if filename is not None:
+        yield filename, "".join(header), hunks
+
+
+def _consume_hunk_line(line: str, old_left: int, new_left: int) -> Optional[Tuple[int, int]]:
+    """Remaining (old, new) hunk counts after ``line``, or None if it isn't a body line."""
+    kind = line[:1]
+    if kind == "-" and old_left > 0:
+        return old_left - 1, new_left
+    if kind == "+" and new_left > 0:
+        return old_left, new_left - 1
+    if kind == "\\" and (old_left or new_left):
+        return old_left, new_left  # "\ No newline at end of file"
+    if kind in (" ", "\n", "\r", "") and old_left > 0 and new_left > 0:
+        return old_left - 1, new_left - 1
+    return None
+
+
+def _iter_lines(diff_text: Union[str, Iterable[str]]) -> Iterator[Tuple[str, bool]]:
+    """Yield ``(line, starts_file)``.
+
+    Lines the current hunk's ``@@`` counts still expect are body lines,
+    so removed/added lines whose content begins with ``-- ``/``++ `` stay
+    in their hunk. Outside a hunk body, a ``--- `` line only starts a file
+    when the next line is ``+++ `` and it isn't already part of a
+    ``diff --git`` header.
+    """
+    pending = None
+    after_git_header = False
+    old_left = new_left = 0
+    lines = io.StringIO(diff_text) if isinstance(diff_text, str) else diff_text
+    for line in lines:
+        if pending is not None:
+            yield pending, line.startswith("+++ ")
+            pending = None
+        remaining = _consume_hunk_line(line, old_left, new_left)
+        if remaining is not None:
+            old_left, new_left = remaining
+            yield line, False
+            continue
+        old_left = new_left = 0
+        if line.startswith("diff --git "):
+            after_git_header = True
+            yield line, True
+        elif line.startswith("--- ") and not after_git_header:
+            pending = line
+        else:
+            hunk = _HUNK_HEADER_RE.match(line)
+            if hunk:
+                after_git_header = False
+                old_left = int(hunk.group(1) or 1)
+                new_left = int(hunk.group(2) or 1)
+            yield line, False
+    if pending is not None:
+        yield pending, False
+
+
+def _status_from_header(header: str) -> str:
+    """Map git extended headers to the files API's status values."""
+    for line in header.splitlines():
+        if line.startswith("new file mode"):
+            return "added"
+        if line.startswith("deleted file mode"):
+            return "removed"
+        if line.startswith("rename from"):
+            return "renamed"
+        if line.startswith("copy from"):
+            return "copied"
+    return "modified"
+
+
+def _renamed_from(header: str) -> Optional[str]:
+    for line in header.splitlines():
+        if line.startswith("rename from "):
+            return line[len("rename from "):]
+    return None
+
+
+def _index_shas(header: str) -> Tuple[Optional[str], Optional[str]]:
+    """Base and head blob SHAs from the ``index <base>..<head>`` line.
+
+    Git abbreviates them unless the diff was made with ``--full-index``;
+    an all-zero SHA (added/deleted side) comes back as None.
+    """
+    for line in header.splitlines():
+        if line.startswith("index ") and ".." in line:
+            base, head = line.split()[1].split("..", 1)
+            return (base if base.strip("0") else None), (head if head.strip("0") else None)
+    return None, None
+
+
+def iter_diff_files(diff_text: Union[str, Iterable[str]]) -> Iterator[Dict[str, str]]:
+    """Parse ``git diff`` output into files-API-shaped entries.
+
+    Yields ``{"filename", "status", "patch"}`` per file, where ``patch`` is
+    the hunks without the file header, as in ``GET /pulls/{n}/files``.
+    Binary files yield an empty patch. Like the files API, entries also
+    carry ``sha`` (head blob) and ``previous_filename`` where the header
+    has them, plus ``previous_sha`` (base blob).
+    """
+    for filename, header, hunks in iter_file_sections(diff_text):
+        entry = {
+            "filename": filename,
+            "status": _status_from_header(header),
+            "patch": "".join(hunks).rstrip("\n"),
+        }
+        base_sha, head_sha = _index_shas(header)
+        if head_sha:
+            entry["sha"] = head_sha
+        if base_sha:
+            entry["previous_sha"] = base_sha
+        previous = _renamed_from(header)
+        if previous:
+            entry["previous_filename"] = previous
+        yield entry
+
+
+def _filename_from_header(line: str) -> str:
+    if line.startswith("diff --git "):
+        parts = line.split()
+        return parts[-1][2:] if parts[-1].startswith("b/") else parts[-1]
+    name = line[4:].strip()
+    return name[2:] if name.startswith("a/") else name
+
+
+def _split_hunk(hunk: str, max_chars: int) -> Iterator[str]:
+    """Split an oversized hunk into line-aligned pieces under max_chars."""
+    lines = hunk.splitlines(keepends=True)
+    hunk_header = lines[0] if lines and lines[0].startswith("@@") else ""
+    piece: List[str] = []
+    size = 0
+    for line in lines:
+        if piece and size + len(line) > max_chars:
+            yield "".join(piece)
+            piece = [hunk_header] if hunk_header else []
+            size = len(hunk_header)
+        # A single enormous line is hard-cut rather than dropped. Each cut
+        # piece goes out after the hunk header and keeps the line's +/-/space
+        # prefix, so it still reads as an added/removed/context line.
+        prefix = line[:1] if line[:1] in ("+", "-", " ") else ""
+        text = line.rstrip("\n")
+        while size + len(text) + 1 > max_chars:
+            room = max(len(prefix) + 1, max_chars - size - 1)
+            if room >= len(text):
+                break
+            piece.append(text[:room] + "\n")
+            yield "".join(piece)
+            piece = [hunk_header] if hunk_header else []
+            size = len(hunk_header)
+            text = prefix + text[room:]
+        line = text + "\n" if line.endswith("\n") else text
+        piece.append(line)
+        size += len(line)
+    if piece:
+        yield "".join(piece)
+
+
+def chunk_diff(diff_text: str, max_tokens: int = 6000, max_chunks: int = 8) -> ChunkPlan:
+    """Pack a unified diff into at most ``max_chunks`` chunks of ``max_tokens``."""
+    max_chars = max(256, max_tokens * CHARS_PER_TOKEN)
+    chunks: List[DiffChunk] = []
+    skipped: List[str] = []
+    current = DiffChunk()
+
+    def _room(chunk: DiffChunk) -> int:
+        return max_chars - chunk.chars
+
+    for filename, header, hunks in iter_file_sections(diff_text):
+        if len(chunks) >= max_chunks:
+            skipped.append(filename)
+            continue
+
+        body = "".join(hunks)
+        if len(header) + len(body) <= _room(current):
+            current.add(filename, header + body)
+            continue
+
+        if current.parts and len(header) + len(body) <= max_chars:
+            chunks.append(current)
+            current = DiffChunk()
+            if len(chunks) >= max_chunks:
+                skipped.append(filename)
+                continue
+            current.add(filename, header + body)
+            continue
+
+        # File too large for one chunk: split at hunk boundaries, repeating
+        # the file header in each piece.
+        pieces = []
+        for hunk in hunks:
+            if len(header) + len(hunk) <= max_chars:
+                pieces.append(hunk)
+            else:
+                pieces.extend(_split_hunk(hunk, max(128, max_chars - len(header))))
+
+        truncated = False
+        for piece in pieces:
+            if current.parts and len(header) + len(piece) > _room(current):
+                chunks.append(current)
+                current = DiffChunk()
+                if len(chunks) >= max_chunks:
+                    truncated = True
+                    break
+            text = piece if current.files and current.files[-1] == filename else header + piece
+            current.add(filename, text)
+        if truncated:
+            skipped.append(filename)
+
+    if current.parts and len(chunks) < max_chunks:
+        chunks.append(current)
+
+    return ChunkPlan(chunks, skipped)
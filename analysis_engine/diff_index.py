@@ -0,0 +1,226 @@
+"""Compact per-file, per-hunk index of a unified diff.
+
+The diff is parsed once, line by line, from a string, an iterable of
+lines (e.g. a streamed response) or the per-file ``patch`` fields of
+``pr_data["files_changed"]``. Each hunk keeps its old/new ranges and the
+line numbers of added and removed lines in ``array('I')`` buffers. The
+text of added lines is kept once per file. Everything downstream reads
+this index instead of re-splitting the diff: CodeAnalyzer, the worker's
+complexity step, ConfidenceScorer and the aggregator's line mapping.
+"""
+
+import io
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+from analysis_engine.diff_chunker import _iter_lines, _filename_from_header, _status_from_header
+
+_HUNK_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+class Hunk:
+    __slots__ = ("old_start", "old_len", "new_start", "new_len", "added", "removed")
+
+    def __init__(self, old_start: int, old_len: int, new_start: int, new_len: int):
+        self.old_start = old_start
+        self.old_len = old_len
+        self.new_start = new_start
+        self.new_len = new_len
+        self.added = array("I")  # new-side line numbers of '+' lines
+        self.removed = array("I")  # old-side line numbers of '-' lines
+
+    @property
+    def new_end(self) -> int:
+        return self.new_start + max(self.new_len, 1) - 1
+
+    def __repr__(self) -> str:
+        return f"Hunk(-{self.old_start},{self.old_len} +{self.new_start},{self.new_len})"
+
+
+class FileDiff:
+    __slots__ = ("filename", "status", "hunks", "added_text", "_added")
+
+    def __init__(self, filename: str, status: str = "modified"):
+        self.filename = filename
+        self.status = status
+        self.hunks: List[Hunk] = []
+        self.added_text: List[str] = []  # text of '+' lines, without the '+'
+        self._added: Optional[array] = None
+
+    @property
+    def added_lines(self) -> array:
+        """Sorted new-side line numbers of every added line."""
+        if self._added is None:
+            merged = array("I")
+            for hunk in self.hunks:
+                merged.extend(hunk.added)
+            self._added = merged
+        return self._added
+
+    @property
+    def additions(self) -> int:
+        return sum(len(h.added) for h in self.hunks)
+
+    @property
+    def deletions(self) -> int:
+        return sum(len(h.removed) for h in self.hunks)
+
+    def added_source(self) -> str:
+        return "\n".join(self.added_text)
+
+    def hunk_for(self, line: int) -> Optional[Hunk]:
+        """The hunk whose new-side range contains ``line``."""
+        starts = [h.new_start for h in self.hunks]
+        i = bisect_right(starts, line) - 1
+        if i >= 0 and self.hunks[i].new_start <= line <= self.hunks[i].new_end:
+            return self.hunks[i]
+        return None
+
+    def nearest_added_line(self, line: int) -> int:
+        """Closest added line to ``line`` (0 if the file has no additions)."""
+        added = self.added_lines
+        if not added:
+            return 0
+        i = bisect_left(added, line)
+        if i == 0:
+            return added[0]
+        if i == len(added):
+            return added[-1]
+        before, after = added[i - 1], added[i]
+        return before if line - before <= after - line else after
+
+
+class DiffIndex:
+    """Ordered ``filename -> FileDiff`` mapping."""
+
+    __slots__ = ("files",)
+
+    def __init__(self):
+        self.files: Dict[str, FileDiff] = {}
+
+    def __iter__(self) -> Iterator[FileDiff]:
+        return iter(self.files.values())
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def __contains__(self, filename: str) -> bool:
+        return filename in self.files
+
+    def get(self, filename: str) -> Optional[FileDiff]:
+        return self.files.get(filename)
+
+    @property
+    def filenames(self) -> List[str]:
+        return list(self.files)
+
+    def subset(self, filenames: Iterable[str]) -> "DiffIndex":
+        """A view over some of the files (FileDiffs are shared, not copied)."""
+        wanted = set(filenames)
+        view = DiffIndex()
+        view.files = {name: fd for name, fd in self.files.items() if name in wanted}
+        return view
+
+    def map_line(self, filename: str, line: int) -> int:
+        """Snap a reported line onto the diff.
+
+        Lines inside a hunk are kept; anything else (including 0 / unknown)
+        moves to the nearest added line of the file. Files not in the diff
+        are returned unchanged.
+        """
+        file_diff = self.files.get(filename)
+        if file_diff is None:
+            return line
+        if line > 0 and file_diff.hunk_for(line) is not None:
+            return line
+        return file_diff.nearest_added_line(line) or line
+
+
+class _HunkReader:
+    """Feeds hunk header/body lines of one file into its FileDiff."""
+
+    __slots__ = ("file_diff", "hunk", "old_no", "new_no")
+
+    def __init__(self, file_diff: FileDiff):
+        self.file_diff = file_diff
+        self.hunk: Optional[Hunk] = None
+        self.old_no = self.new_no = 0
+
+    def feed(self, line: str) -> None:
+        if line.startswith("@@"):
+            match = _HUNK_RE.match(line)
+            if match:
+                old_start, old_len, new_start, new_len = match.groups()
+                self.hunk = Hunk(
+                    int(old_start), int(1 if old_len is None else old_len),
+                    int(new_start), int(1 if new_len is None else new_len),
+                )
+                self.file_diff.hunks.append(self.hunk)
+                self.old_no, self.new_no = self.hunk.old_start, self.hunk.new_start
+            return
+        if self.hunk is None:
+            return
+        tag = line[:1]
+        if tag == "+":
+            self.hunk.added.append(self.new_no)
+            self.file_diff.added_text.append(line[1:].rstrip("\r\n"))
+            self.new_no += 1
+        elif tag == "-":
+            self.hunk.removed.append(self.old_no)
+            self.old_no += 1
+        elif tag == " " or line in ("\n", ""):
+            self.old_no += 1
+            self.new_no += 1
+        # "\\ No newline at end of file" consumes no line
+
+
+def parse_diff(diff: Union[str, Iterable[str]]) -> DiffIndex:
+    """Index ``git diff`` / ``--- a/ +++ b/`` output in a single pass."""
+    index = DiffIndex()
+    current: Optional[FileDiff] = None
+    reader: Optional[_HunkReader] = None
+    header: List[str] = []
+    in_header = False
+
+    def _finish():
+        if current is not None:
+            current.status = _status_from_header("".join(header))
+            index.files[current.filename] = current
+
+    for line, starts_file in _iter_lines(diff):
+        if starts_file:
+            _finish()
+            current = FileDiff(_filename_from_header(line))
+            reader = _HunkReader(current)
+            header = [line]
+            in_header = True
+            continue
+        if current is None:
+            continue
+        if in_header and not line.startswith("@@"):
+            header.append(line)
+            if line.startswith("+++ "):
+                name = line[4:].strip()
+                if name.startswith("b/"):
+                    name = name[2:]
+                if name != "/dev/null":
+                    current.filename = name
+            continue
+        in_header = False
+        reader.feed(line)
+    _finish()
+    return index
+
+
+def index_files(files_changed: Iterable[Dict[str, str]]) -> DiffIndex:
+    """Index the per-file ``patch`` fields of ``pr_data["files_changed"]``."""
+    index = DiffIndex()
+    for f in files_changed:
+        file_diff = FileDiff(f["filename"], f.get("status") or "modified")
+        reader = _HunkReader(file_diff)
+        for line in io.StringIO(f.get("patch") or ""):
+            reader.feed(line)
+        index.files[file_diff.filename] = file_diff
+    return index
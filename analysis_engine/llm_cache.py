@@ -0,0 +1,293 @@
+"""Content-addressed cache for LLM review responses.
+
+Entries are keyed on (model, template name, normalised prompt), so a
+re-synchronised PR with an unchanged diff or a redelivered webhook reuses
+the previous response instead of paying for another LLM round-trip.
+
+Three backends are available, selected by ``settings.llm_cache_backend``:
+
+  memory  – per-process LRU (default)
+  db      – ``llm_response_cache`` table next to ContextCache
+  redis   – shared across workers via ``settings.redis_url``
+
+All backends honour the same TTL and entry cap, and the cache keeps
+hit/miss counters for observability.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Optional
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Normalise whitespace so cosmetic differences don't defeat the cache."""
+    lines = prompt.replace("\r\n", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip()
+
+
+def make_cache_key(model: str, template: str, prompt: str) -> str:
+    digest = hashlib.sha256()
+    for part in (model, template, normalize_prompt(prompt)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+# ── backends ────────────────────────────────────────────────────────────
+
+
+class MemoryCacheBackend:
+    """Thread-safe in-process LRU with per-entry expiry.
+
+    Values are stored as JSON, like the other backends, so a caller that
+    mutates a returned response can't corrupt the cached copy.
+    """
+
+    def __init__(self, ttl: int, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+        return json.loads(value)
+
+    def set(self, key: str, value: Dict[str, Any], model: str = "", template: str = "") -> None:
+        raw = json.dumps(value)
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, raw)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class DatabaseCacheBackend:
+    """LRU cache stored in the ``llm_response_cache`` table.
+
+    The entry cap is enforced every ``PRUNE_EVERY`` writes rather than on
+    each one, so the table can briefly hold that many extra rows.
+    """
+
+    PRUNE_EVERY = 50
+
+    def __init__(self, ttl: int, max_entries: int):
+        from database import SessionLocal
+        from models import LLMResponseCache
+
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._session_factory = SessionLocal
+        self._model = LLMResponseCache
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        Entry = self._model
+        db = self._session_factory()
+        try:
+            entry = db.query(Entry).filter(Entry.cache_key == key).first()
+            if entry is None:
+                return None
+            now = datetime.now(timezone.utc)
+            created = entry.created_at
+            if created is not None and created.tzinfo is None:
+                created = created.replace(tzinfo=timezone.utc)
+            if created is not None and created + timedelta(seconds=self.ttl) < now:
+                db.delete(entry)
+                db.commit()
+                return None
+            entry.last_accessed = now
+            db.commit()
+            return entry.response
+        finally:
+            db.close()
+
+    def set(self, key: str, value: Dict[str, Any], model: str = "", template: str = "") -> None:
+        Entry = self._model
+        db = self._session_factory()
+        try:
+            now = datetime.now(timezone.utc)
+            entry = db.query(Entry).filter(Entry.cache_key == key).first()
+            if entry is None:
+                entry = Entry(cache_key=key, model=model, template=template)
+                db.add(entry)
+            entry.response = value
+            entry.created_at = now
+            entry.last_accessed = now
+            db.commit()
+
+            with self._writes_lock:
+                self._writes += 1
+                due = self._writes % self.PRUNE_EVERY == 0
+            if due:
+                self._prune(db)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _prune(self, db) -> None:
+        """Delete least-recently-used rows beyond ``max_entries``."""
+        Entry = self._model
+        overflow = db.query(Entry).count() - self.max_entries
+        if overflow > 0:
+            stale_ids = [
+                row.id for row in
+                db.query(Entry.id).order_by(Entry.last_accessed.asc()).limit(overflow)
+            ]
+            db.query(Entry).filter(Entry.id.in_(stale_ids)).delete(synchronize_session=False)
+            db.commit()
+
+
+class RedisCacheBackend:
+    """Cache shared across workers; Redis handles TTL, a sorted set the cap.
+
+    The index is scored by each entry's expiry time, so expired members are
+    dropped with one ``zremrangebyscore`` and the cap evicts the entries
+    closest to expiring. Like the db backend, pruning runs every
+    ``PRUNE_EVERY`` writes rather than on each one.
+    """
+
+    INDEX_KEY = "smartcode:llm_cache:lru"
+    PREFIX = "smartcode:llm_cache:"
+    PRUNE_EVERY = 50
+
+    def __init__(self, ttl: int, max_entries: int):
+        import redis
+        from config import settings
+
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._redis = redis.Redis.from_url(settings.redis_url)
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raw = self._redis.get(self.PREFIX + key)
+        if raw is None:
+            return None
+        return json.loads(raw)
+
+    def set(self, key: str, value: Dict[str, Any], model: str = "", template: str = "") -> None:
+        pipe = self._redis.pipeline()
+        pipe.set(self.PREFIX + key, json.dumps(value), ex=self.ttl)
+        pipe.zadd(self.INDEX_KEY, {key: time.time() + self.ttl})
+        pipe.execute()
+
+        with self._writes_lock:
+            self._writes += 1
+            due = self._writes % self.PRUNE_EVERY == 0
+        if due:
+            self._prune()
+
+    def _prune(self) -> None:
+        """Drop expired index members, then evict entries beyond ``max_entries``."""
+        # Their values have already been expired by Redis itself
+        self._redis.zremrangebyscore(self.INDEX_KEY, "-inf", time.time())
+        overflow = self._redis.zcard(self.INDEX_KEY) - self.max_entries
+        if overflow > 0:
+            stale = self._redis.zrange(self.INDEX_KEY, 0, overflow - 1)
+            if stale:
+                pipe = self._redis.pipeline()
+                pipe.delete(*[self.PREFIX + k.decode("utf-8") for k in stale])
+                pipe.zrem(self.INDEX_KEY, *stale)
+                pipe.execute()
+
+
+BACKENDS = {
+    "memory": MemoryCacheBackend,
+    "db": DatabaseCacheBackend,
+    "redis": RedisCacheBackend,
+}
+
+
+# ── cache facade ────────────────────────────────────────────────────────
+
+
+class ResponseCache:
+    """Facade over a backend that adds key derivation and hit/miss counters.
+
+    Backend errors are logged and treated as misses — a broken cache must
+    never fail a review.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def get(self, model: str, template: str, prompt: str) -> Optional[Dict[str, Any]]:
+        try:
+            value = self.backend.get(make_cache_key(model, template, prompt))
+        except Exception as e:
+            print(f"[llm-cache] get failed: {e}")
+            value = None
+            with self._lock:
+                self.errors += 1
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, model: str, template: str, prompt: str, value: Dict[str, Any]) -> None:
+        try:
+            self.backend.set(make_cache_key(model, template, prompt), value, model, template)
+        except Exception as e:
+            print(f"[llm-cache] set failed: {e}")
+            with self._lock:
+                self.errors += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Optional[ResponseCache]:
+    """Return the process-wide cache, or None when caching is disabled."""
+    from config import settings
+
+    global _cache
+    backend_name = settings.llm_cache_backend.lower()
+    if backend_name in ("off", "none", ""):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            backend_cls = BACKENDS.get(backend_name, MemoryCacheBackend)
+            try:
+                backend = backend_cls(settings.llm_cache_ttl, settings.llm_cache_max_entries)
+            except Exception as e:
+                print(f"[llm-cache] {backend_name} backend unavailable ({e}); using memory")
+                backend = MemoryCacheBackend(settings.llm_cache_ttl, settings.llm_cache_max_entries)
+            _cache = ResponseCache(backend)
+        return _cache
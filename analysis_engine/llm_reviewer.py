@@ -6,11 +6,14 @@ or hallucinated comments.
 """
 
 import json
-import traceback
-from typing import Dict, Any, Optional
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, Optional, Callable, Tuple
 
 import openai
 from config import settings
+from analysis_engine.llm_cache import get_llm_cache
+from analysis_engine.diff_chunker import chunk_diff, ChunkPlan
 from analysis_engine.prompt_templates import (
     SYSTEM_PROMPT,
     REQUIREMENT_REVIEW_TEMPLATE,
@@ -23,38 +26,80 @@ from analysis_engine.prompt_templates import (
 class LLMReviewer:
     """LLM-powered code reviewer using OpenRouter (OpenAI-compatible API)."""
 
+    # Neutral results substituted for a pass that fails or times out, so
+    # scoring can proceed with whatever passes did complete.
+    PASS_DEFAULTS = {
+        "requirements": {
+            "completeness_score": 50, "findings": [], "missing_features": [],
+            "scope_creep": [], "unhandled_edge_cases": [], "summary": "", "reasoning": "",
+        },
+        "security": {"security_score": 50, "findings": [], "vulnerabilities": [], "summary": ""},
+        "performance": {"performance_score": 50, "findings": [], "performance_issues": [], "summary": ""},
+        "quality": {"quality_score": 70, "findings": [], "test_coverage_signal": {}, "summary": ""},
+    }
+
+    # How each pass's score is combined across diff chunks. Security takes
+    # the worst chunk — one vulnerability anywhere matters; the others use
+    # a size-weighted mean.
+    SCORE_REDUCERS = {
+        "requirements": ("completeness_score", "mean"),
+        "security": ("security_score", "min"),
+        "performance": ("performance_score", "mean"),
+        "quality": ("quality_score", "mean"),
+    }
+
     def __init__(self):
+        self.pass_timeout = settings.llm_pass_timeout
+        self.review_timeout = settings.llm_review_timeout
+        # No client-side retries: with them one call could run for
+        # (retries + 1) × timeout, long past the pass deadline
         self.client = openai.OpenAI(
             base_url="https://openrouter.ai/api/v1",
             api_key=settings.openrouter_api_key,
+            timeout=self.pass_timeout,
+            max_retries=0,
         )
         self.model = settings.llm_model
+        self.max_concurrency = max(1, settings.llm_max_concurrency)
+        self.cache = get_llm_cache()
+        self.chunk_tokens = settings.llm_chunk_tokens
+        self.max_chunks = settings.llm_max_chunks
 
     # ── internal helper ─────────────────────────────────────────────────
 
-    def _call_llm(self, prompt: str) -> Dict[str, Any]:
-        """Send prompt to LLM and parse JSON response."""
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.1,
-                response_format={"type": "json_object"},
-            )
+    def _call_llm(self, prompt: str, template: str = "") -> Dict[str, Any]:
+        """Send prompt to LLM and parse JSON response.
+
+        Responses are cached by (model, template, prompt); only
+        successfully parsed, non-empty responses are stored. API and JSON
+        errors propagate so ``run_passes`` records them as ``pass_error``
+        instead of scoring an empty response.
+        """
+        if self.cache is not None:
+            cached = self.cache.get(self.model, template, prompt)
+            if cached is not None:
+                return cached
 
-            content = response.choices[0].message.content
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.1,
+            response_format={"type": "json_object"},
+            timeout=self.pass_timeout,
+        )
+
+        content = response.choices[0].message.content
 
-            # Strip markdown fences if model wraps them anyway
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0]
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0]
+        # Strip markdown fences if model wraps them anyway
+        if "```json" in content:
+            content = content.split("```json")[1].split("```")[0]
+        elif "```" in content:
+            content = content.split("```")[1].split("```")[0]
 
-            return json.loads(content)
-        except Exception as e:
-            traceback.print_exc()
-            print(f"LLM Error: {e}")
-            return {}
+        result = json.loads(content)
+        if self.cache is not None and result:
+            self.cache.set(self.model, template, prompt, result)
+        return result
 
     # ── public review methods ───────────────────────────────────────────
 
@@ -66,15 +111,51 @@ class LLMReviewer:
         issue_num: int,
     ) -> dict:
         """Review if code changes fully implement the requirements."""
+        return self._map_reduce(
+            "requirements", code_diff, self._review_requirements_chunk,
+            (issue_requirements, readme_summary, issue_num),
+        )
+
+    def review_security(
+        self, code_diff: str, data_flow_summary: str = ""
+    ) -> dict:
+        """Review code for security vulnerabilities."""
+        return self._map_reduce(
+            "security", code_diff, self._review_security_chunk, (data_flow_summary,)
+        )
+
+    def review_performance(self, code_diff: str) -> dict:
+        """Review code for performance issues."""
+        return self._map_reduce(
+            "performance", code_diff, self._review_performance_chunk, ()
+        )
+
+    def review_code_quality(
+        self, code_diff: str, static_analysis: str = ""
+    ) -> dict:
+        """Review code for quality and technical debt."""
+        return self._map_reduce(
+            "quality", code_diff, self._review_quality_chunk, (static_analysis,)
+        )
+
+    # ── single-chunk review calls ───────────────────────────────────────
+
+    def _review_requirements_chunk(
+        self,
+        code_diff: str,
+        issue_requirements: dict,
+        readme_summary: str,
+        issue_num: int,
+    ) -> dict:
         prompt = REQUIREMENT_REVIEW_TEMPLATE.format(
             system=SYSTEM_PROMPT,
             issue_num=issue_num,
             requirements_json=json.dumps(issue_requirements, indent=2),
-            code_diff=self._truncate(code_diff),
+            code_diff=code_diff,
             project_context=readme_summary,
         )
 
-        result = self._call_llm(prompt)
+        result = self._call_llm(prompt, "requirement_review")
         return {
             "completeness_score": result.get("completeness_score", 50),
             "findings": result.get("findings", []),
@@ -88,17 +169,16 @@ class LLMReviewer:
             "reasoning": result.get("summary", ""),
         }
 
-    def review_security(
+    def _review_security_chunk(
         self, code_diff: str, data_flow_summary: str = ""
     ) -> dict:
-        """Review code for security vulnerabilities."""
         prompt = SECURITY_REVIEW_TEMPLATE.format(
             system=SYSTEM_PROMPT,
-            code_diff=self._truncate(code_diff),
+            code_diff=code_diff,
             data_flow=data_flow_summary or "No data-flow context provided.",
         )
 
-        result = self._call_llm(prompt)
+        result = self._call_llm(prompt, "security_review")
         return {
             "security_score": result.get("security_score", 50),
             "findings": result.get("findings", []),
@@ -106,14 +186,13 @@ class LLMReviewer:
             "summary": result.get("summary", ""),
         }
 
-    def review_performance(self, code_diff: str) -> dict:
-        """Review code for performance issues."""
+    def _review_performance_chunk(self, code_diff: str) -> dict:
         prompt = PERFORMANCE_REVIEW_TEMPLATE.format(
             system=SYSTEM_PROMPT,
-            code_diff=self._truncate(code_diff),
+            code_diff=code_diff,
         )
 
-        result = self._call_llm(prompt)
+        result = self._call_llm(prompt, "performance_review")
         return {
             "performance_score": result.get("performance_score", 50),
             "findings": result.get("findings", []),
@@ -121,17 +200,16 @@ class LLMReviewer:
             "summary": result.get("summary", ""),
         }
 
-    def review_code_quality(
+    def _review_quality_chunk(
         self, code_diff: str, static_analysis: str = ""
     ) -> dict:
-        """Review code for quality and technical debt."""
         prompt = CODE_QUALITY_REVIEW_TEMPLATE.format(
             system=SYSTEM_PROMPT,
-            code_diff=self._truncate(code_diff),
+            code_diff=code_diff,
             static_analysis=static_analysis or "No static analysis context.",
         )
 
-        result = self._call_llm(prompt)
+        result = self._call_llm(prompt, "code_quality_review")
         return {
             "quality_score": result.get("quality_score", 70),
             "findings": result.get("findings", []),
@@ -139,16 +217,247 @@ class LLMReviewer:
             "summary": result.get("summary", ""),
         }
 
-    # ── utilities ───────────────────────────────────────────────────────
+    # ── concurrent execution ────────────────────────────────────────────
+
+    def review_all(
+        self,
+        issue_requirements: dict,
+        code_diff: str,
+        readme_summary: str,
+        issue_num: int,
+        static_analysis: str = "",
+        requirement_diff: Optional[str] = None,
+        security_diff: Optional[str] = None,
+        security_context: str = "",
+    ) -> Dict[str, dict]:
+        """Run all four review passes concurrently.
+
+        ``requirement_diff`` lets the requirement pass see the whole PR
+        while the other passes only review ``code_diff`` (used for
+        incremental re-review). Large diffs are chunked and every chunk of
+        every pass shares the same pool.
+
+        ``security_diff`` narrows the security pass (e.g. to non-doc files),
+        and an empty string skips it with a clean result.
+        ``security_context`` (the local scanner's findings) is passed to
+        the security prompt.
+
+        Returns a dict keyed by pass name (requirements, security,
+        performance, quality). Passes that fail or exceed
+        ``pass_timeout`` get their PASS_DEFAULTS entry plus a
+        ``pass_error`` key describing what went wrong. Once
+        ``review_timeout`` has elapsed, chunks still waiting to run are
+        skipped (``pass_error`` "deadline").
+        """
+        req_plan = self._chunk(requirement_diff if requirement_diff is not None else code_diff)
+        plan = self._chunk(code_diff)
+        specs = {
+            "requirements": (req_plan, self._review_requirements_chunk,
+                             (issue_requirements, readme_summary, issue_num)),
+            "security": (plan, self._review_security_chunk, (security_context,)),
+            "performance": (plan, self._review_performance_chunk, ()),
+            "quality": (plan, self._review_quality_chunk, (static_analysis,)),
+        }
+        skipped = {}
+        if security_diff is not None:
+            if security_diff.strip():
+                specs["security"] = (self._chunk(security_diff), self._review_security_chunk, (security_context,))
+            else:
+                del specs["security"]
+                skipped["security"] = {
+                    "security_score": 100, "findings": [], "vulnerabilities": [],
+                    "summary": "Security pass skipped: no reviewable code changes and no static scanner findings.",
+                    "skipped": True,
+                }
+
+        # One flat pool across every (pass, chunk) pair keeps a single
+        # concurrency cap no matter how many chunks a large diff produces.
+        passes = {}
+        for name, (p, fn, extra) in specs.items():
+            passes.update(self._chunk_passes(name, p, fn, extra))
+        raw = self.run_passes(passes, deadline=time.monotonic() + self.review_timeout)
+
+        results = {
+            name: self._reduce(
+                name, [raw[f"{name}#{i}"] for i in range(max(1, len(p)))], p
+            )
+            for name, (p, _fn, _extra) in specs.items()
+        }
+        results.update(skipped)
+        return results
+
+    def run_passes(
+        self,
+        passes: Dict[str, Tuple[Callable[..., dict], tuple]],
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+    ) -> Dict[str, dict]:
+        """Execute independent review passes on a bounded thread pool.
+
+        Each pass's timeout is measured from when it actually starts
+        running, so passes queued behind the concurrency cap are not
+        penalised for waiting. A timed-out pass is abandoned rather than
+        waited on; the HTTP-level timeout in ``_call_llm`` bounds how long
+        its thread lingers in the background.
+
+        ``deadline`` (a ``time.monotonic()`` value) caps the whole run:
+        once it passes, every pass still pending is abandoned with
+        ``pass_error`` "deadline", and queued ones never start.
+        """
+        max_concurrency = max_concurrency or self.max_concurrency
+        timeout = timeout if timeout is not None else self.pass_timeout
+
+        results: Dict[str, dict] = {}
+        started: Dict[str, float] = {}
+
+        def _run(name: str, fn: Callable[..., dict], args: tuple) -> dict:
+            started[name] = time.monotonic()
+            if deadline is not None and started[name] >= deadline:
+                return self._pass_default(name, "deadline")
+            return fn(*args)
+
+        pool = ThreadPoolExecutor(
+            max_workers=min(max_concurrency, len(passes)) or 1,
+            thread_name_prefix="llm-pass",
+        )
+        try:
+            futures = {
+                pool.submit(_run, name, fn, args): name
+                for name, (fn, args) in passes.items()
+            }
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    name = futures[fut]
+                    try:
+                        results[name] = fut.result()
+                    except Exception as e:
+                        print(f"LLM pass '{name}' failed: {e}")
+                        results[name] = self._pass_default(name, str(e))
+
+                now = time.monotonic()
+                if deadline is not None and now >= deadline and pending:
+                    print(f"LLM review deadline reached; skipping {len(pending)} pending pass(es)")
+                    for fut in pending:
+                        fut.cancel()
+                        results[futures[fut]] = self._pass_default(futures[fut], "deadline")
+                    break
+                for fut in list(pending):
+                    name = futures[fut]
+                    t0 = started.get(name)
+                    if t0 is not None and now - t0 > timeout:
+                        fut.cancel()
+                        pending.discard(fut)
+                        print(f"LLM pass '{name}' timed out after {timeout:.0f}s")
+                        results[name] = self._pass_default(name, "timeout")
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        return results
+
+    def _pass_default(self, name: str, error: str) -> dict:
+        name = name.split("#")[0]
+        result = json.loads(json.dumps(self.PASS_DEFAULTS.get(name, {"findings": []})))
+        result["pass_error"] = error
+        return result
+
+    # ── diff chunking (map-reduce) ──────────────────────────────────────
+
+    def _chunk(self, code_diff: str) -> ChunkPlan:
+        return chunk_diff(code_diff, self.chunk_tokens, self.max_chunks)
 
     @staticmethod
-    def _truncate(text: str, max_chars: int = 24_000) -> str:
-        """Truncate text to fit within context window limits."""
-        if len(text) <= max_chars:
-            return text
-        half = max_chars // 2
-        return (
-            text[:half]
-            + "\n\n... [TRUNCATED — diff too large, showing first & last sections] ...\n\n"
-            + text[-half:]
-        )
\ No newline at end of file
+    def _chunk_passes(
+        name: str, plan: ChunkPlan, fn: Callable[..., dict], extra: tuple
+    ) -> Dict[str, Tuple[Callable[..., dict], tuple]]:
+        """Map one review pass over every chunk of a plan."""
+        if not plan.chunks:
+            return {f"{name}#0": (fn, ("",) + extra)}
+        total = len(plan.chunks)
+        return {
+            f"{name}#{i}": (fn, (chunk.render(i, total),) + extra)
+            for i, chunk in enumerate(plan.chunks)
+        }
+
+    def _map_reduce(
+        self, name: str, code_diff: str, fn: Callable[..., dict], extra: tuple
+    ) -> dict:
+        """Review ``code_diff`` with ``fn``, chunking it if it is too large."""
+        plan = self._chunk(code_diff)
+        if len(plan) <= 1 and not plan.skipped_files:
+            try:
+                return fn(plan.chunks[0].text if plan.chunks else code_diff, *extra)
+            except Exception as e:
+                print(f"LLM pass '{name}' failed: {e}")
+                return self._pass_default(name, str(e))
+        passes = self._chunk_passes(name, plan, fn, extra)
+        raw = self.run_passes(passes)
+        return self._reduce(name, [raw[key] for key in passes], plan)
+
+    def _reduce(self, name: str, results: list, plan: ChunkPlan) -> dict:
+        """Merge per-chunk results of one pass into a single result."""
+        if len(results) == 1 and not plan.skipped_files:
+            return results[0]
+
+        weights = [c.chars for c in plan.chunks] or [1]
+        ok = [(r, w) for r, w in zip(results, weights) if not r.get("pass_error")]
+        if not ok:
+            return self._pass_default(name, results[0].get("pass_error", "all chunks failed"))
+
+        merged: Dict[str, Any] = {}
+        score_key, how = self.SCORE_REDUCERS[name]
+        scored = [(r[score_key], w) for r, w in ok if isinstance(r.get(score_key), (int, float))]
+        if scored:
+            if how == "min":
+                merged[score_key] = min(s for s, _ in scored)
+            else:
+                total_w = sum(w for _, w in scored) or 1
+                merged[score_key] = round(sum(s * w for s, w in scored) / total_w)
+        else:
+            merged[score_key] = self.PASS_DEFAULTS[name][score_key]
+
+        seen: Dict[str, set] = {}
+        texts: Dict[str, list] = {}
+        for r, _ in ok:
+            for key, value in r.items():
+                if key == score_key:
+                    continue
+                if isinstance(value, list):
+                    bucket = merged.setdefault(key, [])
+                    keys = seen.setdefault(key, set())
+                    for item in value:
+                        marker = self._dedup_key(item)
+                        if marker not in keys:
+                            keys.add(marker)
+                            bucket.append(item)
+                elif isinstance(value, str):
+                    if value:
+                        texts.setdefault(key, []).append(value)
+                    merged.setdefault(key, "")
+                elif isinstance(value, dict):
+                    if value and not merged.get(key):
+                        merged[key] = value
+                    merged.setdefault(key, {})
+                else:
+                    merged.setdefault(key, value)
+        for key, parts in texts.items():
+            merged[key] = " ".join(parts)
+
+        failed = len(results) - len(ok)
+        if failed:
+            merged["chunks_failed"] = failed
+        if plan.skipped_files:
+            merged["skipped_files"] = list(plan.skipped_files)
+        return merged
+
+    @staticmethod
+    def _dedup_key(item: Any) -> str:
+        if isinstance(item, dict):
+            return json.dumps(
+                [item.get("file_path"), item.get("line_number"), item.get("title"),
+                 item.get("description") if not item.get("title") else None],
+                default=str,
+            )
+        return json.dumps(item, sort_keys=True, default=str)
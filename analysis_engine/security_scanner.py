@@ -0,0 +1,316 @@
+"""Local rule-based security scanner for common CWE patterns.
+
+Runs before the LLM passes and costs no API calls. There are two rule sets,
+both built once at import:
+
+  * AST rules (``SecurityRules``): a MetricsEngine plugin, so for Python
+    files they run in the same traversal as the complexity metrics.
+    They flag:
+      - SQL built with f-strings, ``%`` or ``.format()`` (CWE-89)
+      - subprocess with ``shell=True`` and ``os.system`` with a dynamic
+        command (CWE-78)
+      - ``eval``/``exec`` (CWE-95)
+      - hard-coded secrets (CWE-798)
+      - ``yaml.load`` without a safe loader, and pickle-style
+        deserialisation (CWE-502)
+      - ``requests`` calls without a timeout (CWE-400)
+  * Line regexes: credential formats for every file type, plus
+    single-line versions of the Python rules for ``.py`` files that
+    didn't parse.
+
+Only issues on lines the diff adds are reported. Each issue has the
+shape of a structured LLM finding (category/severity/title/file_path/
+line_number/...), so the scorer and the prompts can treat both alike.
+"""
+
+import ast
+import re
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from analysis_engine.ast_metrics import Context, FunctionMetrics, MetricPlugin
+
+# rule id -> (CWE, severity, title, suggested fix)
+RULES: Dict[str, Tuple[str, str, str, str]] = {
+    "sql-string-format": (
+        "CWE-89", "high", "SQL query built by string formatting",
+        "Pass values as query parameters instead of formatting them into the SQL string.",
+    ),
+    "subprocess-shell": (
+        "CWE-78", "high", "Shell command execution",
+        "Pass an argument list with shell=False (the default) and avoid os.system/os.popen.",
+    ),
+    "eval-exec": (
+        "CWE-95", "high", "Dynamic code execution with eval/exec",
+        "Parse the input explicitly (e.g. ast.literal_eval, json.loads) instead of executing it.",
+    ),
+    "hardcoded-secret": (
+        "CWE-798", "high", "Hard-coded credential",
+        "Load the secret from the environment or a secret store.",
+    ),
+    "yaml-unsafe-load": (
+        "CWE-502", "high", "yaml.load without a safe loader",
+        "Use yaml.safe_load() or pass Loader=yaml.SafeLoader.",
+    ),
+    "unsafe-deserialization": (
+        "CWE-502", "high", "Deserialisation of untrusted data",
+        "Use a data-only format such as JSON for data that may be untrusted.",
+    ),
+    "request-without-timeout": (
+        "CWE-400", "medium", "HTTP request without a timeout",
+        "Pass timeout= so a stalled server can't hang the caller indefinitely.",
+    ),
+}
+
+_SQL_METHODS = {"execute", "executemany", "executescript", "raw", "text"}
+_SHELL_CALLS = {"os.system", "os.popen"}
+_DESERIALIZERS = {
+    f"{module}.{fn}" for module in ("pickle", "cPickle", "_pickle", "dill", "marshal", "jsonpickle")
+    for fn in ("load", "loads", "decode")
+}
+_HTTP_VERBS = {"get", "post", "put", "patch", "delete", "head", "options", "request"}
+_SECRET_NAME_RE = re.compile(
+    r"(passw(or)?d|passwd|secret|api_?key|access_?key|private_?key|auth_?token|access_?token|credential)",
+    re.IGNORECASE,
+)
+_PLACEHOLDER_RE = re.compile(
+    r"^(<.*>|\$\{.*\}|\{\{.*\}\}|x+|\*+|changeme|change_me|your[-_ ].*|example.*|dummy.*|placeholder.*)$",
+    re.IGNORECASE,
+)
+
+# Credential formats, checked on added lines of every file
+_TOKEN_PATTERNS = [
+    re.compile(r"\bAKIA[0-9A-Z]{16}\b"),  # AWS access key id
+    re.compile(r"\bgh[pousr]_[A-Za-z0-9]{36,}\b"),  # GitHub tokens
+    re.compile(r"\bxox[abprs]-[A-Za-z0-9-]{10,}"),  # Slack tokens
+    re.compile(r"-----BEGIN (?:RSA |EC |DSA |OPENSSH |PGP )?PRIVATE KEY-----"),
+]
+# `password: hunter22` style assignments in config files (non-Python)
+_CONFIG_SECRET_RE = re.compile(
+    r"""(?i)\b\w*(passw(or)?d|secret|api[_-]?key|access[_-]?key|auth[_-]?token)\w*\s*[:=]\s*["']?([^\s"'#]{8,})"""
+)
+# Single-line approximations of the AST rules, for .py files that don't parse
+_PYTHON_LINE_RULES = [
+    ("sql-string-format", re.compile(r"""\.(execute|executemany|raw)\s*\(\s*(f["']|["'][^"']*["']\s*(%|\+|\.format\())""")),
+    ("subprocess-shell", re.compile(r"\bshell\s*=\s*True\b|\bos\.(system|popen)\s*\(")),
+    ("eval-exec", re.compile(r"(?<![.\w])(eval|exec)\s*\(")),
+    ("yaml-unsafe-load", re.compile(r"\byaml\.(unsafe_)?load\s*\((?!.*SafeLoader)")),
+    ("unsafe-deserialization", re.compile(r"\b(c?[pP]ickle|dill|marshal)\.loads?\s*\(")),
+    ("request-without-timeout", re.compile(r"\brequests\.(get|post|put|patch|delete|head|options|request)\s*\((?!.*timeout)")),
+]
+
+
+def _dotted(node: ast.AST) -> str:
+    """``a.b.c`` for Name/Attribute chains ('' otherwise)."""
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if isinstance(node, ast.Name):
+        parts.append(node.id)
+        return ".".join(reversed(parts))
+    return ""
+
+
+def _keyword(call: ast.Call, name: str) -> Optional[ast.keyword]:
+    for kw in call.keywords:
+        if kw.arg == name:
+            return kw
+    return None
+
+
+def _is_formatted_string(node: ast.AST) -> bool:
+    """f-string with placeholders, ``"..." % x``, ``"..." + x`` or ``"...".format(...)``."""
+    if isinstance(node, ast.JoinedStr):
+        return any(isinstance(v, ast.FormattedValue) for v in node.values)
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Mod, ast.Add)):
+        return any(
+            (isinstance(side, ast.Constant) and isinstance(side.value, str)) or _is_formatted_string(side)
+            for side in (node.left, node.right)
+        )
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == "format":
+        return isinstance(node.func.value, ast.Constant) and isinstance(node.func.value.value, str)
+    return False
+
+
+def _is_secret_value(node: Optional[ast.AST]) -> bool:
+    if not (isinstance(node, ast.Constant) and isinstance(node.value, str)):
+        return False
+    value = node.value.strip()
+    return len(value) >= 8 and " " not in value and not _PLACEHOLDER_RE.match(value)
+
+
+class SecurityRules(MetricPlugin):
+    """AST rules; hits go to ``totals()["security_issues"]`` as (rule, line, end_line)."""
+
+    def handlers(self):
+        return {
+            ast.Call: self._call,
+            ast.Assign: self._assign,
+            ast.AnnAssign: self._assign,
+        }
+
+    @staticmethod
+    def _hit(ctx: Context, rule_id: str, node: ast.AST) -> None:
+        end = getattr(node, "end_lineno", None) or node.lineno
+        ctx.scope.state["security"].append((rule_id, node.lineno, end))
+
+    def _call(self, node: ast.Call, ctx: Context) -> None:
+        name = _dotted(node.func)
+        attr = node.func.attr if isinstance(node.func, ast.Attribute) else name
+
+        if attr in _SQL_METHODS and node.args and _is_formatted_string(node.args[0]):
+            self._hit(ctx, "sql-string-format", node)
+        elif name.startswith("subprocess."):
+            shell = _keyword(node, "shell")
+            if shell is not None and not (isinstance(shell.value, ast.Constant) and not shell.value.value):
+                self._hit(ctx, "subprocess-shell", node)
+        elif name in _SHELL_CALLS:
+            if node.args and not isinstance(node.args[0], ast.Constant):
+                self._hit(ctx, "subprocess-shell", node)
+        elif name in ("eval", "exec"):
+            if node.args and not isinstance(node.args[0], ast.Constant):
+                self._hit(ctx, "eval-exec", node)
+        elif name in ("yaml.load", "yaml.load_all"):
+            loader = _keyword(node, "Loader")
+            loader = loader.value if loader is not None else (node.args[1] if len(node.args) > 1 else None)
+            if loader is None or not _dotted(loader).endswith("SafeLoader"):
+                self._hit(ctx, "yaml-unsafe-load", node)
+        elif name in ("yaml.unsafe_load", "yaml.unsafe_load_all") or name in _DESERIALIZERS:
+            self._hit(ctx, "yaml-unsafe-load" if name.startswith("yaml.") else "unsafe-deserialization", node)
+        elif name.startswith("requests.") and attr in _HTTP_VERBS:
+            # **kwargs may carry a timeout; don't guess
+            if _keyword(node, "timeout") is None and all(kw.arg is not None for kw in node.keywords):
+                self._hit(ctx, "request-without-timeout", node)
+
+        for kw in node.keywords:
+            if kw.arg and _SECRET_NAME_RE.search(kw.arg) and _is_secret_value(kw.value):
+                self._hit(ctx, "hardcoded-secret", kw.value)
+
+    def _assign(self, node, ctx: Context) -> None:
+        targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+        if not _is_secret_value(node.value):
+            return
+        for target in targets:
+            name = target.id if isinstance(target, ast.Name) else getattr(target, "attr", "")
+            if name and _SECRET_NAME_RE.search(name):
+                self._hit(ctx, "hardcoded-secret", node)
+                return
+
+    def begin(self, scope: FunctionMetrics) -> None:
+        scope.state["security"] = []
+
+    def totals(self, module, functions):
+        hits = [hit for scope in [module] + functions for hit in scope.state["security"]]
+        return {"security_issues": sorted(hits, key=lambda h: (h[1], h[0]))}
+
+
+def make_issue(rule_id: str, file_path: str, line: int, snippet: str = "") -> Dict[str, Any]:
+    cwe, severity, title, fix = RULES[rule_id]
+    return {
+        "rule_id": rule_id,
+        "category": "security",
+        "severity": severity,
+        "title": title,
+        "description": f"{title} ({cwe}) detected by the local static scanner.",
+        "file_path": file_path,
+        "line_number": line,
+        "code_snippet": snippet,
+        "suggested_fix": fix,
+        "confidence_score": 0.6,
+        "references": [cwe],
+    }
+
+
+def _added_line_in(added_lines, start: int, end: int) -> Optional[int]:
+    """First added line within ``[start, end]`` (the statement's own line preferred)."""
+    i = bisect_left(added_lines, start)
+    if i < len(added_lines) and added_lines[i] <= end:
+        return added_lines[i]
+    return None
+
+
+def issues_from_hits(file_diff, hits: Iterable[Tuple[str, int, int]], line_map=None) -> List[Dict[str, Any]]:
+    """Issues for AST hits that touch an added line.
+
+    ``line_map`` translates line numbers when the tree was parsed from the
+    added lines alone (fragment line n -> ``added_lines[n - 1]``).
+    """
+    added = file_diff.added_lines
+    texts = dict(zip(added, file_diff.added_text))
+    issues = []
+    for rule_id, start, end in hits:
+        if line_map is not None:
+            line = line_map[start - 1] if 0 < start <= len(line_map) else None
+        else:
+            line = _added_line_in(added, start, end)
+        if line is not None:
+            issues.append(make_issue(rule_id, file_diff.filename, line, texts.get(line, "").strip()))
+    return issues
+
+
+def scan_lines(file_diff, python_ast: bool = False) -> List[Dict[str, Any]]:
+    """Regex rules over the added lines of one file.
+
+    ``python_ast`` says the AST rules already covered this (Python) file,
+    so only credential formats are checked.
+    """
+    is_python = file_diff.filename.endswith(".py")
+    issues = []
+    for line, text in zip(file_diff.added_lines, file_diff.added_text):
+        snippet = text.strip()
+        if any(p.search(text) for p in _TOKEN_PATTERNS):
+            issues.append(make_issue("hardcoded-secret", file_diff.filename, line, snippet))
+            continue
+        if not is_python:
+            match = _CONFIG_SECRET_RE.search(text)
+            if match and not _PLACEHOLDER_RE.match(match.group(3)):
+                issues.append(make_issue("hardcoded-secret", file_diff.filename, line, snippet))
+        elif not python_ast:
+            for rule_id, pattern in _PYTHON_LINE_RULES:
+                if pattern.search(text):
+                    issues.append(make_issue(rule_id, file_diff.filename, line, snippet))
+    return issues
+
+
+def dedup_issues(issues: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """One issue per (file, line, rule), in order."""
+    seen = set()
+    unique = []
+    for issue in issues:
+        key = (issue["file_path"], issue["line_number"], issue["rule_id"])
+        if key not in seen:
+            seen.add(key)
+            unique.append(issue)
+    return unique
+
+
+# Changes to these alone can't introduce a vulnerability worth an LLM pass.
+# Not .txt (requirements.txt, constraints.txt are dependency manifests) or
+# .svg (can carry inline script).
+_DOC_EXTENSIONS = (".md", ".rst", ".adoc", ".png", ".jpg", ".jpeg", ".gif", ".ico", ".pdf")
+_DOC_NAMES = ("LICENSE", "LICENSE.txt", "AUTHORS", "AUTHORS.txt", "CHANGELOG", "CHANGELOG.txt",
+              "NOTICE", "NOTICE.txt")
+
+
+def is_doc_file(path: str) -> bool:
+    name = path.rsplit("/", 1)[-1]
+    return name.lower().endswith(_DOC_EXTENSIONS) or name in _DOC_NAMES
+
+
+def format_issues(issues: List[Dict[str, Any]], limit: int = 30) -> str:
+    """Scanner issues as prompt context for the LLM security pass."""
+    if not issues:
+        return "The local static scanner found no known vulnerable patterns in the added lines."
+    lines = [
+        "The local static scanner flagged these added lines. Confirm or dismiss each one, "
+        "and report confirmed ones as findings:"
+    ]
+    for issue in issues[:limit]:
+        lines.append(
+            f"- {issue['file_path']}:{issue['line_number']} [{issue['references'][0]}] "
+            f"{issue['title']}: {issue['code_snippet'][:120]}"
+        )
+    if len(issues) > limit:
+        lines.append(f"- ... and {len(issues) - limit} more")
+    return "\n".join(lines)
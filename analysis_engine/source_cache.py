@@ -0,0 +1,162 @@
+"""Content-addressed caches of file sources and their ASTs, keyed by git blob SHA.
+
+A blob SHA names an exact file content, so entries never go stale and
+can be shared between analyses: the base-side version of a file is
+usually the same blob for every open PR against a branch. BlobCache is
+an LRU bounded by the total size of the cached text.
+
+ASTCache holds parsed modules for one analysis, so every static pass
+walks the same tree instead of re-parsing the file. Parse failures are
+cached too, so a broken file costs one attempt.
+"""
+
+import ast
+import hashlib
+import threading
+import warnings
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+
+class FileVersions:
+    """Base and head revisions of one changed file (None where absent)."""
+
+    __slots__ = ("path", "base_sha", "base", "head_sha", "head")
+
+    def __init__(self, path: str, base_sha: Optional[str] = None, base: Optional[str] = None,
+                 head_sha: Optional[str] = None, head: Optional[str] = None):
+        self.path = path
+        self.base_sha = base_sha
+        self.base = base
+        self.head_sha = head_sha
+        self.head = head
+
+
+class BlobCache:
+    """Thread-safe LRU of ``blob sha -> text``, bounded by total characters."""
+
+    def __init__(self, max_chars: int = 64 * 1024 * 1024):
+        self.max_chars = max_chars
+        self._data: "OrderedDict[str, str]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, sha: str) -> Optional[str]:
+        with self._lock:
+            text = self._data.get(sha)
+            if text is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(sha)
+            self.hits += 1
+            return text
+
+    def put(self, sha: str, text: str) -> None:
+        if len(text) > self.max_chars:
+            return
+        with self._lock:
+            old = self._data.pop(sha, None)
+            if old is not None:
+                self._size -= len(old)
+            self._data[sha] = text
+            self._size += len(text)
+            while self._size > self.max_chars:
+                _, evicted = self._data.popitem(last=False)
+                self._size -= len(evicted)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._data),
+            "chars": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def blob_sha(text: str) -> str:
+    """Git blob SHA of ``text`` (what the files and blobs APIs report for that content)."""
+    data = text.encode("utf-8")
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+class ASTCache:
+    """Thread-safe LRU of ``blob sha -> ast.Module`` (or the parse error).
+
+    Memory is bounded by an estimate: a CPython AST takes roughly
+    ``AST_BYTES_PER_CHAR`` bytes per character of source.
+    """
+
+    AST_BYTES_PER_CHAR = 12
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()  # sha -> (tree, error, cost)
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.parses = 0
+        self.failures = 0
+
+    def parse(self, sha: Optional[str], source: str, filename: str = "<unknown>") -> Optional[ast.Module]:
+        """The parsed module for ``source``, or None if it doesn't parse."""
+        sha = sha or blob_sha(source)
+        with self._lock:
+            entry = self._data.get(sha)
+            if entry is not None:
+                self._data.move_to_end(sha)
+                self.hits += 1
+                return entry[0]
+
+        tree, error = None, None
+        try:
+            with warnings.catch_warnings():
+                # Invalid escape sequences etc. in reviewed code aren't our concern
+                warnings.simplefilter("ignore", SyntaxWarning)
+                tree = ast.parse(source, filename=filename)
+        except (SyntaxError, ValueError, RecursionError, MemoryError) as e:
+            error = f"{type(e).__name__}: {e}"
+
+        cost = len(source) * self.AST_BYTES_PER_CHAR if tree is not None else len(error)
+        with self._lock:
+            self.parses += 1
+            if error is not None:
+                self.failures += 1
+            if cost <= self.max_bytes and sha not in self._data:
+                self._data[sha] = (tree, error, cost)
+                self._size += cost
+                while self._size > self.max_bytes:
+                    _, evicted = self._data.popitem(last=False)
+                    self._size -= evicted[2]
+        return tree
+
+    def error(self, sha: str) -> Optional[str]:
+        """The recorded parse error for ``sha``, if it failed to parse."""
+        with self._lock:
+            entry = self._data.get(sha)
+            return entry[1] if entry is not None else None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._data),
+            "estimated_bytes": self._size,
+            "hits": self.hits,
+            "parses": self.parses,
+            "failures": self.failures,
+        }
+
+
+_blob_cache: Optional[BlobCache] = None
+_blob_cache_lock = threading.Lock()
+
+
+def get_blob_cache() -> BlobCache:
+    """Process-wide blob cache sized by ``settings.source_cache_max_mb``."""
+    from config import settings
+
+    global _blob_cache
+    with _blob_cache_lock:
+        if _blob_cache is None:
+            _blob_cache = BlobCache(settings.source_cache_max_mb * 1024 * 1024)
+        return _blob_cache
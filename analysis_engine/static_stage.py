@@ -0,0 +1,200 @@
+"""Static-analysis stage: per-file work, optionally fanned out to processes.
+
+AST parsing and the metrics walk are pure Python and hold the GIL, so a
+PR touching hundreds of Python files keeps one core busy while the
+others idle. With ``processes > 1`` and at least ``min_files`` Python
+files, ``StaticAnalysisStage`` sends files to a process pool in chunks of
+``chunk_size``. Chunking keeps the pickling/IPC cost per task low. Each
+child keeps its own CodeAnalyzer and AST cache.
+
+Results are merged in diff order whatever order the chunks finish in, so
+the output is the same as a serial run. ``mode`` in the result says which
+path ran: ``"pool"`` or ``"in-process"``.
+
+``cpu_budget`` caps the CPU seconds spent on the whole PR, summed over
+every process. Time is measured per thread (``time.thread_time``), so
+other analyses and the LLM threads sharing a ``--pool=threads`` worker
+don't use up this PR's budget. The shared counter is checked before each file, so a
+single large file can run past it. Files skipped once the budget is spent
+get the cheap added-line scans only (symbols and security regexes) and
+are listed in ``skipped_files``.
+
+Celery's prefork workers are daemonic and can't start children. There
+the stage runs in-process; use ``--pool=threads`` or ``--pool=solo``
+workers to get the process pool.
+"""
+
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from analysis_engine.code_analyzer import CodeAnalyzer
+from analysis_engine.diff_index import DiffIndex, FileDiff
+from analysis_engine.security_scanner import scan_lines
+from analysis_engine.source_cache import ASTCache, FileVersions
+
+# (position in the diff, file diff, base/head sources)
+_Item = Tuple[int, FileDiff, Optional[FileVersions]]
+
+
+class _CPUCounter:
+    """In-process stand-in for the ``multiprocessing.Value`` used by the pool."""
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = multiprocessing.Lock()
+
+    def get_lock(self):
+        return self._lock
+
+
+def _analyze_items(analyzer: CodeAnalyzer, items: List[_Item], spent, budget: float
+                   ) -> List[Tuple[int, Optional[Dict[str, Any]]]]:
+    """``analyze_file`` each item until ``spent`` reaches ``budget`` (None = skipped)."""
+    results = []
+    for position, file_diff, versions in items:
+        if budget and spent.value >= budget:
+            results.append((position, None))
+            continue
+        start = time.thread_time()
+        results.append((position, analyzer.analyze_file(file_diff, versions)))
+        with spent.get_lock():
+            spent.value += time.thread_time() - start
+    return results
+
+
+# Per-child state, set up once by the pool initializer
+_child_analyzer: Optional[CodeAnalyzer] = None
+_child_spent = None
+_child_budget = 0.0
+
+
+def _init_child(ast_cache_bytes: int, spent, budget: float) -> None:
+    global _child_analyzer, _child_spent, _child_budget
+    _child_analyzer = CodeAnalyzer(ASTCache(ast_cache_bytes))
+    _child_spent = spent
+    _child_budget = budget
+
+
+def _analyze_chunk(items: List[_Item]) -> List[Tuple[int, Optional[Dict[str, Any]]]]:
+    return _analyze_items(_child_analyzer, items, _child_spent, _child_budget)
+
+
+def _pool_context():
+    # Never fork: the parent has live threads (HTTP pools, Celery internals)
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+class StaticAnalysisStage:
+    """Runs CodeAnalyzer.analyze_file over a diff and merges the results."""
+
+    def __init__(self, analyzer: CodeAnalyzer, processes: int = 0, chunk_size: int = 8,
+                 min_files: int = 16, cpu_budget: float = 0.0, ast_cache_bytes: int = 256 * 1024 * 1024):
+        self.analyzer = analyzer
+        self.processes = processes
+        self.chunk_size = max(1, chunk_size)
+        self.min_files = min_files
+        self.cpu_budget = cpu_budget
+        self.ast_cache_bytes = ast_cache_bytes
+
+    def _use_pool(self, python_files: int) -> bool:
+        if self.processes <= 1 or python_files < self.min_files:
+            return False
+        if multiprocessing.current_process().daemon:
+            print("[static] Daemonic worker process; running static analysis in-process")
+            return False
+        return True
+
+    def run(self, index: DiffIndex, sources: Optional[Dict[str, FileVersions]] = None) -> Dict[str, Any]:
+        sources = sources or {}
+        items = [(pos, fd, sources.get(fd.filename)) for pos, fd in enumerate(index)]
+        python_files = sum(1 for _, fd, _ in items if fd.filename.endswith(".py"))
+        wall_start = time.monotonic()
+
+        results: Dict[int, Optional[Dict[str, Any]]] = {}
+        mode = "in-process"
+        if self._use_pool(python_files):
+            try:
+                results, cpu_seconds = self._run_pool(items)
+                mode = "pool"
+            except Exception as e:  # BrokenProcessPool, OSError, ...
+                print(f"[static] Process pool failed ({e}); running in-process")
+                results = {}
+        if not results:
+            mode = "in-process"
+            spent = _CPUCounter()
+            results = dict(_analyze_items(self.analyzer, items, spent, self.cpu_budget))
+            cpu_seconds = spent.value
+
+        merged = self._merge(items, results)
+        merged["cpu_seconds"] = round(cpu_seconds, 3)
+        merged["mode"] = mode
+        label = f"{self.processes} processes" if mode == "pool" else mode
+        print(f"[static] {len(items)} file(s) in {time.monotonic() - wall_start:.2f}s "
+              f"({label}, {cpu_seconds:.2f} CPU-s, {len(merged['skipped_files'])} skipped)")
+        return merged
+
+    def _run_pool(self, items: List[_Item]) -> Tuple[Dict[int, Optional[Dict[str, Any]]], float]:
+        ctx = _pool_context()
+        spent = ctx.Value("d", 0.0)
+        # Biggest files first so one large file doesn't trail at the end;
+        # the merge restores diff order
+        ordered = sorted(items, key=lambda item: -len(item[2].head or "") if item[2] else 0)
+        chunks = [ordered[i:i + self.chunk_size] for i in range(0, len(ordered), self.chunk_size)]
+        per_child_cache = max(1, self.ast_cache_bytes // self.processes)
+        results: Dict[int, Optional[Dict[str, Any]]] = {}
+        with ProcessPoolExecutor(max_workers=min(self.processes, len(chunks)), mp_context=ctx,
+                                 initializer=_init_child,
+                                 initargs=(per_child_cache, spent, self.cpu_budget)) as pool:
+            for chunk_results in pool.map(_analyze_chunk, chunks):
+                results.update(chunk_results)
+        return results, spent.value
+
+    def _merge(self, items: List[_Item], results: Dict[int, Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+        diff_analysis = {
+            "functions_added": [],
+            "functions_modified": [],
+            "functions_removed": [],
+            "dependencies_changed": [],
+            "parse_errors": [],
+        }
+        complexity_metrics = {
+            "cyclomatic_complexity": 0, "cognitive_complexity": 0, "function_count": 0,
+            "nesting_depth": 0, "loc": 0, "import_fan_out": 0,
+        }
+        function_metrics = []
+        issues = []
+        skipped = []
+
+        for position, file_diff, _ in items:
+            result = results.get(position)
+            if result is None:
+                # Over the CPU budget: cheap added-line scans only
+                skipped.append(file_diff.filename)
+                result = {"symbols": self.analyzer._analyze_file(file_diff),
+                          "parse_error": None, "complexity": None, "issues": scan_lines(file_diff)}
+            issues.extend(result["issues"])
+            for key in ("functions_added", "functions_modified", "functions_removed", "dependencies_changed"):
+                diff_analysis[key].extend(result["symbols"][key])
+            if result["parse_error"] is not None:
+                diff_analysis["parse_errors"].append({"file": file_diff.filename, "error": result["parse_error"]})
+
+            m = result["complexity"]
+            if m is None:
+                continue
+            for key in ("cyclomatic_complexity", "cognitive_complexity", "function_count",
+                        "loc", "import_fan_out"):
+                complexity_metrics[key] += m.get(key, 0)
+            complexity_metrics["nesting_depth"] = max(complexity_metrics["nesting_depth"], m.get("nesting_depth", 0))
+            function_metrics.extend({"file": file_diff.filename, **record} for record in m.get("functions", []))
+
+        return {
+            "diff_analysis": diff_analysis,
+            "complexity_metrics": complexity_metrics,
+            "function_metrics": function_metrics,
+            "issues": issues,
+            "skipped_files": skipped,
+        }
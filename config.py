@@ -25,15 +25,106 @@ class Settings:
         "sqlite:///./dev.db"
     )
 
+    # Connection pool (Postgres). Size these so that
+    # (uvicorn workers + celery concurrency) × (pool_size + max_overflow)
+    # stays below the server's max_connections.
+    db_pool_size: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    db_max_overflow: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    db_pool_timeout: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    db_pool_recycle: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    db_pool_pre_ping: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+    # Per-statement timeout in milliseconds; 0 disables it.
+    db_statement_timeout_ms: int = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+
     # OpenRouter API settings
     openrouter_api_key: str = os.getenv("OPENROUTER_API_KEY", "")
     llm_model: str = os.getenv("LLM_MODEL", "deepseek/deepseek-r1")
 
+    # LLM review pass execution. The four review passes (requirements,
+    # security, performance, quality) are independent, so they run on a
+    # bounded thread pool. Set LLM_MAX_CONCURRENCY=1 to run them serially.
+    llm_max_concurrency: int = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+    llm_pass_timeout: float = float(os.getenv("LLM_PASS_TIMEOUT", "120"))
+    # Wall-clock budget for one whole review (every pass and chunk). Chunks
+    # that have not started when it runs out are skipped.
+    llm_review_timeout: float = float(os.getenv("LLM_REVIEW_TIMEOUT", "600"))
+
+    # Large diffs are split into chunks of ~LLM_CHUNK_TOKENS tokens at file
+    # and hunk boundaries, reviewed in parallel, then merged. Files beyond
+    # LLM_MAX_CHUNKS chunks are skipped (and reported as such).
+    llm_chunk_tokens: int = int(os.getenv("LLM_CHUNK_TOKENS", "6000"))
+    llm_max_chunks: int = int(os.getenv("LLM_MAX_CHUNKS", "8"))
+
+    # LLM response cache. Backend is one of: memory, db, redis, off.
+    # "db" stores entries in the llm_response_cache table of DATABASE_URL;
+    # "redis" uses REDIS_URL.
+    llm_cache_backend: str = os.getenv("LLM_CACHE_BACKEND", "memory")
+    llm_cache_ttl: int = int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+    llm_cache_max_entries: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2000"))
+
+    # Webhook ingestion. "outbox" verifies the signature, appends the
+    # delivery to a local SQLite (WAL) outbox and answers 202 immediately;
+    # a background dispatcher then creates Review rows and Celery jobs.
+    # "direct" does all of that inline before responding.
+    webhook_ingestion_mode: str = os.getenv("WEBHOOK_INGESTION_MODE", "outbox")
+    webhook_outbox_path: str = os.getenv("WEBHOOK_OUTBOX_PATH", "./webhook_outbox.db")
+    webhook_dispatch_batch: int = int(os.getenv("WEBHOOK_DISPATCH_BATCH", "20"))
+    # Analyses are delayed by this many seconds so a burst of pushes to one
+    # PR collapses into a single run for the latest head SHA.
+    webhook_debounce_seconds: float = float(os.getenv("WEBHOOK_DEBOUNCE_SECONDS", "20"))
+
+    # Analysis scheduling (see scheduling.py). PRs with at most
+    # ANALYSIS_SMALL_PR_LINES changed lines go to the high-priority lane,
+    # ones with ANALYSIS_LARGE_PR_LINES or more to the low lane.
+    analysis_installation_concurrency: int = int(os.getenv("ANALYSIS_INSTALLATION_CONCURRENCY", "2"))
+    analysis_defer_seconds: float = float(os.getenv("ANALYSIS_DEFER_SECONDS", "15"))
+    # Deferrals (fair-share or GitHub rate limit) before a job gives up
+    analysis_max_deferrals: int = int(os.getenv("ANALYSIS_MAX_DEFERRALS", "240"))
+    analysis_small_pr_lines: int = int(os.getenv("ANALYSIS_SMALL_PR_LINES", "200"))
+    analysis_large_pr_lines: int = int(os.getenv("ANALYSIS_LARGE_PR_LINES", "2000"))
+    # Upper bound on PRs scheduled by one POST /api/analyze/batch call
+    analysis_batch_max_prs: int = int(os.getenv("ANALYSIS_BATCH_MAX_PRS", "200"))
+
     # Redis settings for Celery (Docker mapped port)
     redis_url: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 
     # GitHub API settings
     github_token: Optional[str] = os.getenv("GITHUB_TOKEN")
+    # Installation tokens are refreshed this many seconds before they expire
+    github_token_refresh_margin: float = float(os.getenv("GITHUB_TOKEN_REFRESH_MARGIN", "300"))
+    # HTTP connections kept per installation client
+    github_pool_size: int = int(os.getenv("GITHUB_POOL_SIZE", "10"))
+    # Below this many remaining requests, calls are spaced over the rest of
+    # the rate-limit window; waits longer than GITHUB_MAX_RATE_WAIT seconds
+    # defer the analysis instead of blocking the worker.
+    github_rate_low_watermark: int = int(os.getenv("GITHUB_RATE_LOW_WATERMARK", "100"))
+    github_max_rate_wait: float = float(os.getenv("GITHUB_MAX_RATE_WAIT", "60"))
+    github_etag_cache_entries: int = int(os.getenv("GITHUB_ETAG_CACHE_ENTRIES", "5000"))
+    # Cached project docs (README, CONTRIBUTING, docs/*.md) are revalidated
+    # against the default branch after this many seconds, and cut to
+    # PROJECT_DOCS_MAX_CHARS in the requirement-review prompt.
+    project_docs_ttl: int = int(os.getenv("PROJECT_DOCS_TTL", "86400"))
+    project_docs_max_chars: int = int(os.getenv("PROJECT_DOCS_MAX_CHARS", "6000"))
+    # Parallel page fetches per PR when collecting files, commits and issues
+    github_fetch_concurrency: int = int(os.getenv("GITHUB_FETCH_CONCURRENCY", "8"))
+    # Read changed files from the PR's raw diff (one request, no per-file
+    # patch omissions) instead of paging through the files API
+    github_raw_diff: bool = os.getenv("GITHUB_RAW_DIFF", "true").lower() in ("1", "true", "yes")
+    # Per-process cache of file contents keyed by git blob SHA (megabytes)
+    source_cache_max_mb: int = int(os.getenv("SOURCE_CACHE_MAX_MB", "64"))
+    # Most Python files per PR whose base/head sources are fetched for the
+    # AST function diff; the rest fall back to scanning added lines
+    ast_diff_max_files: int = int(os.getenv("AST_DIFF_MAX_FILES", "200"))
+    # Estimated memory for the per-analysis parsed-AST cache (megabytes)
+    ast_cache_max_mb: int = int(os.getenv("AST_CACHE_MAX_MB", "256"))
+    # Per-file static analysis across processes (0/1 = in the task's process).
+    # Needs non-daemonic workers, e.g. `celery worker --pool=threads`
+    static_analysis_processes: int = int(os.getenv("STATIC_ANALYSIS_PROCESSES", "0"))
+    static_analysis_chunk_size: int = int(os.getenv("STATIC_ANALYSIS_CHUNK_SIZE", "8"))
+    # Smaller PRs aren't worth the pool start-up
+    static_analysis_min_files: int = int(os.getenv("STATIC_ANALYSIS_MIN_FILES", "16"))
+    # CPU seconds of static analysis per PR, across processes (0 = no cap)
+    static_analysis_cpu_budget: float = float(os.getenv("STATIC_ANALYSIS_CPU_BUDGET", "120"))
 
 
 settings = Settings()
\ No newline at end of file
@@ -1,114 +1,304 @@
-from github import Github
+from github_integration.rest import GitHubAPI, RateLimited
+from analysis_engine.diff_chunker import iter_diff_files
+from analysis_engine.source_cache import FileVersions, blob_sha
 from utils.helpers import parse_issue_references
-from typing import Dict, List, Any
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+from urllib.parse import quote
 import json
+import math
+
+# Raw file contents instead of the base64 JSON envelope
+RAW_MEDIA_TYPE = "application/vnd.github.raw"
+# Just the commit SHA for a ref
+SHA_MEDIA_TYPE = "application/vnd.github.sha"
+# Whole PR as `git diff` output
+DIFF_MEDIA_TYPE = "application/vnd.github.diff"
+
+
+def _full_sha(sha: Optional[str]) -> Optional[str]:
+    """``sha`` if it is a full 40-character SHA (diffs may abbreviate them)."""
+    return sha if sha and len(sha) == 40 else None
+
+
+def _isoformat(timestamp: str) -> str:
+    """Normalise GitHub's ``...Z`` timestamps to ``datetime.isoformat()``."""
+    if not timestamp:
+        return ""
+    return datetime.fromisoformat(timestamp.replace("Z", "+00:00")).isoformat()
+
 
 class DataCollector:
-    def __init__(self, github_client: Github):
-        self.github_client = github_client
-        
+    """Collects PR, commit, issue and docs context through the REST layer.
+
+    List endpoints are fetched page-by-page in parallel: the PR and issue
+    objects report how many files, commits and comments they have, so every
+    page URL is known up front and can go to a bounded thread pool. Only
+    the main thread submits work, so the pool can't deadlock on itself.
+
+    With ``raw_diff=True`` changed files come from the PR's ``git diff``
+    media type in a single streamed request, parsed file by file as it
+    downloads, instead of paging through the files API (which also omits
+    patches for large files). If GitHub refuses the diff (too large), the
+    files API is used instead.
+    """
+
+    PER_PAGE = 100
+
+    def __init__(self, api: GitHubAPI, max_workers: int = 8, raw_diff: bool = False):
+        self.api = api
+        self.max_workers = max(1, max_workers)
+        self.raw_diff = raw_diff
+
+    def _submit_pages(self, pool: ThreadPoolExecutor, path: str, count: int) -> List[Future]:
+        pages = max(1, math.ceil((count or 0) / self.PER_PAGE))
+        return [
+            pool.submit(self.api.get_json, path, {"per_page": self.PER_PAGE, "page": page})
+            for page in range(1, pages + 1)
+        ]
+
+    @staticmethod
+    def _gather(futures: List[Future]) -> List[Any]:
+        items = []
+        for future in futures:
+            items.extend(future.result() or [])
+        return items
+
     def collect_pr_data(self, repo_name: str, pr_number: int) -> Dict[str, Any]:
         """Collect all data for a pull request"""
-        repo = self.github_client.get_repo(repo_name)
-        pr = repo.get_pull(int(pr_number))
-        
+        pr_path = f"/repos/{repo_name}/pulls/{int(pr_number)}"
+        pr = self.api.get_json(pr_path)
+
         # Collect PR data
         pr_data = {
             "pr_id": pr_number,
-            "title": pr.title,
-            "description": pr.body,
-            "author": pr.user.login,
+            "title": pr["title"],
+            "description": pr.get("body"),
+            "author": (pr.get("user") or {}).get("login"),
+            "head_sha": pr["head"]["sha"],
+            "base_sha": pr["base"]["sha"],
+            "default_branch": ((pr.get("base") or {}).get("repo") or {}).get("default_branch"),
             "files_changed": [],
             "diff": "",
             "commit_messages": [],
             "issue_context": {},
             "project_docs": {},
-            "timestamp": pr.created_at.isoformat()
+            "timestamp": _isoformat(pr.get("created_at"))
         }
-        
-        # Collect changed files
-        files = pr.get_files()
-        for file in files:
-            pr_data["files_changed"].append({
-                "filename": file.filename,
-                "status": file.status,  # added, modified, removed
-                "patch": file.patch or ""
-            })
-            
-        # Collect commits
-        commits = pr.get_commits()
-        for commit in commits:
-            pr_data["commit_messages"].append(commit.commit.message)
-            
+
         # Parse issue references
-        issue_numbers = parse_issue_references(pr.body or "")
+        issue_numbers = parse_issue_references(pr.get("body") or "")
         pr_data["issue_numbers"] = issue_numbers
-        
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="collect") as pool:
+            diff_files = pool.submit(self.collect_diff_files, repo_name, pr_number) if self.raw_diff else None
+            file_pages = None if self.raw_diff else \
+                self._submit_pages(pool, f"{pr_path}/files", pr.get("changed_files"))
+            commit_pages = self._submit_pages(pool, f"{pr_path}/commits", pr.get("commits"))
+            # Linked issues are fetched alongside files and commits
+            issues = self._collect_issues(pool, repo_name, issue_numbers) if issue_numbers else {}
+
+            files = None
+            if diff_files is not None:
+                try:
+                    files = diff_files.result()
+                except RateLimited:
+                    raise
+                except Exception as e:
+                    print(f"Raw diff unavailable for PR #{pr_number} ({e}); using the files API")
+            if files is None:
+                files = self._gather(
+                    file_pages or self._submit_pages(pool, f"{pr_path}/files", pr.get("changed_files"))
+                )
+
+            # Collect changed files
+            for file in files:
+                entry = {
+                    "filename": file["filename"],
+                    "status": file["status"],  # added, modified, removed
+                    "patch": file.get("patch") or ""
+                }
+                # Blob SHAs and rename source, for collect_file_versions
+                for key in ("sha", "previous_sha", "previous_filename"):
+                    if file.get(key):
+                        entry[key] = file[key]
+                pr_data["files_changed"].append(entry)
+
+            # Collect commits
+            for commit in self._gather(commit_pages):
+                pr_data["commit_messages"].append(commit["commit"]["message"])
+
         # Collect linked issues
-        if issue_numbers:
-            pr_data["issue_context"] = self.collect_issue_data(repo, issue_numbers)
-            
+        pr_data["issue_context"] = issues
+
         return pr_data
-        
-    def collect_issue_data(self, repo, issue_numbers: List[int]) -> Dict[str, Any]:
+
+    def collect_diff_files(self, repo_name: str, pr_number: int) -> List[Dict[str, str]]:
+        """Changed files parsed from the PR's ``git diff`` (one streamed request)."""
+        lines = self.api.stream_lines(f"/repos/{repo_name}/pulls/{int(pr_number)}", DIFF_MEDIA_TYPE)
+        return list(iter_diff_files(lines))
+
+    def collect_issue_data(self, repo_name: str, issue_numbers: List[int]) -> Dict[str, Any]:
         """Collect data from linked issues"""
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="collect") as pool:
+            return self._collect_issues(pool, repo_name, issue_numbers)
+
+    def _collect_issues(self, pool: ThreadPoolExecutor, repo_name: str,
+                        issue_numbers: List[int]) -> Dict[str, Any]:
+        issue_futures = {
+            issue_num: pool.submit(self.api.get_json, f"/repos/{repo_name}/issues/{issue_num}")
+            for issue_num in issue_numbers
+        }
+
+        # Comment pages are submitted as each issue arrives
+        comment_futures = {}
+        for issue_num, future in issue_futures.items():
+            try:
+                issue = future.result()
+            except RateLimited:
+                raise
+            except Exception as e:
+                print(f"Error collecting issue {issue_num}: {e}")
+                continue
+            comment_futures[issue_num] = (issue, self._submit_pages(
+                pool, f"/repos/{repo_name}/issues/{issue_num}/comments", issue.get("comments")
+            ))
+
         issues_data = {}
-        
-        for issue_num in issue_numbers:
+        for issue_num, (issue, pages) in comment_futures.items():
             try:
-                issue = repo.get_issue(issue_num)
-                issues_data[issue_num] = {
-                    "title": issue.title,
-                    "body": issue.body,
-                    "comments": []
-                }
-                
-                # Collect comments
-                comments = issue.get_comments()
-                for comment in comments:
-                    issues_data[issue_num]["comments"].append({
-                        "author": comment.user.login,
-                        "body": comment.body,
-                        "created_at": comment.created_at.isoformat()
-                    })
+                comments = self._gather(pages)
+            except RateLimited:
+                raise
             except Exception as e:
                 print(f"Error collecting issue {issue_num}: {e}")
-                
+                continue
+            issues_data[issue_num] = {
+                "title": issue["title"],
+                "body": issue.get("body"),
+                "comments": [
+                    {
+                        "author": (comment.get("user") or {}).get("login"),
+                        "body": comment.get("body"),
+                        "created_at": _isoformat(comment.get("created_at"))
+                    }
+                    for comment in comments
+                ]
+            }
+
         return issues_data
-        
-    def collect_project_context(self, repo_name: str) -> Dict[str, Any]:
-        """Collect project documentation context"""
-        repo = self.github_client.get_repo(repo_name)
-        
+
+    def collect_file_versions(self, repo_name: str, base_sha: str, head_sha: str,
+                              files: List[Dict[str, Any]], blob_cache) -> Dict[str, FileVersions]:
+        """Base and head sources of the changed ``files`` (``files_changed`` entries).
+
+        Only these files are fetched, never a whole tree (which GitHub
+        truncates on large repos). A side whose full blob SHA is known - the
+        files API's ``sha`` for the head, a ``--full-index`` diff for either
+        side - is read from ``blob_cache`` or the blobs API; any other side
+        comes from the contents API at ``base_sha``/``head_sha``. Blob
+        contents are immutable, so either way the text is cached under its
+        blob SHA and reused by later analyses.
+        """
+        versions: Dict[str, FileVersions] = {}
+        sides = []  # (versions, side, path, commit, known blob sha)
+        for file in files:
+            path, status = file["filename"], file.get("status")
+            v = versions[path] = FileVersions(path)
+            if status != "added":
+                sides.append((v, "base", file.get("previous_filename") or path,
+                              base_sha, _full_sha(file.get("previous_sha"))))
+            if status != "removed":
+                sides.append((v, "head", path, head_sha, _full_sha(file.get("sha"))))
+        if not sides:
+            return versions
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="collect") as pool:
+            texts = {sha: blob_cache.get(sha) for *_, sha in sides if sha}
+            blobs = {
+                sha: pool.submit(self.api.get_text, f"/repos/{repo_name}/git/blobs/{sha}", RAW_MEDIA_TYPE)
+                for sha, text in texts.items() if text is None
+            }
+            contents = {
+                (path, commit): pool.submit(self.api.get_text, f"/repos/{repo_name}/contents/{quote(path)}",
+                                            RAW_MEDIA_TYPE, {"ref": commit})
+                for _v, _side, path, commit, sha in sides if not sha
+            }
+
+            for sha, future in blobs.items():
+                try:
+                    texts[sha] = future.result()
+                except RateLimited:
+                    raise
+                except Exception as e:
+                    print(f"Error fetching blob {sha[:7]}: {e}")
+                    continue
+                blob_cache.put(sha, texts[sha])
+
+            for v, side, path, commit, sha in sides:
+                if sha is None:
+                    try:
+                        text = contents[(path, commit)].result()
+                    except RateLimited:
+                        raise
+                    except Exception as e:
+                        print(f"Error fetching {path}@{commit[:7]}: {e}")
+                        continue
+                    sha = blob_sha(text)
+                    texts.setdefault(sha, text)
+                    blob_cache.put(sha, text)
+                setattr(v, f"{side}_sha", sha)
+                setattr(v, side, texts.get(sha))
+        return versions
+
+    def branch_head_sha(self, repo_name: str, branch: str) -> str:
+        """Head commit SHA of ``branch`` (a 40-byte response; 304 when unchanged)."""
+        return self.api.get_text(f"/repos/{repo_name}/commits/{branch}", SHA_MEDIA_TYPE).strip()
+
+    def collect_project_context(self, repo_name: str, ref: str = None) -> Dict[str, Any]:
+        """Collect project documentation context, optionally pinned to ``ref``"""
+        contents = f"/repos/{repo_name}/contents"
+        params = {"ref": ref} if ref else None
+
         context = {
             "readme": "",
             "contributing": "",
             "architecture_docs": {}
         }
-        
-        try:
-            # Get README.md
-            readme = repo.get_contents("README.md")
-            context["readme"] = readme.decoded_content.decode("utf-8")
-        except:
-            pass
-            
-        try:
-            # Get CONTRIBUTING.md
-            contributing = repo.get_contents("CONTRIBUTING.md")
-            context["contributing"] = contributing.decoded_content.decode("utf-8")
-        except:
-            pass
-            
-        try:
-            # Get docs folder contents
-            docs_dir = repo.get_contents("docs")
-            if isinstance(docs_dir, list):
-                for file in docs_dir:
-                    if file.name.endswith(".md"):
-                        content = repo.get_contents(file.path)
-                        context["architecture_docs"][file.name] = content.decoded_content.decode("utf-8")
-        except:
-            pass
-            
-        return context
\ No newline at end of file
+
+        def _fetch(path):
+            try:
+                return self.api.get_text(f"{contents}/{path}", RAW_MEDIA_TYPE, params)
+            except RateLimited:
+                raise
+            except Exception:
+                return None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="collect") as pool:
+            # Get README.md, CONTRIBUTING.md and the docs folder listing
+            readme = pool.submit(_fetch, "README.md")
+            contributing = pool.submit(_fetch, "CONTRIBUTING.md")
+            docs_dir = pool.submit(self.api.get_json, f"{contents}/docs", params)
+
+            try:
+                listing = docs_dir.result()
+            except RateLimited:
+                raise
+            except Exception:
+                listing = None
+            doc_files = {}
+            if isinstance(listing, list):
+                doc_files = {
+                    file["name"]: pool.submit(_fetch, file["path"])
+                    for file in listing if file["name"].endswith(".md")
+                }
+
+            context["readme"] = readme.result() or ""
+            context["contributing"] = contributing.result() or ""
+            for name, future in doc_files.items():
+                content = future.result()
+                if content is not None:
+                    context["architecture_docs"][name] = content
+
+        return context
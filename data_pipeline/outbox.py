@@ -0,0 +1,277 @@
+"""Durable local outbox for GitHub webhook deliveries.
+
+The webhook handler only verifies the signature and appends the raw
+delivery here, which is a single SQLite insert in WAL mode (a few
+milliseconds), then acknowledges GitHub. A background dispatcher drains
+the outbox into Review rows and Celery jobs, retrying with exponential
+backoff when Redis or the database is slow or down, so deliveries are
+never lost to a GitHub timeout.
+
+The outbox is a standalone SQLite file (not DATABASE_URL) so ingestion
+keeps working while the main database is degraded. Several API processes
+on one host can share it: rows are claimed inside an IMMEDIATE
+transaction, and claims left behind by a crashed process are released
+after ``LEASE_SECONDS``.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Any, Optional
+
+PENDING = "pending"
+PROCESSING = "processing"
+DONE = "done"
+FAILED = "failed"
+
+
+class WebhookOutbox:
+    """Append-only queue of webhook deliveries backed by SQLite (WAL)."""
+
+    LEASE_SECONDS = 300
+    MAX_ATTEMPTS = 10
+    MAX_BACKOFF_SECONDS = 300
+    RETAIN_DONE_SECONDS = 24 * 3600
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._dup_lock = threading.Lock()
+        self.duplicates = 0
+        self._init_schema()
+
+    # ── connection handling ─────────────────────────────────────────────
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self) -> None:
+        conn = self._conn()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS webhook_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                delivery_id TEXT,
+                event_type TEXT,
+                payload BLOB NOT NULL,
+                received_at REAL NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                claimed_at REAL,
+                last_error TEXT
+            )
+            """
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_webhook_outbox_status_next "
+            "ON webhook_outbox (status, next_attempt_at)"
+        )
+        # GitHub redeliveries reuse X-GitHub-Delivery; done rows are kept for
+        # RETAIN_DONE_SECONDS, which is therefore the dedup window.
+        conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ux_webhook_outbox_delivery "
+            "ON webhook_outbox (delivery_id) WHERE delivery_id IS NOT NULL"
+        )
+
+    # ── producer side ───────────────────────────────────────────────────
+
+    def append(self, event_type: Optional[str], delivery_id: Optional[str], payload: bytes) -> Optional[int]:
+        """Durably record a verified delivery.
+
+        Returns the outbox row id, or None if this delivery id was already
+        recorded (a GitHub redelivery).
+        """
+        now = time.time()
+        cur = self._conn().execute(
+            "INSERT OR IGNORE INTO webhook_outbox "
+            "(delivery_id, event_type, payload, received_at, next_attempt_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (delivery_id, event_type, sqlite3.Binary(payload), now, now),
+        )
+        if cur.rowcount == 0:
+            with self._dup_lock:
+                self.duplicates += 1
+            return None
+        return cur.lastrowid
+
+    # ── consumer side ───────────────────────────────────────────────────
+
+    def claim(self, limit: int) -> list:
+        """Atomically claim up to ``limit`` due deliveries, oldest first."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Release leases abandoned by a crashed dispatcher
+            conn.execute(
+                "UPDATE webhook_outbox SET status = ? WHERE status = ? AND claimed_at < ?",
+                (PENDING, PROCESSING, now - self.LEASE_SECONDS),
+            )
+            rows = conn.execute(
+                "SELECT id, delivery_id, event_type, payload, received_at, attempts "
+                "FROM webhook_outbox WHERE status = ? AND next_attempt_at <= ? "
+                "ORDER BY id LIMIT ?",
+                (PENDING, now, limit),
+            ).fetchall()
+            if rows:
+                conn.executemany(
+                    "UPDATE webhook_outbox SET status = ?, claimed_at = ? WHERE id = ?",
+                    [(PROCESSING, now, row[0]) for row in rows],
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return rows
+
+    def mark_done(self, row_id: int) -> None:
+        self._conn().execute(
+            "UPDATE webhook_outbox SET status = ?, last_error = NULL WHERE id = ?",
+            (DONE, row_id),
+        )
+
+    def mark_retry(self, row_id: int, attempts: int, error: str) -> None:
+        attempts += 1
+        if attempts >= self.MAX_ATTEMPTS:
+            status, next_at = FAILED, time.time()
+        else:
+            status = PENDING
+            next_at = time.time() + min(self.MAX_BACKOFF_SECONDS, 2 ** attempts)
+        self._conn().execute(
+            "UPDATE webhook_outbox SET status = ?, attempts = ?, next_attempt_at = ?, "
+            "claimed_at = NULL, last_error = ? WHERE id = ?",
+            (status, attempts, next_at, error[:1000], row_id),
+        )
+
+    def purge_done(self) -> int:
+        cur = self._conn().execute(
+            "DELETE FROM webhook_outbox WHERE status = ? AND received_at < ?",
+            (DONE, time.time() - self.RETAIN_DONE_SECONDS),
+        )
+        return cur.rowcount
+
+    # ── metrics ─────────────────────────────────────────────────────────
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._conn()
+        counts = dict(conn.execute(
+            "SELECT status, COUNT(*) FROM webhook_outbox GROUP BY status"
+        ).fetchall())
+        oldest, = conn.execute(
+            "SELECT MIN(received_at) FROM webhook_outbox WHERE status IN (?, ?)",
+            (PENDING, PROCESSING),
+        ).fetchone()
+        return {
+            "pending": counts.get(PENDING, 0),
+            "processing": counts.get(PROCESSING, 0),
+            "done": counts.get(DONE, 0),
+            "failed": counts.get(FAILED, 0),
+            "duplicates_ignored": self.duplicates,
+            "oldest_pending_age_seconds": round(time.time() - oldest, 3) if oldest else 0.0,
+        }
+
+
+class OutboxDispatcher:
+    """Background thread draining the outbox into ``handler``.
+
+    ``handler(event_type, delivery_id, event_data)`` does the real work
+    (Review row + Celery enqueue); any exception schedules a retry.
+    """
+
+    PURGE_INTERVAL_SECONDS = 600
+
+    def __init__(
+        self,
+        outbox: WebhookOutbox,
+        handler: Callable[[Optional[str], Optional[str], dict], None],
+        batch_size: int = 20,
+        poll_interval: float = 0.5,
+    ):
+        self.outbox = outbox
+        self.handler = handler
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.dispatched = 0
+        self.retried = 0
+        self.last_lag_seconds = 0.0
+        self.max_lag_seconds = 0.0
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="webhook-outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def notify(self) -> None:
+        """Wake the dispatcher immediately after an append."""
+        self._wake.set()
+
+    def drain_once(self) -> int:
+        """Dispatch one batch. Returns the number of rows handled."""
+        rows = self.outbox.claim(self.batch_size)
+        for row_id, delivery_id, event_type, payload, received_at, attempts in rows:
+            try:
+                event_data = json.loads(bytes(payload).decode("utf-8"))
+                self.handler(event_type, delivery_id, event_data)
+            except Exception as e:
+                print(f"[outbox] Delivery {delivery_id or row_id} failed (attempt {attempts + 1}): {e}")
+                self.outbox.mark_retry(row_id, attempts, str(e))
+                with self._lock:
+                    self.retried += 1
+                continue
+            self.outbox.mark_done(row_id)
+            lag = time.time() - received_at
+            with self._lock:
+                self.dispatched += 1
+                self.last_lag_seconds = lag
+                self.max_lag_seconds = max(self.max_lag_seconds, lag)
+        return len(rows)
+
+    def _run(self) -> None:
+        last_purge = 0.0
+        while not self._stop.is_set():
+            try:
+                handled = self.drain_once()
+                if time.time() - last_purge > self.PURGE_INTERVAL_SECONDS:
+                    self.outbox.purge_done()
+                    last_purge = time.time()
+            except Exception as e:
+                print(f"[outbox] Dispatcher error: {e}")
+                handled = 0
+            if handled < self.batch_size:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.outbox.stats()
+        stats.update({
+            "dispatcher_running": bool(self._thread and self._thread.is_alive()),
+            "dispatched": self.dispatched,
+            "retried": self.retried,
+            "last_dispatch_lag_seconds": round(self.last_lag_seconds, 3),
+            "max_dispatch_lag_seconds": round(self.max_lag_seconds, 3),
+        })
+        return stats
@@ -0,0 +1,158 @@
+"""Project documentation context, cached per repository in ContextCache.
+
+README.md, CONTRIBUTING.md and docs/*.md are fetched once at the default
+branch's head commit and stored as ContextCache rows (one per doc type)
+tagged with that commit SHA. Later analyses of the same repository read
+the rows without touching the GitHub API.
+
+Rows are dropped when a push to the default branch touches one of those
+files (see routes/webhook.py). As a backstop for missed webhooks they are
+revalidated after ``ttl`` seconds. Revalidation costs one SHA lookup and
+only refetches the docs when the default branch has moved.
+"""
+
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+DOC_TYPES = ("readme", "contributing", "architecture")
+ROOT_DOCS = ("README.md", "CONTRIBUTING.md")
+
+
+def is_doc_path(path: str) -> bool:
+    """True for the files collect_project_context reads."""
+    if path in ROOT_DOCS:
+        return True
+    return path.startswith("docs/") and path.endswith(".md") and path.count("/") == 1
+
+
+def push_touches_docs(event_data: Dict[str, Any]) -> bool:
+    """Whether a push event to the default branch may have changed the docs."""
+    repository = event_data.get("repository") or {}
+    default_branch = repository.get("default_branch")
+    if not default_branch or event_data.get("ref") != f"refs/heads/{default_branch}":
+        return False
+    commits = event_data.get("commits") or []
+    # GitHub lists at most 20 commits per push payload; assume the worst
+    if event_data.get("forced") or len(commits) >= 20:
+        return True
+    for commit in commits:
+        for key in ("added", "modified", "removed"):
+            if any(is_doc_path(path) for path in commit.get(key) or []):
+                return True
+    return False
+
+
+def project_context_text(docs: Dict[str, Any], max_chars: int = 6000) -> str:
+    """Flatten cached docs into the PROJECT CONTEXT block of the review prompt.
+
+    README first, then CONTRIBUTING, then docs/*.md by name, each section
+    cut to fit the remaining budget.
+    """
+    sections = []
+    if docs.get("readme"):
+        sections.append(("README.md", docs["readme"]))
+    if docs.get("contributing"):
+        sections.append(("CONTRIBUTING.md", docs["contributing"]))
+    for name in sorted(docs.get("architecture_docs") or {}):
+        sections.append((f"docs/{name}", docs["architecture_docs"][name]))
+
+    parts = []
+    budget = max_chars
+    for title, body in sections:
+        header = f"## {title}\n"
+        if budget <= len(header):
+            break
+        body = body.strip()
+        room = budget - len(header)
+        if len(body) > room:
+            body = body[:room].rstrip() + "\n[...truncated]"
+        parts.append(header + body)
+        budget -= len(parts[-1]) + 2
+    return "\n\n".join(parts)
+
+
+class ProjectDocsCache:
+    """Read/write project docs for a repository as ContextCache rows."""
+
+    def __init__(self, db, ttl: int = 86400):
+        from models import ContextCache
+
+        self.db = db
+        self.ttl = ttl
+        self._model = ContextCache
+
+    def _rows(self, repo_name: str):
+        Entry = self._model
+        return self.db.query(Entry).filter(Entry.repo_name == repo_name).all()
+
+    def get(self, repo_name: str) -> Optional[Dict[str, Any]]:
+        """``{"commit_sha", "fresh", "docs"}`` for the cached docs, or None."""
+        rows = {row.doc_type: row for row in self._rows(repo_name)}
+        if not rows:
+            return None
+        docs = {
+            "readme": rows["readme"].content if "readme" in rows else "",
+            "contributing": rows["contributing"].content if "contributing" in rows else "",
+            "architecture_docs": json.loads(rows["architecture"].content) if "architecture" in rows else {},
+        }
+        fresh = False
+        stamps = [row.last_updated for row in rows.values() if row.last_updated is not None]
+        if stamps:
+            oldest = min(stamps)
+            if oldest.tzinfo is None:
+                oldest = oldest.replace(tzinfo=timezone.utc)
+            fresh = oldest + timedelta(seconds=self.ttl) > datetime.now(timezone.utc)
+        commit_sha = next(iter(rows.values())).commit_sha
+        return {"commit_sha": commit_sha, "fresh": fresh, "docs": docs}
+
+    def put(self, repo_name: str, commit_sha: Optional[str], docs: Dict[str, Any]) -> None:
+        Entry = self._model
+        now = datetime.now(timezone.utc)
+        contents = {
+            "readme": docs.get("readme") or "",
+            "contributing": docs.get("contributing") or "",
+            "architecture": json.dumps(docs.get("architecture_docs") or {}),
+        }
+        rows = {row.doc_type: row for row in self._rows(repo_name)}
+        for doc_type in DOC_TYPES:
+            row = rows.get(doc_type)
+            if row is None:
+                row = Entry(repo_name=repo_name, doc_type=doc_type)
+                self.db.add(row)
+            row.content = contents[doc_type]
+            row.commit_sha = commit_sha
+            row.last_updated = now
+        self.db.commit()
+
+    def touch(self, repo_name: str) -> None:
+        """Mark the cached docs as revalidated."""
+        Entry = self._model
+        self.db.query(Entry).filter(Entry.repo_name == repo_name).update(
+            {Entry.last_updated: datetime.now(timezone.utc)}, synchronize_session=False
+        )
+        self.db.commit()
+
+    def invalidate(self, repo_name: str) -> int:
+        Entry = self._model
+        deleted = self.db.query(Entry).filter(Entry.repo_name == repo_name).delete(synchronize_session=False)
+        self.db.commit()
+        return deleted
+
+
+def load_project_docs(db, collector, repo_name: str, default_branch: Optional[str],
+                      ttl: int = 86400) -> Dict[str, Any]:
+    """Project docs for ``repo_name``, from ContextCache when possible."""
+    cache = ProjectDocsCache(db, ttl)
+    cached = cache.get(repo_name)
+    if cached and cached["fresh"]:
+        return cached["docs"]
+
+    sha = collector.branch_head_sha(repo_name, default_branch) if default_branch else None
+    if cached and sha and cached["commit_sha"] == sha:
+        cache.touch(repo_name)
+        return cached["docs"]
+
+    docs = collector.collect_project_context(repo_name, ref=sha)
+    cache.put(repo_name, sha, docs)
+    return docs
@@ -1,14 +1,69 @@
+import threading
+import time
+
 from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from config import settings
 
+
+class _WaitStatsMixin:
+    """Records how long callers wait for a connection from a QueuePool."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except PoolTimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        # Only successful checkouts count; timeouts and connect errors
+        # would otherwise inflate the count and skew the average wait
+        waited = time.perf_counter() - start
+        with self._stats_lock:
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+        return conn
+
+
+class InstrumentedQueuePool(_WaitStatsMixin, QueuePool):
+    """QueuePool that records how long callers wait for a connection."""
+
+
+class InstrumentedAsyncQueuePool(_WaitStatsMixin, AsyncAdaptedQueuePool):
+    """The async engine's pool, with the same wait statistics."""
+
+
 # Only pass `check_same_thread` for SQLite engines; Postgres and others
 # do not accept that connection option.
 if settings.database_url.startswith("sqlite"):
     engine = create_engine(settings.database_url, connect_args={"check_same_thread": False})
 else:
-    engine = create_engine(settings.database_url)
+    connect_args = {}
+    if settings.db_statement_timeout_ms and settings.database_url.startswith("postgresql"):
+        connect_args["options"] = f"-c statement_timeout={settings.db_statement_timeout_ms}"
+    engine = create_engine(
+        settings.database_url,
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        connect_args=connect_args,
+    )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -18,4 +73,137 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+# ── async engine ─────────────────────────────────────────────────────────
+# FastAPI read endpoints use an AsyncSession so slow queries don't block
+# the event loop. The driver is derived from DATABASE_URL: asyncpg for
+# Postgres, aiosqlite for SQLite.
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def async_database_url(url: str) -> str:
+    scheme, sep, rest = url.partition("://")
+    base = scheme.split("+")[0]
+    return f"{ASYNC_DRIVERS.get(base, scheme)}{sep}{rest}"
+
+
+try:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+    if settings.database_url.startswith("sqlite"):
+        async_engine = create_async_engine(async_database_url(settings.database_url))
+    else:
+        async_connect_args = {}
+        if settings.db_statement_timeout_ms and settings.database_url.startswith("postgres"):
+            async_connect_args["server_settings"] = {
+                "statement_timeout": str(settings.db_statement_timeout_ms)
+            }
+        async_engine = create_async_engine(
+            async_database_url(settings.database_url),
+            poolclass=InstrumentedAsyncQueuePool,
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout,
+            pool_recycle=settings.db_pool_recycle,
+            pool_pre_ping=settings.db_pool_pre_ping,
+            connect_args=async_connect_args,
+        )
+    AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+except ImportError as e:
+    # Async driver (asyncpg / aiosqlite) not installed — get_async_db falls
+    # back to running the sync Session in a worker thread.
+    print(f"Warning: async database driver unavailable ({e}); using threaded sync sessions")
+    async_engine = None
+    AsyncSessionLocal = None
+
+
+class ThreadedSession:
+    """Minimal AsyncSession stand-in backed by a sync Session.
+
+    Only the subset used by the API routes is provided: ``execute`` and
+    ``stream``. Each call runs in Starlette's thread pool, so the event
+    loop stays free even without an async driver.
+    """
+
+    def __init__(self, session):
+        self._session = session
+
+    async def execute(self, statement):
+        from starlette.concurrency import run_in_threadpool
+        return await run_in_threadpool(self._session.execute, statement)
+
+    async def stream(self, statement):
+        from starlette.concurrency import run_in_threadpool
+        result = await run_in_threadpool(
+            self._session.execute, statement.execution_options(yield_per=200)
+        )
+        return _ThreadedStream(result)
+
+    async def close(self):
+        from starlette.concurrency import run_in_threadpool
+        await run_in_threadpool(self._session.close)
+
+
+class _ThreadedStream:
+    def __init__(self, result):
+        self._result = result
+
+    async def partitions(self, size=None):
+        from starlette.concurrency import run_in_threadpool
+        while True:
+            rows = await run_in_threadpool(self._result.fetchmany, size or 200)
+            if not rows:
+                return
+            yield rows
+
+
+async def get_async_db():
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            yield db
+    else:
+        db = ThreadedSession(SessionLocal())
+        try:
+            yield db
+        finally:
+            await db.close()
+
+
+def _pool_stats(pool) -> dict:
+    status = {"pool_class": type(pool).__name__, "status": pool.status()}
+    if isinstance(pool, QueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": pool.overflow(),
+            "max_overflow": pool._max_overflow,
+        })
+    if isinstance(pool, _WaitStatsMixin):
+        checkouts = pool.checkouts
+        status.update({
+            "checkouts": checkouts,
+            "timeouts": pool.timeouts,
+            "wait_avg_ms": round(pool.wait_total / checkouts * 1000, 3) if checkouts else 0.0,
+            "wait_max_ms": round(pool.wait_max * 1000, 3),
+        })
+    return status
+
+
+def pool_status() -> dict:
+    """Snapshot of connection-pool usage for sizing and monitoring.
+
+    Top-level keys describe the sync engine (worker, webhook writes);
+    ``async`` describes the pool behind the async API reads, or is None
+    when the threaded sync fallback is in use.
+    """
+    status = _pool_stats(engine.pool)
+    status["async"] = _pool_stats(async_engine.pool) if async_engine is not None else None
+    return status
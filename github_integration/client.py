@@ -1,8 +1,44 @@
-from github import Github
-from github.AppAuthentication import AppAuthentication
+from github import Github, GithubIntegration
+from github.Auth import AppAuth, Auth
 import os
 import re
+import threading
+import requests
 from config import settings
+from github_integration.token_cache import InstallationTokenCache
+from github_integration.rest import GitHubAPI, RateLimitTracker, ETagCache
+
+
+class CachedInstallationAuth(Auth):
+    """Installation auth that reads its token from the shared token cache.
+
+    The token is looked up on every request, so a long-lived Github client
+    picks up refreshed tokens without being rebuilt.
+    """
+
+    def __init__(self, tokens: InstallationTokenCache, installation_id: int):
+        self._tokens = tokens
+        self.installation_id = installation_id
+
+    @property
+    def token_type(self) -> str:
+        return "token"
+
+    @property
+    def token(self) -> str:
+        return self._tokens.get(self.installation_id)
+
+
+# Shared by every GitHubAppClient in the process: one GithubIntegration for
+# token exchanges, one pooled Github client and one REST layer per
+# installation, and a common rate-limit tracker and ETag cache.
+_integration = None
+_token_cache = None
+_clients = {}
+_apis = {}
+_clients_lock = threading.Lock()
+_rate_tracker = RateLimitTracker(low_watermark=settings.github_rate_low_watermark)
+_etag_cache = ETagCache(max_entries=settings.github_etag_cache_entries)
 
 
 class GitHubAppClient:
@@ -12,46 +48,125 @@ class GitHubAppClient:
         self.app_id = settings.github_app_id
         self.private_key = settings.github_private_key
 
+    def _get_integration(self) -> GithubIntegration:
+        global _integration
+        with _clients_lock:
+            if _integration is None:
+                _integration = GithubIntegration(
+                    auth=AppAuth(self.app_id, self.private_key),
+                    pool_size=settings.github_pool_size,
+                )
+            return _integration
+
+    def _fetch_token(self, installation_id):
+        authorization = self._get_integration().get_access_token(installation_id)
+        return authorization.token, authorization.expires_at
+
+    def token_cache(self) -> InstallationTokenCache:
+        global _token_cache
+        with _clients_lock:
+            if _token_cache is None:
+                _token_cache = InstallationTokenCache(
+                    self._fetch_token, refresh_margin=settings.github_token_refresh_margin
+                )
+            return _token_cache
+
     def get_installation_client(self, installation_id):
-        """Get authenticated GitHub client for an installation."""
-        auth = AppAuthentication(
-            app_id=self.app_id,
-            private_key=self.private_key,
-            installation_id=installation_id,
-        )
-        return Github(auth=auth)
-
-    def get_repo_client(self, installation_id, repo_name):
-        """Get authenticated GitHub client for a specific repository."""
-        client = self.get_installation_client(installation_id)
-        return client.get_repo(repo_name)
-
-    def post_review_comment(self, repo, pr_number, body):
-        """Post (or update) a review comment on a PR.
+        """Get the shared, authenticated GitHub client for an installation.
+
+        Clients keep their HTTP connection pool between analyses; the
+        installation token is cached and refreshed ahead of expiry.
+        """
+        tokens = self.token_cache()
+        with _clients_lock:
+            client = _clients.get(installation_id)
+            if client is None:
+                client = _clients[installation_id] = Github(
+                    auth=CachedInstallationAuth(tokens, installation_id),
+                    pool_size=settings.github_pool_size,
+                )
+            return client
+
+    def get_api(self, installation_id) -> GitHubAPI:
+        """Get the rate-limit-aware REST layer for an installation.
+
+        Used for the pipeline's reads; see github_integration/rest.py.
+        """
+        tokens = self.token_cache()
+        with _clients_lock:
+            api = _apis.get(installation_id)
+            if api is None:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=settings.github_pool_size,
+                    pool_maxsize=settings.github_pool_size,
+                )
+                session.mount("https://", adapter)
+                api = _apis[installation_id] = GitHubAPI(
+                    tokens, installation_id, _rate_tracker, _etag_cache,
+                    session=session, max_wait=settings.github_max_rate_wait,
+                )
+            return api
+
+    def get_repo_installation_id(self, repo_name):
+        """Look up the App installation id for ``owner/repo``."""
+        owner, name = repo_name.split("/", 1)
+        return self._get_integration().get_repo_installation(owner, name).id
+
+    def list_open_pull_requests(self, installation_id, repo_name):
+        """Return ``[(number, html_url)]`` for the repository's open PRs."""
+        api = self.get_api(installation_id)
+        return [
+            (pr["number"], pr["html_url"])
+            for pr in api.paginate(f"/repos/{repo_name}/pulls", {"state": "open"})
+        ]
+
+    def post_review_comment(self, installation_id, repo_name, pr_number, body):
+        """Post (or update) the review comment on a PR.
+
+        Goes through the rate-limited REST layer, so a secondary rate
+        limit surfaces as ``RateLimited`` like any other call.
 
         Parameters
         ----------
-        repo : github.Repository.Repository
-            PyGithub repository object (already authenticated).
+        installation_id : int
+            App installation the repository belongs to.
+        repo_name : str
+            ``owner/repo``.
         pr_number : int
             The pull-request number.
         body : str
             Markdown body of the comment.
+
+        Returns the comment as GitHub's JSON object.
         """
-        pr = repo.get_pull(int(pr_number))
+        api = self.get_api(installation_id)
         # Check if SmartCode already left a comment — update it instead
-        for comment in pr.get_issue_comments():
-            if "🤖 SmartCode AI Review" in (comment.body or ""):
-                comment.edit(body)
+        for comment in api.paginate(f"/repos/{repo_name}/issues/{int(pr_number)}/comments"):
+            if "🤖 SmartCode AI Review" in (comment.get("body") or ""):
+                updated = api.request("PATCH", f"/repos/{repo_name}/issues/comments/{comment['id']}",
+                                      json_body={"body": body}).json()
                 print(f"[github] Updated existing review comment on PR #{pr_number}")
-                return comment
+                return updated
         # No existing comment — create new one
-        comment = pr.create_issue_comment(body)
+        created = api.request("POST", f"/repos/{repo_name}/issues/{int(pr_number)}/comments",
+                              json_body={"body": body}).json()
         print(f"[github] Posted new review comment on PR #{pr_number}")
-        return comment
+        return created
 
     def parse_issue_references(self, text):
         """Parse issue references from text (#123, fixes #456, etc.)."""
         pattern = r'(?:fixes|closes|resolves)?\s*#(\d+)'
         matches = re.findall(pattern, text, re.IGNORECASE)
-        return [int(match) for match in matches]
\ No newline at end of file
+        return [int(match) for match in matches]
+
+    @staticmethod
+    def stats():
+        """Token, rate-limit and ETag-cache statistics for this process."""
+        return {
+            "installation_clients": len(_clients),
+            "api_sessions": len(_apis),
+            "tokens": _token_cache.stats() if _token_cache is not None else {},
+            "rate_limits": _rate_tracker.snapshot(),
+            "etag_cache": _etag_cache.stats(),
+        }
\ No newline at end of file
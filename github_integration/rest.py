@@ -0,0 +1,352 @@
+"""Rate-limit-aware GitHub REST layer with conditional requests.
+
+Every call the analysis pipeline makes goes through ``GitHubAPI``, reads
+and the review-comment writes alike:
+
+  * Each response's ``X-RateLimit-Remaining`` / ``X-RateLimit-Reset``
+    headers update a per-installation budget. When the budget drops below
+    ``low_watermark``, calls are spaced out evenly over the rest of the
+    window; concurrent callers each claim their own slot. Once the
+    remaining wait exceeds ``max_wait``, ``RateLimited`` is raised, so the
+    caller (the Celery task) can defer instead of holding a worker.
+  * GET responses that carry an ``ETag`` are kept in an LRU. Repeat reads
+    send ``If-None-Match``, and GitHub answers an unchanged resource with
+    ``304 Not Modified``, which doesn't count against the quota.
+  * 403/429 rate-limit responses honour ``Retry-After`` (or the reset
+    time), and the block applies to every caller sharing the installation.
+
+Budgets are tracked per process. Every response carries the
+authoritative remaining count, so each worker resynchronises on its next
+call.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, Optional
+
+API_URL = "https://api.github.com"
+API_VERSION = "2022-11-28"
+JSON_MEDIA_TYPE = "application/vnd.github+json"
+# GitHub asks clients to wait at least a minute after a secondary limit
+# response that carries no Retry-After.
+SECONDARY_LIMIT_WAIT = 60.0
+
+
+class GitHubAPIError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"GitHub API error {status}: {message}")
+        self.status = status
+
+
+class RateLimited(Exception):
+    """The installation's budget is exhausted for longer than we'll block."""
+
+    def __init__(self, key, retry_after: float):
+        super().__init__(f"GitHub rate limit for installation {key}; retry in {retry_after:.0f}s")
+        self.key = key
+        self.retry_after = retry_after
+
+
+class APIResponse:
+    __slots__ = ("status", "headers", "content", "from_cache")
+
+    def __init__(self, status: int, headers: Dict[str, str], content: bytes, from_cache: bool = False):
+        self.status = status
+        self.headers = headers
+        self.content = content
+        self.from_cache = from_cache
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self) -> Any:
+        return json.loads(self.content) if self.content else None
+
+
+class RateLimitTracker:
+    """Per-installation request budget shared by all callers in the process."""
+
+    def __init__(self, low_watermark: int = 100):
+        self.low_watermark = low_watermark
+        self._state: Dict[Any, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def update(self, key, headers: Dict[str, str]) -> None:
+        remaining = headers.get("x-ratelimit-remaining")
+        if remaining is None:
+            return
+        with self._lock:
+            state = self._state.setdefault(key, {"blocked_until": 0.0})
+            state["remaining"] = int(remaining)
+            state["limit"] = int(headers.get("x-ratelimit-limit") or 0)
+            state["reset"] = float(headers.get("x-ratelimit-reset") or 0)
+
+    def block(self, key, seconds: float) -> None:
+        with self._lock:
+            state = self._state.setdefault(key, {"blocked_until": 0.0})
+            state["blocked_until"] = max(state["blocked_until"], time.time() + seconds)
+
+    def _next_slot(self, state: Dict[str, float], now: float) -> float:
+        """Earliest time the next call may start. Caller holds the lock."""
+        slot = max(now, state["blocked_until"])
+        remaining = state.get("remaining")
+        window = state.get("reset", 0) - now
+        if remaining is not None and window > 0:
+            if remaining <= 0:
+                slot = max(slot, state["reset"])
+            elif remaining < self.low_watermark:
+                # Spread what's left evenly over the rest of the window,
+                # one interval after the previously claimed slot
+                slot = max(slot, state.get("last_slot", now) + window / remaining)
+        return slot
+
+    def delay_for(self, key) -> float:
+        """Seconds until the next call for ``key`` may start (without claiming it)."""
+        now = time.time()
+        with self._lock:
+            state = self._state.get(key)
+            if not state:
+                return 0.0
+            return max(0.0, self._next_slot(state, now) - now)
+
+    def reserve(self, key, max_wait: float = float("inf")) -> float:
+        """Claim the next call slot for ``key``; returns seconds to wait for it.
+
+        Slots are handed out under the lock, so concurrent callers queue
+        one pacing interval apart instead of all sleeping the same delay
+        and then firing together. A delay over ``max_wait`` is returned
+        without claiming the slot.
+        """
+        now = time.time()
+        with self._lock:
+            state = self._state.get(key)
+            if not state:
+                return 0.0
+            slot = self._next_slot(state, now)
+            if slot - now <= max_wait:
+                state["last_slot"] = slot
+            return max(0.0, slot - now)
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            return {
+                str(key): {
+                    "remaining": state.get("remaining"),
+                    "limit": state.get("limit"),
+                    "resets_in_seconds": round(max(0.0, state.get("reset", 0) - now), 1),
+                    "blocked_for_seconds": round(max(0.0, state["blocked_until"] - now), 1),
+                }
+                for key, state in self._state.items()
+            }
+
+
+class ETagCache:
+    """LRU of ``(etag, headers, body)`` for conditional GETs."""
+
+    def __init__(self, max_entries: int = 5000, max_body_bytes: int = 1 << 20):
+        self.max_entries = max_entries
+        self.max_body_bytes = max_body_bytes
+        self._data: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> Optional[tuple]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+            return entry
+
+    def put(self, key: tuple, etag: str, headers: Dict[str, str], content: bytes) -> None:
+        if len(content) > self.max_body_bytes:
+            return
+        with self._lock:
+            self._data[key] = (etag, headers, content)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def record(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self) -> Dict[str, Any]:
+        revalidations = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "not_modified": self.hits,
+            "modified": self.misses,
+            "hit_rate": round(self.hits / revalidations, 3) if revalidations else 0.0,
+        }
+
+
+def _is_rate_limited(status: int, headers: Dict[str, str], content: bytes) -> bool:
+    if status == 429:
+        return True
+    if status != 403:
+        return False
+    if "retry-after" in headers or headers.get("x-ratelimit-remaining") == "0":
+        return True
+    return b"rate limit" in content.lower()
+
+
+def _retry_after(headers: Dict[str, str]) -> float:
+    if headers.get("retry-after"):
+        try:
+            return max(1.0, float(headers["retry-after"]))
+        except ValueError:
+            pass
+    if headers.get("x-ratelimit-remaining") == "0" and headers.get("x-ratelimit-reset"):
+        return max(1.0, float(headers["x-ratelimit-reset"]) - time.time())
+    return SECONDARY_LIMIT_WAIT
+
+
+class GitHubAPI:
+    """REST client for one installation.
+
+    ``tokens`` is an InstallationTokenCache (or anything with ``get`` and
+    ``invalidate``). ``session`` is a ``requests.Session``-compatible object,
+    shared so connections are pooled; it is safe to use from several threads.
+    """
+
+    def __init__(self, tokens, installation_id, tracker: RateLimitTracker, etags: ETagCache,
+                 session=None, base_url: str = API_URL, max_wait: float = 60.0,
+                 max_retries: int = 3, timeout: float = 30.0):
+        if session is None:
+            import requests
+            session = requests.Session()
+        self.tokens = tokens
+        self.installation_id = installation_id
+        self.tracker = tracker
+        self.etags = etags
+        self.session = session
+        self.base_url = base_url.rstrip("/")
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.timeout = timeout
+
+    def _pace(self) -> None:
+        delay = self.tracker.reserve(self.installation_id, self.max_wait)
+        if delay > self.max_wait:
+            raise RateLimited(self.installation_id, delay)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _send(self, method: str, url: str, params: Optional[Dict[str, Any]], json_body: Any,
+              accept: str, etag: Optional[str] = None, stream: bool = False):
+        """Send with pacing and retries; returns ``(status, headers, raw)``.
+
+        Rate-limit, auth and server errors are handled here, so the caller
+        only sees a 2xx response, or a 304 when ``etag`` was sent.
+        """
+        for attempt in range(self.max_retries + 1):
+            self._pace()
+            headers = {
+                "Authorization": f"token {self.tokens.get(self.installation_id)}",
+                "Accept": accept,
+                "X-GitHub-Api-Version": API_VERSION,
+            }
+            if etag:
+                headers["If-None-Match"] = etag
+            raw = self.session.request(method, url, params=params, json=json_body,
+                                       headers=headers, timeout=self.timeout, stream=stream)
+            status = raw.status_code
+            resp_headers = {k.lower(): v for k, v in raw.headers.items()}
+            self.tracker.update(self.installation_id, resp_headers)
+
+            if status < 400:
+                return status, resp_headers, raw
+
+            content = raw.content or b""
+            if _is_rate_limited(status, resp_headers, content):
+                wait = _retry_after(resp_headers)
+                self.tracker.block(self.installation_id, wait)
+                if attempt == self.max_retries or wait > self.max_wait:
+                    raise RateLimited(self.installation_id, wait)
+                print(f"[github] Rate limited on installation {self.installation_id}; retrying in {wait:.0f}s")
+                continue  # _pace() sleeps out the block
+            if status == 401 and attempt == 0:
+                # Token revoked or expired early: fetch a new one once
+                self.tokens.invalidate(self.installation_id)
+                continue
+            if status >= 500 and attempt < self.max_retries:
+                time.sleep(min(self.max_wait, 2 ** attempt))
+                continue
+            try:
+                message = json.loads(content).get("message", "")
+            except (ValueError, AttributeError):
+                message = content[:200].decode("utf-8", errors="replace")
+            raise GitHubAPIError(status, message)
+
+        raise GitHubAPIError(status, "retries exhausted")
+
+    def request(self, method: str, path: str, params: Optional[Dict[str, Any]] = None,
+                json_body: Any = None, accept: str = JSON_MEDIA_TYPE) -> APIResponse:
+        url = path if path.startswith("http") else f"{self.base_url}{path}"
+        cache_key = (self.installation_id, url, tuple(sorted((params or {}).items())), accept)
+        cached = self.etags.get(cache_key) if method == "GET" else None
+
+        status, resp_headers, raw = self._send(
+            method, url, params, json_body, accept, etag=cached[0] if cached else None
+        )
+        if status == 304 and cached:
+            self.etags.record(hit=True)
+            return APIResponse(200, cached[1], cached[2], from_cache=True)
+
+        content = raw.content or b""
+        if cached:
+            self.etags.record(hit=False)
+        if method == "GET" and resp_headers.get("etag"):
+            kept = {k: v for k, v in resp_headers.items() if k in ("etag", "link", "content-type")}
+            self.etags.put(cache_key, resp_headers["etag"], kept, content)
+        return APIResponse(status, resp_headers, content)
+
+    def stream_lines(self, path: str, accept: str,
+                     params: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """GET a text resource and yield it line by line as it downloads.
+
+        Lines keep their ``\n``. Streamed bodies bypass the ETag cache.
+        """
+        url = path if path.startswith("http") else f"{self.base_url}{path}"
+        _, _, raw = self._send("GET", url, params, None, accept, stream=True)
+        try:
+            # Split on \n only, so CRLF content keeps its \r like the files API
+            for line in raw.iter_lines(delimiter=b"\n"):
+                yield line.decode("utf-8", errors="replace") + "\n"
+        finally:
+            raw.close()
+
+    def get_json(self, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        return self.request("GET", path, params=params).json()
+
+    def get_text(self, path: str, accept: str, params: Optional[Dict[str, Any]] = None) -> str:
+        return self.request("GET", path, params=params, accept=accept).text
+
+    def paginate(self, path: str, params: Optional[Dict[str, Any]] = None,
+                 per_page: int = 100) -> Iterator[Any]:
+        """Yield items from every page of a list endpoint (follows ``Link: next``)."""
+        params = dict(params or {}, per_page=per_page)
+        url = path
+        while url:
+            response = self.request("GET", url, params=params)
+            for item in response.json() or []:
+                yield item
+            url = _next_link(response.headers.get("link", ""))
+            # The next link already carries the query string
+            params = None
+
+
+def _next_link(link_header: str) -> Optional[str]:
+    for part in link_header.split(","):
+        section = part.split(";")
+        if len(section) > 1 and section[1].strip() == 'rel="next"':
+            return section[0].strip()[1:-1]
+    return None
@@ -0,0 +1,82 @@
+"""Per-installation GitHub App access-token cache.
+
+Installation tokens are valid for an hour. Exchanging one costs a JWT
+signature plus a POST to ``/app/installations/{id}/access_tokens``, so
+tokens are kept per process and only refreshed once they are within
+``refresh_margin`` seconds of expiry. Concurrent callers for the same
+installation share a single refresh.
+"""
+
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Any, Tuple
+
+
+def _to_epoch(expires_at) -> float:
+    if isinstance(expires_at, datetime):
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        return expires_at.timestamp()
+    return float(expires_at)
+
+
+class InstallationTokenCache:
+    """Caches ``fetch(installation_id) -> (token, expires_at)`` results."""
+
+    def __init__(self, fetch: Callable[[int], Tuple[str, Any]], refresh_margin: float = 300):
+        self._fetch = fetch
+        self.refresh_margin = refresh_margin
+        self._tokens: Dict[int, Tuple[str, float]] = {}
+        self._locks: Dict[int, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self.hits = 0
+        self.refreshes = 0
+        self.errors = 0
+
+    def _lock_for(self, installation_id: int) -> threading.Lock:
+        with self._locks_guard:
+            lock = self._locks.get(installation_id)
+            if lock is None:
+                lock = self._locks[installation_id] = threading.Lock()
+            return lock
+
+    def _fresh(self, installation_id: int):
+        entry = self._tokens.get(installation_id)
+        if entry and entry[1] - self.refresh_margin > time.time():
+            return entry[0]
+        return None
+
+    def get(self, installation_id: int) -> str:
+        token = self._fresh(installation_id)
+        if token is not None:
+            self.hits += 1
+            return token
+        with self._lock_for(installation_id):
+            # Another thread may have refreshed while we waited
+            token = self._fresh(installation_id)
+            if token is not None:
+                self.hits += 1
+                return token
+            try:
+                token, expires_at = self._fetch(installation_id)
+            except Exception:
+                self.errors += 1
+                raise
+            self._tokens[installation_id] = (token, _to_epoch(expires_at))
+            self.refreshes += 1
+            return token
+
+    def invalidate(self, installation_id: int) -> None:
+        """Drop a token GitHub rejected (e.g. the installation was suspended)."""
+        self._tokens.pop(installation_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            "installations": len(self._tokens),
+            "hits": self.hits,
+            "refreshes": self.refreshes,
+            "errors": self.errors,
+            "min_seconds_to_expiry": round(min((exp - now for _, exp in self._tokens.values()), default=0.0), 1),
+        }
@@ -37,6 +37,15 @@ app.include_router(webhook.router, prefix="/webhook")
 app.include_router(api.router, prefix="/api")
 app.include_router(health.router)
 
+@app.on_event("startup")
+async def start_webhook_dispatcher():
+    webhook.start_dispatcher()
+
+
+@app.on_event("shutdown")
+async def stop_webhook_dispatcher():
+    webhook.stop_dispatcher()
+
 @app.get("/")
 async def root():
     return {"message": "Smart Code Review Bot API"}
@@ -0,0 +1,194 @@
+"""Maintain the repo_metrics_daily rollup table.
+
+The worker and scheduler call `refresh_for_review` whenever a review is
+created or changes status (completed, error, superseded, unchanged). It
+recomputes that review's (repo, day) bucket from source rows — a bounded
+query over one day of one repository, and idempotent when a PR is
+re-analysed. Buckets are written with an upsert, so two workers
+refreshing the same day don't trip the (repo_name, day) constraint.
+
+Each repository also has a watermark: the newest Review.updated_at
+folded into its rollups. A refresh first catches up every bucket with
+reviews changed since the watermark (e.g. after an earlier refresh
+failed), then advances it. The metrics API compares the watermark with
+the repo's latest change (an index seek) to decide whether the rollup is
+current.
+
+Run this module directly to rebuild rollups from existing data:
+
+    python metrics_rollup.py                 # every repository
+    python metrics_rollup.py --repo org/name # one repository
+"""
+import argparse
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Iterable, Optional
+
+from sqlalchemy import func
+
+from database import SessionLocal
+from models import Review, Finding, RepoMetricsDaily, RepoMetricsWatermark
+
+VERDICT_COLUMNS = {
+    "APPROVE": "verdict_approve",
+    "REVIEW_NEEDED": "verdict_review_needed",
+    "CHANGES_REQUESTED": "verdict_changes_requested",
+}
+
+
+def review_day(created_at: Optional[datetime]) -> date:
+    """UTC calendar day a review is bucketed under."""
+    if created_at is None:
+        return datetime.now(timezone.utc).date()
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return created_at.astimezone(timezone.utc).date()
+
+
+def refresh_rollup(db, repo_name: str, day: date) -> None:
+    """Recompute and upsert one (repo, day) bucket. Caller commits."""
+    start = datetime.combine(day, time.min, tzinfo=timezone.utc)
+    window = (
+        Review.repo_name == repo_name,
+        Review.created_at >= start,
+        Review.created_at < start + timedelta(days=1),
+    )
+
+    reviews_total, = db.query(func.count(Review.id)).filter(*window).one()
+
+    completed = db.query(
+        Review.verdict,
+        func.count(Review.id),
+        func.sum(Review.confidence_score),
+        func.count(Review.confidence_score),
+    ).filter(*window, Review.status == "completed").group_by(Review.verdict).all()
+
+    severity_rows = db.query(Finding.severity, func.count(Finding.id)).join(
+        Review, Finding.review_id == Review.id
+    ).filter(*window, Review.status == "completed").group_by(Finding.severity).all()
+
+    category_rows = db.query(Finding.category, func.count(Finding.id)).join(
+        Review, Finding.review_id == Review.id
+    ).filter(*window, Review.status == "completed").group_by(Finding.category).all()
+
+    values = {
+        "reviews_total": reviews_total,
+        "reviews_completed": 0,
+        "confidence_sum": 0.0,
+        "confidence_count": 0,
+        **{column: 0 for column in VERDICT_COLUMNS.values()},
+    }
+    for verdict, count, conf_sum, conf_count in completed:
+        values["reviews_completed"] += count
+        values["confidence_sum"] += float(conf_sum or 0.0)
+        values["confidence_count"] += conf_count
+        if verdict in VERDICT_COLUMNS:
+            values[VERDICT_COLUMNS[verdict]] = count
+    values["findings_by_severity"] = {sev or "unknown": n for sev, n in severity_rows}
+    values["findings_by_category"] = {cat or "unknown": n for cat, n in category_rows}
+    _upsert_bucket(db, repo_name, day, values)
+
+
+def _upsert_bucket(db, repo_name: str, day: date, values: dict) -> None:
+    """INSERT ... ON CONFLICT (repo_name, day) DO UPDATE for one bucket."""
+    _upsert(db, RepoMetricsDaily, {"repo_name": repo_name, "day": day},
+            {**values, "updated_at": func.now()})
+
+
+def _set_watermark(db, repo_name: str, reviews_updated_at) -> None:
+    # Last writer wins: every writer has folded in all changes up to its value
+    _upsert(db, RepoMetricsWatermark, {"repo_name": repo_name},
+            {"reviews_updated_at": reviews_updated_at})
+
+
+def _upsert(db, model, keys: dict, values: dict) -> None:
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        _merge(db, model, keys, values)
+        return
+    stmt = insert(model).values(**keys, **values)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[getattr(model, column) for column in keys],
+        set_=values,
+    ))
+
+
+def _merge(db, model, keys: dict, values: dict) -> None:
+    """Select-then-write fallback for dialects without ON CONFLICT."""
+    row = db.query(model).filter_by(**keys).first()
+    if row is None:
+        row = model(**keys)
+        db.add(row)
+    for column, value in values.items():
+        setattr(row, column, value)
+
+
+def catch_up(db, repo_name: str, days: Iterable[date] = ()) -> int:
+    """Refresh ``days`` plus buckets with reviews changed since the watermark.
+
+    Then advances the watermark. Caller commits. Returns buckets refreshed.
+    """
+    mark = db.get(RepoMetricsWatermark, repo_name)
+    since = mark.reviews_updated_at if mark is not None else None
+    changed = db.query(Review.created_at, Review.updated_at).filter(Review.repo_name == repo_name)
+    if since is not None:
+        # >=: timestamps can tie with the previous watermark
+        changed = changed.filter(Review.updated_at >= since)
+
+    days = set(days)
+    latest = since
+    for created_at, updated_at in changed.yield_per(1000):
+        days.add(review_day(created_at))
+        if updated_at is not None and (latest is None or updated_at > latest):
+            latest = updated_at
+    for day in sorted(days):
+        refresh_rollup(db, repo_name, day)
+    if latest is not None:
+        _set_watermark(db, repo_name, latest)
+    return len(days)
+
+
+def refresh_for_review(db, review: Review) -> None:
+    """Refresh the review's bucket and any the watermark says are stale, and commit."""
+    catch_up(db, review.repo_name, [review_day(review.created_at)])
+    db.commit()
+
+
+def backfill(repo_name: Optional[str] = None) -> int:
+    """Rebuild rollups from the reviews table. Returns buckets written."""
+    db = SessionLocal()
+    try:
+        stale = db.query(RepoMetricsDaily)
+        if repo_name:
+            stale = stale.filter(RepoMetricsDaily.repo_name == repo_name)
+        stale.delete(synchronize_session=False)
+
+        source = db.query(Review.repo_name, Review.created_at, Review.updated_at)
+        if repo_name:
+            source = source.filter(Review.repo_name == repo_name)
+        buckets = set()
+        latest = {}
+        for name, created, updated in source.yield_per(1000):
+            buckets.add((name, review_day(created)))
+            if updated is not None and (name not in latest or updated > latest[name]):
+                latest[name] = updated
+
+        for name, day in sorted(buckets):
+            refresh_rollup(db, name, day)
+        for name, updated in latest.items():
+            _set_watermark(db, name, updated)
+        db.commit()
+        return len(buckets)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild repo_metrics_daily rollups")
+    parser.add_argument("--repo", help="Only rebuild this repository (owner/name)")
+    args = parser.parse_args()
+    written = backfill(args.repo)
+    print(f"Rebuilt {written} rollup bucket(s)")
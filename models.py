@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, Text, DateTime, Date, ForeignKey, Float, Index, UniqueConstraint
 from sqlalchemy.sql import func
 from database import Base, engine
 from typing import List, Dict, Any
@@ -22,6 +22,12 @@ else:
 
 class Review(Base):
     __tablename__ = 'reviews'
+    __table_args__ = (
+        # Supports the per-repo metrics aggregates and time-bucketed trends
+        Index('ix_reviews_repo_status_created', 'repo_name', 'status', 'created_at'),
+        # Latest change per repo, checked against the rollup watermark
+        Index('ix_reviews_repo_updated', 'repo_name', 'updated_at'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     repo_name = Column(String, index=True)
@@ -31,10 +37,14 @@ class Review(Base):
     status = Column(String, default="pending")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     completed_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     summary = Column(Text, nullable=True)
     confidence_score = Column(Float, nullable=True)  # 0-100 PR confidence
     verdict = Column(String, nullable=True)  # APPROVE / REVIEW_NEEDED / CHANGES_REQUESTED
     score_breakdown = Column(JSONType, nullable=True)  # 5-dimension breakdown
+    file_fingerprints = Column(JSONType, nullable=True)  # {filename: patch sha256} for incremental re-review
+    head_sha = Column(String, nullable=True)  # PR head commit this review is for
+    task_id = Column(String, nullable=True)  # Celery task currently queued for it
     share_token = Column(String, nullable=True, index=True)
     share_password = Column(String, nullable=True)
     share_expires_at = Column(DateTime(timezone=True), nullable=True)
@@ -64,5 +74,67 @@ class ContextCache(Base):
     id = Column(Integer, primary_key=True, index=True)
     repo_name = Column(String, index=True)
     doc_type = Column(String)  # readme, contributing, architecture
-    content = Column(Text)
-    last_updated = Column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+    content = Column(Text)  # architecture: JSON {filename: markdown}
+    commit_sha = Column(String, nullable=True)  # default-branch commit the docs were read at
+    last_updated = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class LLMResponseCache(Base):
+    __tablename__ = 'llm_response_cache'
+
+    id = Column(Integer, primary_key=True, index=True)
+    cache_key = Column(String, unique=True, index=True)  # sha256(model, template, prompt)
+    model = Column(String)
+    template = Column(String)
+    response = Column(JSONType)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_accessed = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+
+class RepoMetricsDaily(Base):
+    """Per-repository, per-day rollup of reviews and findings.
+
+    Maintained by metrics_rollup.refresh_for_review whenever a review is
+    created or changes status; rebuild with `python metrics_rollup.py`.
+    """
+    __tablename__ = 'repo_metrics_daily'
+    __table_args__ = (
+        UniqueConstraint('repo_name', 'day', name='uq_repo_metrics_daily_repo_day'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    repo_name = Column(String, index=True)
+    day = Column(Date, index=True)  # UTC day of Review.created_at
+    reviews_total = Column(Integer, default=0)
+    reviews_completed = Column(Integer, default=0)
+    verdict_approve = Column(Integer, default=0)
+    verdict_review_needed = Column(Integer, default=0)
+    verdict_changes_requested = Column(Integer, default=0)
+    confidence_sum = Column(Float, default=0.0)
+    confidence_count = Column(Integer, default=0)
+    findings_by_severity = Column(JSONType, nullable=True)  # {severity: count}
+    findings_by_category = Column(JSONType, nullable=True)  # {category: count}
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class RepoMetricsWatermark(Base):
+    """Newest Review.updated_at folded into a repository's rollups.
+
+    A review changed after the watermark has not reached
+    repo_metrics_daily yet, so the metrics API answers from the live query.
+    """
+    __tablename__ = 'repo_metrics_watermarks'
+
+    repo_name = Column(String, primary_key=True)
+    reviews_updated_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class AnalysisBatch(Base):
+    """A group of reviews scheduled together by POST /api/analyze/batch."""
+    __tablename__ = 'analysis_batches'
+
+    id = Column(String, primary_key=True)  # opaque handle returned to the caller
+    repo_name = Column(String, nullable=True, index=True)
+    review_ids = Column(JSONType)  # [Review.id, ...] in request order
+    skipped = Column(JSONType, nullable=True)  # [{"pr_url": ..., "reason": ...}]
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
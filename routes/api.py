@@ -1,101 +1,553 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy import func, case, select
 from sqlalchemy.orm import Session
-from database import get_db
-from models import Review, Finding
-from typing import List
+from config import settings
+from database import get_db, get_async_db, engine
+from models import Review, Finding, RepoMetricsDaily, RepoMetricsWatermark, AnalysisBatch
+from github_integration.client import GitHubAppClient
+from scheduling import schedule_review, choose_lane
+from utils.helpers import parse_pr_url
+from typing import Dict, List, Optional
+from datetime import datetime, time, timedelta, timezone
+import base64
+import json
+import uuid
 
 router = APIRouter()
 
 
+FINDING_FIELDS = (
+    "id", "category", "severity", "title", "description", "file_path",
+    "line_number", "confidence_score", "code_snippet", "suggestion",
+    "suggested_fix", "references",
+)
+
+MAX_PAGE_SIZE = 500
+
+
+def _serialize_review(review: Review) -> dict:
+    return {
+        "id": review.id,
+        "repo_name": review.repo_name,
+        "pr_number": review.pr_number,
+        "pr_url": review.pr_url,
+        "status": review.status,
+        "created_at": review.created_at,
+        "completed_at": review.completed_at,
+        "summary": review.summary,
+        "confidence_score": review.confidence_score,
+        "verdict": review.verdict,
+        "score_breakdown": review.score_breakdown,
+        "share_token": review.share_token,
+        "share_password": review.share_password,
+        "share_expires_at": review.share_expires_at,
+    }
+
+
+def _encode_cursor(finding_id: int) -> str:
+    return base64.urlsafe_b64encode(str(finding_id).encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _split_param(value: Optional[str]) -> List[str]:
+    return [v.strip() for v in value.split(",") if v.strip()] if value else []
+
+
 @router.get("/review/{pr_id}")
-async def get_review_status(pr_id: int, db: Session = Depends(get_db)):
-    """Retrieve review status by PR ID."""
-    review = db.query(Review).filter(Review.id == pr_id).first()
+async def get_review_status(
+    pr_id: int,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    severity: Optional[str] = None,
+    category: Optional[str] = None,
+    file_path: Optional[str] = None,
+    fields: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    db=Depends(get_async_db),
+):
+    """Retrieve review status by PR ID.
+
+    Findings can be filtered (comma-separated ``severity`` / ``category``,
+    exact ``file_path``), projected with ``fields``, and paginated with
+    ``limit`` + the opaque ``next_cursor`` from the previous page. Without
+    ``limit`` every matching finding is returned. ``format=ndjson`` streams
+    one JSON object per line: the review first, then each finding, then
+    a ``next_cursor`` line when more pages remain.
+    """
+    review = (await db.execute(select(Review).where(Review.id == pr_id))).scalars().first()
     if not review:
         raise HTTPException(status_code=404, detail="Review not found")
 
-    findings = db.query(Finding).filter(Finding.review_id == pr_id).all()
+    selected = _split_param(fields) or list(FINDING_FIELDS)
+    unknown = [f for f in selected if f not in FINDING_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown finding field(s): {', '.join(unknown)}")
+    # id is always fetched: it is the pagination key
+    columns = [Finding.id] + [getattr(Finding, f) for f in selected if f != "id"]
+
+    query = select(*columns).where(Finding.review_id == pr_id)
+    severities = _split_param(severity)
+    if severities:
+        query = query.where(Finding.severity.in_(severities))
+    categories = _split_param(category)
+    if categories:
+        query = query.where(Finding.category.in_(categories))
+    if file_path:
+        query = query.where(Finding.file_path == file_path)
+    if cursor:
+        query = query.where(Finding.id > _decode_cursor(cursor))
+    query = query.order_by(Finding.id.asc())
+    if limit:
+        # Fetch one extra row to learn whether another page exists
+        query = query.limit(limit + 1)
+
+    def _project(row) -> dict:
+        data = row._mapping
+        return {f: data[f] for f in selected}
+
+    if format == "ndjson":
+        async def _stream():
+            yield json.dumps({"review": _serialize_review(review)}, default=str) + "\n"
+            emitted = 0
+            last_id = None
+            result = await db.stream(query)
+            async for partition in result.partitions(200):
+                for row in partition:
+                    if limit and emitted == limit:
+                        yield json.dumps({"next_cursor": _encode_cursor(last_id)}) + "\n"
+                        return
+                    yield json.dumps(_project(row), default=str) + "\n"
+                    emitted += 1
+                    last_id = row.id
+
+        return StreamingResponse(_stream(), media_type="application/x-ndjson")
+
+    rows = (await db.execute(query)).all()
+    next_cursor = None
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1].id)
+
+    response = {
+        "review": _serialize_review(review),
+        "findings": [_project(row) for row in rows],
+    }
+    if limit:
+        response["next_cursor"] = next_cursor
+    return response
+
+
+def _resolve_installation(repo_name: str, cache: Dict[str, Optional[int]]) -> Optional[int]:
+    """App installation id for a repo, memoised per request; None if not installed."""
+    if repo_name not in cache:
+        try:
+            cache[repo_name] = GitHubAppClient().get_repo_installation_id(repo_name)
+        except Exception as e:
+            print(f"[api] No installation found for {repo_name}: {e}")
+            cache[repo_name] = None
+    return cache[repo_name]
+
+
+@router.post("/analyze")
+def trigger_analysis(pr_url: str, installation_id: Optional[int] = None,
+                     db: Session = Depends(get_db)):
+    """Manually trigger analysis for a PR.
+
+    Creates (or reuses the pending) Review and queues the analysis on the
+    high-priority lane. ``installation_id`` is looked up from the GitHub
+    App when omitted.
+    """
+    try:
+        repo_name, pr_number = parse_pr_url(pr_url)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if installation_id is None:
+        installation_id = _resolve_installation(repo_name, {})
+        if installation_id is None:
+            raise HTTPException(status_code=404, detail=f"GitHub App is not installed on {repo_name}")
 
+    review, queued = schedule_review(
+        db, repo_name, pr_number, installation_id, trigger="manual", pr_url=pr_url,
+    )
     return {
-        "review": {
-            "id": review.id,
-            "repo_name": review.repo_name,
-            "pr_number": review.pr_number,
-            "pr_url": review.pr_url,
-            "status": review.status,
-            "created_at": review.created_at,
-            "completed_at": review.completed_at,
-            "summary": review.summary,
-            "confidence_score": review.confidence_score,
-            "verdict": review.verdict,
-            "score_breakdown": review.score_breakdown,
-            "share_token": review.share_token,
-            "share_password": review.share_password,
-            "share_expires_at": review.share_expires_at,
-        },
-        "findings": [
+        "message": f"Analysis triggered for {pr_url}" if queued else f"Analysis already queued for {pr_url}",
+        "review_id": review.id,
+        "task_id": review.task_id,
+        "lane": choose_lane("manual"),
+    }
+
+
+class BatchAnalyzeRequest(BaseModel):
+    """Either ``pr_urls``, or ``repo`` with an optional PR-number range.
+
+    With ``repo`` every open PR numbered ``pr_from``..``pr_to`` (inclusive,
+    both optional) is scheduled.
+    """
+    pr_urls: Optional[List[str]] = None
+    repo: Optional[str] = None
+    pr_from: Optional[int] = None
+    pr_to: Optional[int] = None
+    installation_id: Optional[int] = None
+
+
+@router.post("/analyze/batch", status_code=202)
+def trigger_batch_analysis(request: BatchAnalyzeRequest, db: Session = Depends(get_db)):
+    """Schedule analyses for many PRs at once, e.g. to backfill a new repo.
+
+    Jobs go to the low-priority backfill lane, so live webhook traffic is
+    served first, and the per-installation fair-share limit bounds how
+    many of them run concurrently. Poll ``status_url`` for progress.
+    """
+    if not request.pr_urls and not request.repo:
+        raise HTTPException(status_code=400, detail="Provide pr_urls or repo")
+
+    installations: Dict[str, Optional[int]] = {}
+    if request.repo and request.installation_id is not None:
+        installations[request.repo] = request.installation_id
+
+    targets = []  # (repo_name, pr_number, pr_url)
+    skipped = []
+    for url in request.pr_urls or []:
+        try:
+            repo_name, pr_number = parse_pr_url(url)
+        except ValueError as e:
+            skipped.append({"pr_url": url, "reason": str(e)})
+            continue
+        targets.append((repo_name, pr_number, url))
+
+    if request.repo:
+        installation_id = _resolve_installation(request.repo, installations)
+        if installation_id is None:
+            raise HTTPException(status_code=404, detail=f"GitHub App is not installed on {request.repo}")
+        try:
+            open_prs = GitHubAppClient().list_open_pull_requests(installation_id, request.repo)
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=f"Could not list pull requests: {e}")
+        for number, url in sorted(open_prs):
+            if request.pr_from is not None and number < request.pr_from:
+                continue
+            if request.pr_to is not None and number > request.pr_to:
+                continue
+            targets.append((request.repo, number, url))
+
+    # Drop duplicates, keeping request order
+    unique, seen = [], set()
+    for repo_name, pr_number, url in targets:
+        if (repo_name, pr_number) not in seen:
+            seen.add((repo_name, pr_number))
+            unique.append((repo_name, pr_number, url))
+    targets = unique
+    if len(targets) > settings.analysis_batch_max_prs:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch of {len(targets)} PRs exceeds the limit of {settings.analysis_batch_max_prs}; split it up",
+        )
+
+    review_ids = []
+    for repo_name, pr_number, url in targets:
+        installation_id = request.installation_id
+        if installation_id is None:
+            installation_id = _resolve_installation(repo_name, installations)
+        if installation_id is None:
+            skipped.append({"pr_url": url, "reason": f"GitHub App is not installed on {repo_name}"})
+            continue
+        review, _ = schedule_review(
+            db, repo_name, pr_number, installation_id, trigger="backfill", pr_url=url,
+        )
+        review_ids.append(review.id)
+
+    batch = AnalysisBatch(
+        id=uuid.uuid4().hex,
+        repo_name=request.repo,
+        review_ids=review_ids,
+        skipped=skipped,
+    )
+    db.add(batch)
+    db.commit()
+    return {
+        "batch_id": batch.id,
+        "status_url": f"/api/analyze/batch/{batch.id}",
+        "scheduled": len(review_ids),
+        "skipped": skipped,
+    }
+
+
+@router.get("/analyze/batch/{batch_id}")
+async def get_batch_status(batch_id: str, db=Depends(get_async_db)):
+    """Progress of a batch created by POST /analyze/batch."""
+    batch = (await db.execute(
+        select(AnalysisBatch).where(AnalysisBatch.id == batch_id)
+    )).scalars().first()
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    review_ids = batch.review_ids or []
+    rows = []
+    if review_ids:
+        rows = (await db.execute(
+            select(Review.id, Review.repo_name, Review.pr_number, Review.status,
+                   Review.verdict, Review.confidence_score)
+            .where(Review.id.in_(review_ids))
+        )).all()
+    order = {review_id: i for i, review_id in enumerate(review_ids)}
+    by_status: Dict[str, int] = {}
+    for row in rows:
+        by_status[row.status] = by_status.get(row.status, 0) + 1
+    in_flight = by_status.get("pending", 0) + by_status.get("running", 0)
+
+    return {
+        "batch_id": batch.id,
+        "created_at": batch.created_at,
+        "state": "running" if in_flight else "done",
+        "total": len(review_ids),
+        "by_status": by_status,
+        "skipped": batch.skipped or [],
+        "reviews": [
             {
-                "id": f.id,
-                "category": f.category,
-                "severity": f.severity,
-                "title": f.title,
-                "description": f.description,
-                "file_path": f.file_path,
-                "line_number": f.line_number,
-                "confidence_score": f.confidence_score,
-                "code_snippet": f.code_snippet,
-                "suggestion": f.suggestion,
-                "suggested_fix": f.suggested_fix,
-                "references": f.references,
+                "id": row.id,
+                "repo_name": row.repo_name,
+                "pr_number": row.pr_number,
+                "status": row.status,
+                "verdict": row.verdict,
+                "confidence_score": row.confidence_score,
             }
-            for f in findings
+            for row in sorted(rows, key=lambda r: order[r.id])
         ],
     }
 
 
-@router.post("/analyze")
-async def trigger_analysis(pr_url: str, db: Session = Depends(get_db)):
-    """Manually trigger analysis for a PR."""
-    return {"message": f"Analysis triggered for {pr_url}"}
+def _bucket_expr(dialect_name: str, bucket: str):
+    """SQL expression truncating Review.created_at to a day or ISO week."""
+    if dialect_name == "postgresql":
+        return func.to_char(func.date_trunc(bucket, Review.created_at), "YYYY-MM-DD")
+    if bucket == "week":
+        # SQLite: Monday of the row's week
+        return func.date(Review.created_at, "weekday 0", "-6 days")
+    return func.date(Review.created_at)
 
 
 @router.get("/metrics/{repo:path}")
-async def get_repository_metrics(repo: str, db: Session = Depends(get_db)):
-    """Show review stats for a repository."""
-    reviews = db.query(Review).filter(Review.repo_name == repo).all()
+async def get_repository_metrics(
+    repo: str,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    bucket: Optional[str] = Query(None, pattern="^(day|week)$"),
+    source: str = Query("rollup", pattern="^(rollup|live)$"),
+    db=Depends(get_async_db),
+):
+    """Show review stats for a repository.
+
+    ``since`` / ``until`` restrict the window by created_at; ``bucket=day|week``
+    adds a trend series with per-bucket totals and average confidence.
+
+    By default figures come from the repo_metrics_daily rollup (O(days)
+    rows). ``source=live`` aggregates the reviews table directly. The live
+    query is also used when the rollup can't answer exactly: a ``since`` or
+    ``until`` that isn't a UTC midnight, or a repository with review
+    changes newer than its rollup watermark. Both paths return the same keys.
+    """
+    if source == "rollup":
+        response = await _rollup_metrics(db, repo, since, until, bucket)
+        if response is not None:
+            return response
+    return await _live_metrics(db, repo, since, until, bucket)
+
+
+def _utc_midnight(value: datetime) -> Optional[datetime]:
+    """``value`` as an aware UTC datetime if it falls on a day boundary, else None."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    value = value.astimezone(timezone.utc)
+    return value if value.time() == time.min else None
+
+
+async def _rollup_is_current(db, repo: str) -> bool:
+    """True when every review change for ``repo`` is folded into its rollups.
+
+    Two index lookups: the watermark row and max(updated_at) on
+    ix_reviews_repo_updated.
+    """
+    mark = (await db.execute(
+        select(RepoMetricsWatermark.reviews_updated_at).where(RepoMetricsWatermark.repo_name == repo)
+    )).scalar()
+    if mark is None:
+        return False
+    latest = (await db.execute(
+        select(func.max(Review.updated_at)).where(Review.repo_name == repo)
+    )).scalar()
+    return latest is None or latest <= mark
+
+
+async def _rollup_metrics(db, repo: str, since, until, bucket) -> Optional[dict]:
+    """Metrics from the daily rollup, or None when only the live query is exact."""
+    # Buckets are whole UTC days: ``day >= since`` / ``day < until`` match
+    # the live ``created_at`` filter only for midnight bounds
+    query = select(RepoMetricsDaily).where(RepoMetricsDaily.repo_name == repo)
+    if since:
+        start = _utc_midnight(since)
+        if start is None:
+            return None
+        query = query.where(RepoMetricsDaily.day >= start.date())
+    if until:
+        end = _utc_midnight(until)
+        if end is None:
+            return None
+        query = query.where(RepoMetricsDaily.day < end.date())
+    if not await _rollup_is_current(db, repo):
+        return None
+    rows = (await db.execute(query.order_by(RepoMetricsDaily.day))).scalars().all()
+    if not rows:
+        return None
+
+    total_reviews = sum(r.reviews_total or 0 for r in rows)
+    completed_reviews = sum(r.reviews_completed or 0 for r in rows)
+    conf_sum = sum(r.confidence_sum or 0.0 for r in rows)
+    conf_count = sum(r.confidence_count or 0 for r in rows)
+    severity_counts: dict = {}
+    category_counts: dict = {}
+    for r in rows:
+        for key, n in (r.findings_by_severity or {}).items():
+            severity_counts[key] = severity_counts.get(key, 0) + n
+        for key, n in (r.findings_by_category or {}).items():
+            category_counts[key] = category_counts.get(key, 0) + n
+
+    response = {
+        "repository": repo,
+        "total_reviews": total_reviews,
+        "completed_reviews": completed_reviews,
+        "completion_rate": completed_reviews / total_reviews if total_reviews > 0 else 0,
+        "average_confidence_score": round(conf_sum / conf_count, 1) if conf_count else 0.0,
+        "verdict_distribution": {
+            "APPROVE": sum(r.verdict_approve or 0 for r in rows),
+            "REVIEW_NEEDED": sum(r.verdict_review_needed or 0 for r in rows),
+            "CHANGES_REQUESTED": sum(r.verdict_changes_requested or 0 for r in rows),
+        },
+        "findings_by_severity": severity_counts,
+        "findings_by_category": category_counts,
+    }
+
+    if bucket:
+        series: dict = {}
+        for r in rows:
+            period = r.day if bucket == "day" else r.day - timedelta(days=r.day.weekday())
+            entry = series.setdefault(period, [0, 0, 0.0, 0])
+            entry[0] += r.reviews_total or 0
+            entry[1] += r.reviews_completed or 0
+            entry[2] += r.confidence_sum or 0.0
+            entry[3] += r.confidence_count or 0
+        response["trend"] = {
+            "bucket": bucket,
+            "series": [
+                {
+                    "period": period.isoformat(),
+                    "total_reviews": total,
+                    "completed_reviews": completed,
+                    "average_confidence_score": round(c_sum / c_count, 1) if c_count else None,
+                }
+                for period, (total, completed, c_sum, c_count) in sorted(series.items())
+            ],
+        }
+
+    return response
+
+
+async def _live_metrics(db, repo: str, since, until, bucket) -> dict:
+    filters = [Review.repo_name == repo]
+    if since:
+        filters.append(Review.created_at >= since)
+    if until:
+        filters.append(Review.created_at < until)
+
+    completed_case = case((Review.status == "completed", 1), else_=0)
+    total_reviews, completed_reviews, avg_confidence = (await db.execute(
+        select(
+            func.count(Review.id),
+            func.coalesce(func.sum(completed_case), 0),
+            func.avg(Review.confidence_score),
+        ).where(*filters)
+    )).one()
 
-    total_reviews = len(reviews)
-    completed_reviews = len([r for r in reviews if r.status == "completed"])
-    avg_confidence = 0.0
     verdict_dist = {"APPROVE": 0, "REVIEW_NEEDED": 0, "CHANGES_REQUESTED": 0}
+    verdict_rows = (await db.execute(
+        select(Review.verdict, func.count(Review.id))
+        .where(*filters, Review.verdict.in_(list(verdict_dist)))
+        .group_by(Review.verdict)
+    )).all()
+    for verdict, count in verdict_rows:
+        verdict_dist[verdict] = count
 
-    if completed_reviews:
-        scores = [r.confidence_score for r in reviews if r.confidence_score is not None]
-        avg_confidence = sum(scores) / len(scores) if scores else 0
-        for r in reviews:
-            if r.verdict in verdict_dist:
-                verdict_dist[r.verdict] += 1
+    avg_confidence = float(avg_confidence) if completed_reviews and avg_confidence is not None else 0.0
 
-    return {
+    response = {
         "repository": repo,
         "total_reviews": total_reviews,
         "completed_reviews": completed_reviews,
         "completion_rate": completed_reviews / total_reviews if total_reviews > 0 else 0,
         "average_confidence_score": round(avg_confidence, 1),
         "verdict_distribution": verdict_dist,
+        "findings_by_severity": await _live_finding_counts(db, filters, Finding.severity),
+        "findings_by_category": await _live_finding_counts(db, filters, Finding.category),
     }
 
+    if bucket:
+        period = _bucket_expr(engine.dialect.name, bucket).label("period")
+        rows = (await db.execute(
+            select(
+                period,
+                func.count(Review.id),
+                func.coalesce(func.sum(completed_case), 0),
+                func.avg(Review.confidence_score),
+            ).where(*filters).group_by(period).order_by(period)
+        )).all()
+        response["trend"] = {
+            "bucket": bucket,
+            "series": [
+                {
+                    "period": str(p),
+                    "total_reviews": total,
+                    "completed_reviews": completed,
+                    "average_confidence_score": round(float(avg), 1) if avg is not None else None,
+                }
+                for p, total, completed, avg in rows
+            ],
+        }
+
+    return response
+
+
+async def _live_finding_counts(db, filters, column) -> dict:
+    """Findings of completed reviews grouped by ``column``, as the rollup counts them."""
+    rows = (await db.execute(
+        select(column, func.count(Finding.id))
+        .join(Review, Finding.review_id == Review.id)
+        .where(*filters, Review.status == "completed")
+        .group_by(column)
+    )).all()
+    return {key or "unknown": n for key, n in rows}
+
 
 @router.get("/review/{review_id}/metrics")
-async def get_review_metrics(review_id: int, db: Session = Depends(get_db)):
+async def get_review_metrics(review_id: int, db=Depends(get_async_db)):
     """Get computed metrics for a specific review."""
     from analysis_engine.metrics_calculator import MetricsCalculator
 
-    review = db.query(Review).filter(Review.id == review_id).first()
+    review = (await db.execute(select(Review).where(Review.id == review_id))).scalars().first()
     if not review:
         raise HTTPException(status_code=404, detail="Review not found")
 
-    findings = db.query(Finding).filter(Finding.review_id == review_id).all()
+    findings = (await db.execute(
+        select(Finding.severity, Finding.category).where(Finding.review_id == review_id)
+    )).all()
     findings_dicts = [
         {"severity": f.severity, "category": f.category}
         for f in findings
@@ -1,4 +1,8 @@
 from fastapi import APIRouter
+from starlette.concurrency import run_in_threadpool
+from database import pool_status
+from scheduling import get_scheduler
+from github_integration.client import GitHubAppClient
 
 router = APIRouter()
 
@@ -6,3 +10,21 @@ router = APIRouter()
 @router.get("/health")
 async def health_check():
     return {"status": "healthy", "service": "smart-code-review-bot"}
+
+
+@router.get("/health/db-pool")
+async def db_pool_health():
+    """Sync and async connection-pool statistics (checked-out, overflow, wait times)."""
+    return pool_status()
+
+
+@router.get("/health/queues")
+async def queue_health():
+    """Analysis lane depths, wait times and per-installation running jobs."""
+    return await run_in_threadpool(get_scheduler().metrics)
+
+
+@router.get("/health/github")
+async def github_health():
+    """GitHub token cache, per-installation rate-limit budgets and ETag cache."""
+    return GitHubAppClient.stats()
@@ -1,15 +1,70 @@
-from fastapi import APIRouter, Request, Header, HTTPException, Depends
+from fastapi import APIRouter, Request, Header, HTTPException
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from collections import OrderedDict
 import hashlib
 import hmac
 import json
+import threading
 from config import settings
-from database import get_db
-from models import Review
-from worker import analyze_pull_request
+from database import SessionLocal
+from scheduling import schedule_review
+from data_pipeline.project_docs import ProjectDocsCache, push_touches_docs
+from data_pipeline.outbox import WebhookOutbox, OutboxDispatcher
 import os
 
 router = APIRouter()
 
+_outbox = None
+_dispatcher = None
+
+# Delivery ids seen by this process in direct mode (the outbox dedups
+# durably via its unique index).
+_recent_deliveries = OrderedDict()
+_recent_lock = threading.Lock()
+RECENT_DELIVERIES_MAX = 10000
+
+
+def _seen_delivery(delivery_id) -> bool:
+    if not delivery_id:
+        return False
+    with _recent_lock:
+        if delivery_id in _recent_deliveries:
+            return True
+        _recent_deliveries[delivery_id] = True
+        if len(_recent_deliveries) > RECENT_DELIVERIES_MAX:
+            _recent_deliveries.popitem(last=False)
+    return False
+
+
+def _forget_delivery(delivery_id) -> None:
+    """Let GitHub's redelivery of a delivery that failed through."""
+    if not delivery_id:
+        return
+    with _recent_lock:
+        _recent_deliveries.pop(delivery_id, None)
+
+
+def get_dispatcher() -> OutboxDispatcher:
+    """Lazily create the process-wide outbox and its dispatcher."""
+    global _outbox, _dispatcher
+    if _dispatcher is None:
+        _outbox = WebhookOutbox(settings.webhook_outbox_path)
+        _dispatcher = OutboxDispatcher(
+            _outbox, dispatch_event, batch_size=settings.webhook_dispatch_batch
+        )
+    return _dispatcher
+
+
+def start_dispatcher():
+    if settings.webhook_ingestion_mode == "outbox":
+        get_dispatcher().start()
+
+
+def stop_dispatcher():
+    if _dispatcher is not None:
+        _dispatcher.stop()
+
 def verify_signature(payload_body, secret_token, signature_header):
     """Verify that the payload was sent from GitHub by validating SHA256.
     
@@ -31,7 +86,6 @@ def verify_signature(payload_body, secret_token, signature_header):
 async def github_webhook(
     request: Request,
     x_hub_signature_256: str = Header(None),
-    db = Depends(get_db)
 ):
     # Get the payload
     payload_body = await request.body()
@@ -39,47 +93,103 @@ async def github_webhook(
     # Verify the signature
     verify_signature(payload_body, settings.github_webhook_secret, x_hub_signature_256)
     
-    # Parse the event
-    event_data = json.loads(payload_body.decode('utf-8'))
     event_type = request.headers.get("X-GitHub-Event")
-    
-    if event_type == "pull_request":
-        action = event_data.get("action")
-        if action in ["opened", "synchronize"]:
-            # Process PR
-            await process_pull_request(event_data, db)
-    elif event_type == "issue_comment":
-        action = event_data.get("action")
-        if action == "created":
-            # Process comment
-            await process_issue_comment(event_data, db)
-    
+    delivery_id = request.headers.get("X-GitHub-Delivery")
+
+    if settings.webhook_ingestion_mode == "outbox":
+        # Durably queue and acknowledge; the dispatcher does the rest
+        dispatcher = get_dispatcher()
+        row_id = await run_in_threadpool(dispatcher.outbox.append, event_type, delivery_id, payload_body)
+        if row_id is None:
+            return {"status": "duplicate"}
+        dispatcher.notify()
+        return JSONResponse({"status": "queued"}, status_code=202)
+
+    if _seen_delivery(delivery_id):
+        return {"status": "duplicate"}
+
+    # Parse the event
+    try:
+        event_data = json.loads(payload_body.decode('utf-8'))
+        await run_in_threadpool(dispatch_event, event_type, delivery_id, event_data)
+    except Exception:
+        _forget_delivery(delivery_id)
+        raise
     return {"status": "success"}
 
-async def process_pull_request(event_data, db):
-    """Process pull request events"""
+
+@router.get("/outbox/stats")
+async def outbox_stats():
+    """Outbox depth, oldest pending age and dispatcher throughput/lag."""
+    if settings.webhook_ingestion_mode != "outbox":
+        return {"mode": settings.webhook_ingestion_mode}
+    return await run_in_threadpool(get_dispatcher().stats)
+
+
+def dispatch_event(event_type, delivery_id, event_data):
+    """Route a verified delivery to its processor (sync; runs off the event loop)."""
+    db = SessionLocal()
+    try:
+        if event_type == "pull_request":
+            action = event_data.get("action")
+            if action in ["opened", "synchronize"]:
+                # Process PR
+                process_pull_request(event_data, db)
+        elif event_type == "push":
+            process_push(event_data, db)
+        elif event_type == "issue_comment":
+            action = event_data.get("action")
+            if action == "created":
+                # Process comment
+                process_issue_comment(event_data, db)
+    finally:
+        db.close()
+
+def process_pull_request(event_data, db):
+    """Process pull request events.
+
+    Pushes to a PR are coalesced: while a review for the PR is still
+    pending or running, the same row is retargeted at the new head SHA and
+    a fresh job is scheduled after ``webhook_debounce_seconds``. The
+    previously queued job is revoked, and any job that does start for a
+    stale SHA notices and exits (see worker.analyze_pull_request).
+    """
     pr = event_data.get("pull_request")
     pr_number = pr.get("number")
     repo_full_name = pr.get("base", {}).get("repo", {}).get("full_name")
     installation_id = event_data.get("installation", {}).get("id")
-    
-    # Create or update review record
-    review = Review(
-        repo_name=repo_full_name,
-        pr_number=pr_number,
+    head_sha = pr.get("head", {}).get("sha")
+
+    pr_size = None
+    if pr.get("additions") is not None:
+        pr_size = (pr.get("additions") or 0) + (pr.get("deletions") or 0)
+
+    # Pushes to an already-reviewed PR only re-review the files whose
+    # patch changed.
+    _, queued = schedule_review(
+        db, repo_full_name, pr_number, installation_id,
+        trigger=event_data.get("action"),
+        head_sha=head_sha,
         pr_url=pr.get("html_url"),
-        status="pending"
+        pr_size=pr_size,
+        incremental=event_data.get("action") == "synchronize",
+        countdown=settings.webhook_debounce_seconds,
     )
-    
-    db.add(review)
-    db.commit()
-    db.refresh(review)
-    
-    # Queue analysis task
-    analyze_pull_request.delay(repo_full_name, pr_number, installation_id)
+    if not queued:
+        target = head_sha[:7] if head_sha else "its current head"
+        print(f"PR #{pr_number} in {repo_full_name} already queued for {target}")
+        return
     print(f"Queued analysis for PR #{pr_number} in {repo_full_name}")
 
-async def process_issue_comment(event_data, db):
+def process_push(event_data, db):
+    """Drop cached project docs when a push to the default branch touches them."""
+    if not push_touches_docs(event_data):
+        return
+    repo_full_name = event_data.get("repository", {}).get("full_name")
+    if ProjectDocsCache(db).invalidate(repo_full_name):
+        print(f"Invalidated cached project docs for {repo_full_name}")
+
+def process_issue_comment(event_data, db):
     """Process issue comment events"""
     # TODO: Implement comment processing
-    print("Processing issue comment")
\ No newline at end of file
+    print("Processing issue comment")
@@ -0,0 +1,239 @@
+"""Priority lanes and per-installation fair sharing for PR analyses.
+
+Analyses are routed to one of three Celery queues. Workers consume them
+in priority order (Redis ``queue_order_strategy=priority``):
+
+  analysis.high    manual /api/analyze triggers, re-reviews, small PRs
+  analysis.normal  everything else
+  analysis.low     bulk backfills and very large PRs
+
+Each installation may run at most ``analysis_installation_concurrency``
+analyses at once. A job that starts while its installation is at the
+limit is deferred (re-queued with a short countdown) and frees its worker
+slot, so one busy monorepo can't starve every other installation.
+
+Running-job sets and wait-time statistics live in Redis so they are
+shared by all workers. If Redis is unreachable the limiter admits
+everything and metrics are best-effort.
+"""
+
+import time
+from typing import Dict, Any, Optional
+
+from config import settings
+
+LANE_HIGH = "analysis.high"
+LANE_NORMAL = "analysis.normal"
+LANE_LOW = "analysis.low"
+LANES = (LANE_HIGH, LANE_NORMAL, LANE_LOW)
+
+_KEY_PREFIX = "smartcode:sched:"
+# Running-slot entries older than this are considered leaked (crashed worker)
+SLOT_LEASE_SECONDS = 3600
+
+
+def choose_lane(trigger: str, pr_size: Optional[int] = None) -> str:
+    """Pick a lane for a job.
+
+    ``trigger`` is one of: manual, synchronize, opened, backfill.
+    ``pr_size`` is additions + deletions when known.
+    """
+    if trigger == "backfill":
+        return LANE_LOW
+    if pr_size is not None and pr_size >= settings.analysis_large_pr_lines:
+        return LANE_LOW
+    if trigger in ("manual", "synchronize"):
+        return LANE_HIGH
+    if pr_size is not None and pr_size <= settings.analysis_small_pr_lines:
+        return LANE_HIGH
+    return LANE_NORMAL
+
+
+def schedule_review(db, repo_name: str, pr_number: int, installation_id,
+                    trigger: str, head_sha: Optional[str] = None,
+                    pr_url: Optional[str] = None, pr_size: Optional[int] = None,
+                    incremental: bool = False, countdown: float = 0):
+    """Create or reuse the Review for a PR and queue its analysis.
+
+    A review that is still pending or running for the PR is reused: if it
+    already targets ``head_sha`` nothing is queued, otherwise its queued
+    job is revoked and a fresh one scheduled for the new SHA. Returns
+    ``(review, queued)``.
+
+    Without a ``head_sha`` (manual and backfill triggers) an in-flight
+    review is returned untouched: there is no newer SHA to supersede it
+    with. Its job analyses the PR's current head anyway, and clearing its
+    head_sha would stop a still-running job from noticing it was replaced.
+    """
+    from models import Review
+    from metrics_rollup import refresh_for_review
+    from worker import enqueue_analysis, revoke_analysis
+
+    review = db.query(Review).filter(
+        Review.repo_name == repo_name,
+        Review.pr_number == pr_number,
+        Review.status.in_(["pending", "running"]),
+    ).order_by(Review.id.desc()).first()
+
+    if review and (not head_sha or review.head_sha == head_sha):
+        return review, False
+
+    if review:
+        # Supersede the queued/in-flight analysis for the older SHA
+        if review.task_id:
+            revoke_analysis(review.task_id)
+        review.head_sha = head_sha
+        review.status = "pending"
+    else:
+        review = Review(
+            repo_name=repo_name,
+            pr_number=pr_number,
+            pr_url=pr_url or f"https://github.com/{repo_name}/pull/{pr_number}",
+            status="pending",
+            head_sha=head_sha,
+        )
+        db.add(review)
+    db.commit()
+    db.refresh(review)
+    try:
+        refresh_for_review(db, review)
+    except Exception as rollup_err:
+        db.rollback()
+        print(f"[scheduler] Warning: Could not update metrics rollup: {rollup_err}")
+
+    review.task_id = enqueue_analysis(
+        repo_name, pr_number, installation_id,
+        incremental=incremental,
+        head_sha=head_sha,
+        review_id=review.id,
+        countdown=countdown,
+        lane=choose_lane(trigger, pr_size),
+    )
+    db.commit()
+    return review, True
+
+
+class Scheduler:
+    """Redis-backed per-installation slot limiter plus queue metrics."""
+
+    def __init__(self, redis_client=None):
+        self._redis = redis_client
+        if self._redis is None:
+            try:
+                import redis
+                self._redis = redis.Redis.from_url(settings.redis_url)
+            except Exception as e:
+                print(f"[scheduler] Redis unavailable ({e}); fair-share limits disabled")
+                self._redis = None
+        self.limit = settings.analysis_installation_concurrency
+
+    # ── per-installation slots ──────────────────────────────────────────
+
+    def _slots_key(self, installation_id) -> str:
+        return f"{_KEY_PREFIX}running:{installation_id}"
+
+    def acquire(self, installation_id, task_id: str) -> bool:
+        """Claim a running slot for ``installation_id``; False if at the limit."""
+        if self._redis is None or not installation_id or self.limit <= 0:
+            return True
+        key = self._slots_key(installation_id)
+        now = time.time()
+        try:
+            pipe = self._redis.pipeline()
+            pipe.zremrangebyscore(key, 0, now - SLOT_LEASE_SECONDS)
+            pipe.zadd(key, {task_id: now})
+            pipe.zrank(key, task_id)
+            pipe.expire(key, SLOT_LEASE_SECONDS)
+            _, _, rank, _ = pipe.execute()
+            # Slots are ordered by start time: the first `limit` entries win.
+            if rank is not None and rank < self.limit:
+                return True
+            self._redis.zrem(key, task_id)
+            self._incr("deferred")
+            return False
+        except Exception as e:
+            print(f"[scheduler] acquire failed ({e}); admitting job")
+            return True
+
+    def release(self, installation_id, task_id: str) -> None:
+        if self._redis is None or not installation_id:
+            return
+        try:
+            self._redis.zrem(self._slots_key(installation_id), task_id)
+        except Exception as e:
+            print(f"[scheduler] release failed: {e}")
+
+    # ── metrics ─────────────────────────────────────────────────────────
+
+    def _incr(self, field: str, amount: float = 1) -> None:
+        try:
+            self._redis.hincrbyfloat(f"{_KEY_PREFIX}stats", field, amount)
+        except Exception:
+            pass
+
+    def record_start(self, lane: Optional[str], ready_at: Optional[float]) -> None:
+        """Record how long a job waited between becoming runnable and starting."""
+        if self._redis is None or not ready_at:
+            return
+        lane = lane or "unknown"
+        waited = max(0.0, time.time() - ready_at)
+        try:
+            key = f"{_KEY_PREFIX}wait:{lane}"
+            pipe = self._redis.pipeline()
+            pipe.hincrby(key, "count", 1)
+            pipe.hincrbyfloat(key, "total_seconds", waited)
+            pipe.execute()
+            # Max is updated separately; a lost race only under-reports it.
+            current = float(self._redis.hget(key, "max_seconds") or 0)
+            if waited > current:
+                self._redis.hset(key, "max_seconds", waited)
+        except Exception as e:
+            print(f"[scheduler] could not record wait time: {e}")
+
+    def metrics(self) -> Dict[str, Any]:
+        if self._redis is None:
+            return {"available": False}
+        try:
+            return self._collect_metrics()
+        except Exception as e:
+            return {"available": False, "error": str(e)}
+
+    def _collect_metrics(self) -> Dict[str, Any]:
+        lanes = {}
+        for lane in LANES:
+            wait = {
+                k.decode(): float(v)
+                for k, v in (self._redis.hgetall(f"{_KEY_PREFIX}wait:{lane}") or {}).items()
+            }
+            count = wait.get("count", 0)
+            lanes[lane] = {
+                "depth": self._redis.llen(lane),
+                "started": int(count),
+                "wait_avg_seconds": round(wait.get("total_seconds", 0) / count, 3) if count else 0.0,
+                "wait_max_seconds": round(wait.get("max_seconds", 0), 3),
+            }
+        running = {}
+        for key in self._redis.scan_iter(f"{_KEY_PREFIX}running:*"):
+            installation = key.decode().rsplit(":", 1)[-1]
+            running[installation] = self._redis.zcard(key)
+        stats = {
+            k.decode(): float(v)
+            for k, v in (self._redis.hgetall(f"{_KEY_PREFIX}stats") or {}).items()
+        }
+        return {
+            "available": True,
+            "installation_concurrency_limit": self.limit,
+            "lanes": lanes,
+            "running_by_installation": running,
+            "deferred_total": int(stats.get("deferred", 0)),
+        }
+
+
+_scheduler: Optional[Scheduler] = None
+
+
+def get_scheduler() -> Scheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = Scheduler()
+    return _scheduler
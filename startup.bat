@@ -11,7 +11,7 @@ start "Web Server" uvicorn main:app --host 0.0.0.0 --port 8084
 
 REM Start the Celery worker
 echo Starting Celery worker...
-start "Celery Worker" celery -A worker.celery_app worker --loglevel=info
+start "Celery Worker" celery -A worker.celery_app worker -Q analysis.high,analysis.normal,analysis.low --loglevel=info
 
 echo Smart Code Review Bot is running!
 echo Web API: http://localhost:8000
\ No newline at end of file
@@ -12,7 +12,7 @@ uvicorn main:app --host 0.0.0.0 --port 8084 &
 
 # Start the Celery worker
 echo "Starting Celery worker..."
-celery -A worker.celery_app worker --loglevel=info &
+celery -A worker.celery_app worker -Q analysis.high,analysis.normal,analysis.low --loglevel=info &
 
 echo "Smart Code Review Bot is running!"
 echo "Web API: http://localhost:8000"
\ No newline at end of file
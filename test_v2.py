@@ -117,6 +117,37 @@ def test_aggregator():
     assert findings[0].suggested_fix == "Use parameterized queries"
     print(f"  Created {len(findings)} finding(s)")
     print("  ✓ Structured findings work correctly")
+
+    # Bulk rows: legacy and structured findings share one key set
+    rows = agg.build_finding_rows(
+        review_id=1,
+        llm_results={
+            "findings": [{"title": "N+1 query", "category": "performance"}],
+            "vulnerabilities": [{"type": "XSS", "location": "web.py:12"}],
+        },
+        static_results={},
+    )
+    assert len(rows) == 2
+    assert set(rows[0]) == set(rows[1])
+    assert rows[1]["file_path"] == "web.py" and rows[1]["line_number"] == 12
+    print("  ✓ Bulk finding rows are uniform")
+
+    # Scanner issues are stored unless an LLM finding covers the same line
+    from analysis_engine.security_scanner import make_issue
+    rows = agg.build_finding_rows(
+        review_id=1,
+        llm_results={"findings": [{"title": "SQL Injection", "category": "security",
+                                   "file_path": "src/db.py", "line_number": 42}]},
+        static_results={"issues": [
+            make_issue("sql-string-format", "src/db.py", 42, "cur.execute(f'...')"),
+            make_issue("eval-exec", "src/db.py", 50, "eval(expr)"),
+        ]},
+    )
+    assert [(r["title"], r["line_number"]) for r in rows] == [
+        ("SQL Injection", 42), ("Dynamic code execution with eval/exec", 50),
+    ]
+    assert rows[1]["references"] == ["CWE-95"] and set(rows[1]) == set(rows[0])
+    print("  ✓ Scanner issues persisted, deduped against LLM findings")
     print()
 
 
@@ -138,11 +169,1217 @@ def test_prompt_templates():
     print()
 
 
+def test_llm_cache():
+    print("=== Testing LLM Response Cache ===")
+    from analysis_engine.llm_cache import MemoryCacheBackend, ResponseCache, make_cache_key
+
+    # Trailing whitespace and CRLF don't change the key; model/template do
+    assert make_cache_key("m", "t", "a  \r\nb\n") == make_cache_key("m", "t", "a\nb")
+    assert make_cache_key("m", "t", "a") != make_cache_key("m2", "t", "a")
+    assert make_cache_key("m", "t", "a") != make_cache_key("m", "t2", "a")
+
+    cache = ResponseCache(MemoryCacheBackend(ttl=60, max_entries=2))
+    assert cache.get("m", "t", "p1") is None
+    cache.set("m", "t", "p1", {"score": 1})
+    cache.set("m", "t", "p2", {"score": 2})
+    assert cache.get("m", "t", "p1") == {"score": 1}
+    cache.set("m", "t", "p3", {"score": 3})  # evicts p2 (least recently used)
+    assert cache.get("m", "t", "p2") is None
+    assert cache.get("m", "t", "p3") == {"score": 3}
+    # Callers get their own copy; mutating it leaves the cache intact
+    cache.get("m", "t", "p3")["score"] = 99
+    assert cache.get("m", "t", "p3") == {"score": 3}
+
+    expired = ResponseCache(MemoryCacheBackend(ttl=-1, max_entries=2))
+    expired.set("m", "t", "p", {"score": 1})
+    assert expired.get("m", "t", "p") is None
+
+    stats = cache.stats()
+    print(f"  Stats: {stats}")
+    assert stats["hits"] == 4 and stats["misses"] == 2
+    print("  ✓ LRU, TTL and counters work correctly")
+    print()
+
+
+def test_diff_chunker():
+    print("=== Testing Diff Chunker ===")
+    from analysis_engine.diff_chunker import chunk_diff, iter_file_sections, _split_hunk
+
+    files = []
+    for i in range(6):
+        hunks = "".join(
+            f"@@ -{j},3 +{j},4 @@\n context\n-old\n--- removed dashes\n+new {i} {j}\n"
+            for j in range(30)
+        )
+        files.append(f"--- a/f{i}.py\n+++ b/f{i}.py\n{hunks}")
+    diff = "".join(files)
+
+    sections = list(iter_file_sections(diff))
+    assert [name for name, _, _ in sections] == [f"f{i}.py" for i in range(6)]
+    assert all(len(hunks) == 30 for _, _, hunks in sections)
+
+    # Every hunk lands in some chunk and every chunk stays within budget
+    plan = chunk_diff(diff, max_tokens=300, max_chunks=100)
+    text = "".join(c.text for c in plan.chunks)
+    assert not plan.skipped_files
+    assert all(c.chars <= 1200 for c in plan.chunks)
+    assert all(f"+new {i} {j}\n" in text for i in range(6) for j in range(30))
+    assert all(c.text.startswith("--- a/") for c in plan.chunks)
+    print(f"  {len(plan)} chunks, full coverage")
+
+    capped = chunk_diff(diff, max_tokens=300, max_chunks=2)
+    assert len(capped) == 2 and "f5.py" in capped.skipped_files
+    print(f"  Capped plan skipped: {capped.skipped_files}")
+
+    # A line too long for any chunk is hard-cut; each piece follows the
+    # repeated hunk header and keeps its "+" prefix
+    long_hunk = "@@ -1,2 +1,2 @@\n ctx\n+" + "x" * 70 + "\n-old\n"
+    pieces = list(_split_hunk(long_hunk, 40))
+    assert all(len(p) <= 40 for p in pieces)
+    assert all(p.startswith("@@ -1,2 +1,2 @@\n") for p in pieces)
+    assert all(p.splitlines()[1][0] in "+- " for p in pieces)
+    added = [line[1:] for p in pieces for line in p.splitlines() if line.startswith("+")]
+    assert "".join(added) == "x" * 70
+    print("  ✓ Chunking respects budgets and caps")
+    print()
+
+
+def test_webhook_outbox(tmp_path=None):
+    print("=== Testing Webhook Outbox ===")
+    import json
+    import os
+    import tempfile
+    from data_pipeline.outbox import WebhookOutbox, OutboxDispatcher
+
+    path = os.path.join(str(tmp_path or tempfile.mkdtemp()), "outbox.db")
+    outbox = WebhookOutbox(path)
+    handled = []
+
+    def handler(event_type, delivery_id, event_data):
+        if event_data.get("fail"):
+            raise RuntimeError("broker down")
+        handled.append((event_type, delivery_id, event_data["n"]))
+
+    outbox.append("pull_request", "d1", json.dumps({"n": 1}).encode())
+    outbox.append("pull_request", "d2", json.dumps({"n": 2, "fail": True}).encode())
+    assert outbox.stats()["pending"] == 2
+    # A GitHub redelivery of d1 is ignored
+    assert outbox.append("pull_request", "d1", json.dumps({"n": 1}).encode()) is None
+    assert outbox.stats()["pending"] == 2
+
+    dispatcher = OutboxDispatcher(outbox, handler, batch_size=10)
+    assert dispatcher.drain_once() == 2
+    assert handled == [("pull_request", "d1", 1)]
+
+    stats = dispatcher.stats()
+    print(f"  Stats: {stats}")
+    assert stats["done"] == 1 and stats["pending"] == 1
+    assert stats["dispatched"] == 1 and stats["retried"] == 1
+    # The failed delivery is backed off, not immediately re-claimed
+    assert dispatcher.drain_once() == 0
+    print("  ✓ Append, dispatch and retry backoff work correctly")
+    print()
+
+
+def test_parse_pr_url():
+    print("=== Testing PR URL Parsing ===")
+    from utils.helpers import parse_pr_url
+
+    assert parse_pr_url("https://github.com/octo/repo/pull/42") == ("octo/repo", 42)
+    assert parse_pr_url("github.com/octo/repo/pull/7/files") == ("octo/repo", 7)
+    for bad in ("https://github.com/octo/repo/issues/3", "https://gitlab.com/a/b/pull/1", ""):
+        try:
+            parse_pr_url(bad)
+        except ValueError:
+            continue
+        raise AssertionError(f"accepted {bad!r}")
+    print("  ✓ PR URLs parsed and malformed ones rejected")
+    print()
+
+
+def test_installation_token_cache():
+    print("=== Testing Installation Token Cache ===")
+    import time
+    from github_integration.token_cache import InstallationTokenCache
+
+    issued = []
+
+    def fetch(installation_id):
+        issued.append(installation_id)
+        # First token for 42 is about to expire, later ones last an hour
+        ttl = 60 if len(issued) == 1 else 3600
+        return f"tok-{installation_id}-{len(issued)}", time.time() + ttl
+
+    cache = InstallationTokenCache(fetch, refresh_margin=300)
+    assert cache.get(42) == "tok-42-1"
+    # Inside the refresh margin: refreshed ahead of expiry
+    assert cache.get(42) == "tok-42-2"
+    assert cache.get(42) == "tok-42-2"
+    assert cache.get(7) == "tok-7-3"
+    stats = cache.stats()
+    print(f"  Stats: {stats}")
+    assert stats["refreshes"] == 3 and stats["hits"] == 1
+    cache.invalidate(7)
+    assert cache.get(7) == "tok-7-4"
+    print("  ✓ Tokens reused until near expiry, then refreshed")
+    print()
+
+
+def test_github_rest_layer():
+    print("=== Testing GitHub REST Layer ===")
+    import time
+    from github_integration.rest import GitHubAPI, RateLimitTracker, ETagCache, RateLimited
+
+    class FakeResponse:
+        def __init__(self, status, headers, content=b""):
+            self.status_code, self.headers, self.content = status, headers, content
+
+    class FakeSession:
+        def __init__(self, responses):
+            self.responses = list(responses)
+            self.sent = []
+
+        def request(self, method, url, params=None, json=None, headers=None, timeout=None, stream=False):
+            self.sent.append(dict(headers))
+            return self.responses.pop(0)
+
+    class Tokens:
+        def get(self, installation_id):
+            return "tok"
+
+        def invalidate(self, installation_id):
+            pass
+
+    reset = str(int(time.time()) + 3600)
+    limits = {"X-RateLimit-Remaining": "4000", "X-RateLimit-Limit": "5000", "X-RateLimit-Reset": reset}
+    session = FakeSession([
+        FakeResponse(200, dict(limits, ETag='"v1"'), b'{"title": "t"}'),
+        FakeResponse(304, dict(limits)),
+        FakeResponse(429, {"Retry-After": "600"}),
+    ])
+    tracker, etags = RateLimitTracker(low_watermark=100), ETagCache()
+    api = GitHubAPI(Tokens(), 1, tracker, etags, session=session, max_wait=60)
+
+    assert api.get_json("/repos/o/r/pulls/1") == {"title": "t"}
+    # Second read revalidates with If-None-Match and is served from cache
+    response = api.request("GET", "/repos/o/r/pulls/1")
+    assert session.sent[1]["If-None-Match"] == '"v1"'
+    assert response.from_cache and response.json() == {"title": "t"}
+    assert etags.stats()["not_modified"] == 1
+    assert tracker.snapshot()["1"]["remaining"] == 4000
+
+    # Retry-After beyond max_wait defers instead of blocking
+    try:
+        api.get_json("/repos/o/r/pulls/2")
+        raise AssertionError("expected RateLimited")
+    except RateLimited as e:
+        assert e.retry_after >= 600
+    # ...and later calls for the installation are deferred without a request
+    try:
+        api.get_json("/repos/o/r/pulls/3")
+        raise AssertionError("expected RateLimited")
+    except RateLimited:
+        pass
+    assert len(session.sent) == 3
+
+    # A draining budget spaces calls out over the rest of the window
+    tracker.update(2, {"x-ratelimit-remaining": "10", "x-ratelimit-reset": reset})
+    assert 300 < tracker.delay_for(2) <= 360
+    # Concurrent callers claim successive slots instead of firing together
+    first, second, third = (tracker.reserve(2) for _ in range(3))
+    assert 300 < first <= 360 and 300 < second - first <= 360 and 300 < third - second <= 360
+    assert 900 < tracker.delay_for(2) <= 1440
+    print(f"  Rate limits: {tracker.snapshot()}")
+    print("  ✓ Conditional requests, budget tracking and backoff work correctly")
+    print()
+
+
+def test_collector_concurrent_fetch():
+    print("=== Testing Concurrent PR Data Collection ===")
+    import threading
+    from data_pipeline.collector import DataCollector
+
+    class FakeAPI:
+        def __init__(self):
+            self.calls = []
+            self.lock = threading.Lock()
+
+        def get_json(self, path, params=None):
+            with self.lock:
+                self.calls.append((path, (params or {}).get("page")))
+            page = (params or {}).get("page", 1)
+            if path.endswith("/pulls/5"):
+                return {"title": "Fix #1 and #2", "body": "fixes #1, closes #2", "user": {"login": "dev"},
+                        "head": {"sha": "abc"}, "base": {"sha": "def"}, "created_at": "2024-01-01T00:00:00Z",
+                        "changed_files": 150, "commits": 2}
+            if path.endswith("/files"):
+                count = 100 if page == 1 else 50
+                return [{"filename": f"f{(page - 1) * 100 + i}.py", "status": "modified", "patch": "@@"}
+                        for i in range(count)]
+            if path.endswith("/commits"):
+                return [{"commit": {"message": "one"}}, {"commit": {"message": "two"}}]
+            if path.endswith("/issues/2"):
+                raise RuntimeError("404")
+            if path.endswith("/issues/1"):
+                return {"title": "Bug", "body": "broken", "comments": 1}
+            if path.endswith("/comments"):
+                return [{"user": {"login": "qa"}, "body": "repro", "created_at": "2024-01-02T00:00:00Z"}]
+            raise AssertionError(path)
+
+    api = FakeAPI()
+    pr_data = DataCollector(api, max_workers=4).collect_pr_data("o/r", 5)
+    assert [f["filename"] for f in pr_data["files_changed"]] == [f"f{i}.py" for i in range(150)]
+    assert pr_data["commit_messages"] == ["one", "two"]
+    assert pr_data["issue_numbers"] == [1, 2]
+    assert list(pr_data["issue_context"]) == [1]
+    assert pr_data["issue_context"][1]["comments"][0]["author"] == "qa"
+    assert pr_data["timestamp"] == "2024-01-01T00:00:00+00:00"
+    assert ("/repos/o/r/pulls/5/files", 2) in api.calls
+    print(f"  {len(api.calls)} requests, {len(pr_data['files_changed'])} files")
+
+    # Raw-diff mode: one streamed request replaces the files pages
+    diff = (
+        "diff --git a/big.py b/big.py\n--- a/big.py\n+++ b/big.py\n@@ -1 +1 @@\n-a\n+b\n"
+        "diff --git a/new.py b/new.py\nnew file mode 100644\n--- /dev/null\n+++ b/new.py\n@@ -0,0 +1 @@\n+c\n"
+    )
+    api = FakeAPI()
+    api.stream_lines = lambda path, accept: iter(diff.splitlines(True))
+    pr_data = DataCollector(api, max_workers=4, raw_diff=True).collect_pr_data("o/r", 5)
+    assert pr_data["files_changed"] == [
+        {"filename": "big.py", "status": "modified", "patch": "@@ -1 +1 @@\n-a\n+b"},
+        {"filename": "new.py", "status": "added", "patch": "@@ -0,0 +1 @@\n+c"},
+    ]
+    assert not any(path.endswith("/files") for path, _ in api.calls)
+
+    # ...falling back to the files API when GitHub refuses the diff
+    def too_large(path, accept):
+        raise RuntimeError("406 diff too large")
+    api = FakeAPI()
+    api.stream_lines = too_large
+    pr_data = DataCollector(api, max_workers=4, raw_diff=True).collect_pr_data("o/r", 5)
+    assert len(pr_data["files_changed"]) == 150
+    print("  ✓ Pages fetched in parallel, order and shape preserved")
+    print()
+
+
+def test_collect_file_versions():
+    print("=== Testing Changed-file Source Collection ===")
+    from analysis_engine.diff_chunker import iter_diff_files
+    from analysis_engine.source_cache import BlobCache, blob_sha
+    from data_pipeline.collector import DataCollector
+
+    base_text, head_text, new_text = "x = 1\n", "x = 2\n", "y = 3\n"
+    head_blob = blob_sha(head_text)
+
+    class FakeAPI:
+        def __init__(self):
+            self.calls = []
+
+        def get_text(self, path, accept, params=None):
+            self.calls.append((path, (params or {}).get("ref")))
+            if path == f"/repos/o/r/git/blobs/{head_blob}":
+                return head_text
+            if path == "/repos/o/r/contents/old%20name.py" and params == {"ref": "base"}:
+                return base_text
+            if path == "/repos/o/r/contents/new.py" and params == {"ref": "head"}:
+                return new_text
+            if path == "/repos/o/r/contents/gone.py" and params == {"ref": "base"}:
+                return base_text
+            raise AssertionError(path)
+
+    files = [
+        {"filename": "a.py", "status": "renamed", "previous_filename": "old name.py", "sha": head_blob},
+        {"filename": "new.py", "status": "added", "sha": "abc1234"},  # abbreviated: not a blob key
+        {"filename": "gone.py", "status": "removed"},
+    ]
+    api, cache = FakeAPI(), BlobCache()
+    collector = DataCollector(api, max_workers=2)
+    versions = collector.collect_file_versions("o/r", "base", "head", files, cache)
+    assert (versions["a.py"].base, versions["a.py"].head) == (base_text, head_text)
+    assert versions["a.py"].base_sha == blob_sha(base_text)
+    assert (versions["new.py"].base, versions["new.py"].head) == (None, new_text)
+    assert versions["new.py"].head_sha == blob_sha(new_text)
+    assert (versions["gone.py"].base, versions["gone.py"].head) == (base_text, None)
+    assert not any("/git/trees/" in path for path, _ in api.calls)
+    assert len(api.calls) == 4
+
+    # Known blob SHAs are served from the cache on the next analysis
+    api.calls.clear()
+    collector.collect_file_versions("o/r", "base", "head", files[:1], cache)
+    assert api.calls == [("/repos/o/r/contents/old%20name.py", "base")]
+
+    # Raw diffs carry the same keys, taken from the index and rename lines
+    diff = (
+        "diff --git a/old.py b/a.py\nsimilarity index 90%\nrename from old.py\nrename to a.py\n"
+        f"index {'1' * 40}..{head_blob} 100644\n--- a/old.py\n+++ b/a.py\n@@ -1 +1 @@\n-x = 1\n+x = 2\n"
+    )
+    entry, = iter_diff_files(diff)
+    assert entry["sha"] == head_blob and entry["previous_sha"] == "1" * 40
+    assert entry["previous_filename"] == "old.py" and entry["status"] == "renamed"
+    print("  ✓ Only changed files fetched; blob SHAs reuse the cache")
+    print()
+
+
+def test_project_docs():
+    print("=== Testing Project Docs Context ===")
+    from data_pipeline.project_docs import push_touches_docs, project_context_text, is_doc_path
+
+    assert is_doc_path("README.md") and is_doc_path("docs/arch.md")
+    assert not is_doc_path("docs/img/x.md") and not is_doc_path("src/README.md")
+
+    push = {
+        "ref": "refs/heads/main",
+        "repository": {"full_name": "o/r", "default_branch": "main"},
+        "commits": [{"added": [], "modified": ["app.py"], "removed": []}],
+    }
+    assert not push_touches_docs(push)
+    push["commits"].append({"added": ["docs/setup.md"], "modified": [], "removed": []})
+    assert push_touches_docs(push)
+    assert not push_touches_docs(dict(push, ref="refs/heads/feature"))
+
+    docs = {
+        "readme": "R" * 50,
+        "contributing": "",
+        "architecture_docs": {"b.md": "second", "a.md": "first"},
+    }
+    text = project_context_text(docs, max_chars=1000)
+    assert text.index("## README.md") < text.index("## docs/a.md") < text.index("## docs/b.md")
+    short = project_context_text(docs, max_chars=40)
+    assert len(short) <= 40 + len("\n[...truncated]") and "docs/" not in short
+    print("  ✓ Doc-touching pushes detected and context budgeted")
+    print()
+
+
+def test_diff_index():
+    print("=== Testing Diff Hunk Index ===")
+    from analysis_engine.diff_index import parse_diff, index_files
+    from analysis_engine.confidence_scorer import ConfidenceScorer
+
+    diff = (
+        "diff --git a/app.py b/app.py\n--- a/app.py\n+++ b/app.py\n"
+        "@@ -1,3 +1,4 @@\n keep\n-old\n+new1\n+new2\n end\n"
+        "@@ -10 +11,2 @@ def f():\n ctx\n+tail\n"
+        "diff --git a/tests/test_app.py b/tests/test_app.py\nnew file mode 100644\n"
+        "--- /dev/null\n+++ b/tests/test_app.py\n@@ -0,0 +1 @@\n+def test_x(): pass\n"
+    )
+    index = parse_diff(iter(diff.splitlines(True)))
+    app = index.get("app.py")
+    assert [(h.new_start, h.new_len) for h in app.hunks] == [(1, 4), (11, 2)]
+    assert list(app.added_lines) == [2, 3, 12]
+    assert list(app.hunks[0].removed) == [2]
+    assert app.added_source() == "new1\nnew2\ntail"
+    assert index.get("tests/test_app.py").status == "added"
+
+    # Line mapping: in-hunk lines kept, others snapped to nearest addition
+    assert index.map_line("app.py", 11) == 11
+    assert index.map_line("app.py", 0) == 2
+    assert index.map_line("app.py", 9) == 12
+    assert index.map_line("other.py", 5) == 5
+
+    same = index_files([{"filename": "app.py", "status": "modified",
+                         "patch": "@@ -1,3 +1,4 @@\n keep\n-old\n+new1\n+new2\n end"}])
+    assert list(same.get("app.py").added_lines) == [2, 3]
+    assert ConfidenceScorer()._score_test_coverage({"diff_index": index}) == 90
+
+    # A removed "-- " line followed by an added "++ " line is hunk content,
+    # not a new file header, with or without a diff --git line
+    hunk = "@@ -1,3 +1,3 @@\n keep\n--- sig\n+++ sig\n end\n"
+    for header in ("diff --git a/mail.txt b/mail.txt\n--- a/mail.txt\n+++ b/mail.txt\n",
+                   "--- a/mail.txt\n+++ b/mail.txt\n"):
+        mail = parse_diff(header + hunk + "--- a/next.py\n+++ b/next.py\n@@ -0,0 +1 @@\n+x\n")
+        assert list(mail.files) == ["mail.txt", "next.py"]
+        assert list(mail.get("mail.txt").added_lines) == [2]
+        assert mail.get("mail.txt").added_text == ["++ sig"]
+    print("  ✓ Hunks, line numbers and line mapping indexed correctly")
+    print()
+
+
+def test_ast_function_diff():
+    print("=== Testing AST Function Diff ===")
+    from analysis_engine.code_analyzer import CodeAnalyzer
+    from analysis_engine.diff_index import index_files
+    from analysis_engine.source_cache import BlobCache, FileVersions
+
+    base = "import os\n\nclass A:\n    def run(self):\n        return 1\n\ndef gone():\n    pass\n"
+    head = ("import os\nimport json\n\nclass A:\n    def run(self):\n        return 2\n\n"
+            "async def fresh():\n    pass\n")
+    index = index_files([
+        {"filename": "a.py", "status": "modified", "patch": "@@ -1 +1,2 @@\n import os\n+import json"},
+        {"filename": "b.js", "status": "modified", "patch": "@@ -1 +1 @@\n-x\n+function y() {}"},
+        {"filename": "c.py", "status": "added", "patch": "@@ -0,0 +1 @@\n+def added_only(): pass"},
+    ])
+    sources = {"a.py": FileVersions("a.py", "b1", base, "h1", head)}
+    result = CodeAnalyzer().analyze_diff(index, sources)
+    assert [(f["file"], f["name"]) for f in result["functions_added"]] == [("a.py", "fresh"), ("c.py", "added_only")]
+    assert [f["name"] for f in result["functions_modified"]] == ["A.run"]
+    assert [f["name"] for f in result["functions_removed"]] == ["gone"]
+    assert result["dependencies_changed"] == [{"file": "a.py", "module": "json", "change": "added"}]
+
+    # Unparseable sources fall back to scanning the added lines
+    broken = {"a.py": FileVersions("a.py", "b1", base, "h2", "def (:\n")}
+    assert CodeAnalyzer().analyze_diff(index, broken)["functions_modified"] == []
+
+    cache = BlobCache(max_chars=10)
+    cache.put("x", "12345")
+    cache.put("y", "123456")
+    assert cache.get("x") is None and cache.get("y") == "123456"
+    print("  ✓ Functions and imports diffed between base and head")
+    print()
+
+
+def test_ast_cache():
+    print("=== Testing Parse-once AST Cache ===")
+    from analysis_engine.code_analyzer import CodeAnalyzer
+    from analysis_engine.diff_index import index_files
+    from analysis_engine.source_cache import ASTCache, FileVersions, blob_sha
+
+    assert blob_sha("hello\n") == "ce013625030ba8dba906f756967f9e9ca394464a"  # git hash-object
+
+    cache = ASTCache()
+    tree = cache.parse("s1", "x = 1\n")
+    assert cache.parse("s1", "x = 1\n") is tree
+    assert cache.parse("s2", "def (:\n") is None and cache.parse("s2", "def (:\n") is None
+    assert cache.error("s2").startswith("SyntaxError") and cache.error("s1") is None
+    assert cache.stats()["parses"] == 2 and cache.stats()["hits"] == 2
+
+    small = ASTCache(max_bytes=ASTCache.AST_BYTES_PER_CHAR * 10)
+    small.parse("a", "a = 1\n")
+    small.parse("b", "b = 22\n")
+    assert small.stats()["entries"] == 1
+
+    # A one-line change inside a loop is measured as the whole function
+    head = ("class A:\n    def run(self, xs):\n        for x in xs:\n            if x:\n"
+            "                print(x)\n\n    def other(self):\n        while True:\n            pass\n")
+    index = index_files([{"filename": "a.py", "status": "modified",
+                          "patch": "@@ -5 +5 @@\n-                pass\n+                print(x)"}])
+    analyzer = CodeAnalyzer()
+    assert analyzer.calculate_complexity("                print(x)")["cyclomatic_complexity"] == 0
+    m = analyzer.changed_code_complexity(index.get("a.py"), analyzer.head_tree(FileVersions("a.py", head=head)))
+    assert (m["cyclomatic_complexity"], m["function_count"], m["nesting_depth"]) == (3, 1, 2)
+    assert m["functions"][0]["name"] == "A.run"
+    assert analyzer.ast_cache.stats()["parses"] == 2
+    print("  ✓ Trees parsed once per blob, failures recorded, changed functions measured")
+    print()
+
+
+def test_ast_metrics():
+    print("=== Testing Single-pass AST Metrics ===")
+    import ast
+    from analysis_engine.ast_metrics import MetricsEngine
+
+    source = (
+        "import os\n"
+        "from . import util\n"
+        "\n"
+        "async def fetch(items, flag):\n"
+        "    import json\n"
+        "    for x in items:\n"
+        "        if x and flag:\n"
+        "            return x\n"
+        "        elif x:\n"
+        "            pass\n"
+        "        else:\n"
+        "            continue\n"
+        "    with open(os.devnull) as fh:\n"
+        "        try:\n"
+        "            data = [y for y in items if y]\n"
+        "        except ValueError:\n"
+        "            data = None\n"
+        "    return lambda v: v if v else data\n"
+        "\n"
+        "class C:\n"
+        "    def m(self):\n"
+        "        def inner():\n"
+        "            return 1 + 2\n"
+        "        return inner\n"
+    )
+    result = MetricsEngine().run(ast.parse(source)).summary()
+    functions = {f["name"]: f for f in result["functions"]}
+    assert list(functions) == ["fetch", "C.m", "C.m.inner"]
+
+    fetch = functions["fetch"]
+    # for, if, `and`, elif, except, comprehension + its if, lambda's IfExp
+    assert fetch["cyclomatic_complexity"] == 9
+    # for 1, if 2, and 1, elif 1, else 1, except 1 (try/with add no nesting),
+    # comprehension if 1, IfExp 2 (nested in the lambda)
+    assert fetch["cognitive_complexity"] == 10
+    assert fetch["nesting_depth"] == 2  # with > try body, for > if body
+    assert fetch["import_fan_out"] == 1 and fetch["loc"] == 15
+    assert functions["C.m"]["cyclomatic_complexity"] == 1
+    assert functions["C.m.inner"]["halstead"]["distinct_operands"] == 2
+
+    assert result["function_count"] == 3
+    assert result["import_fan_out"] == 3  # os, .util, json
+    assert result["cyclomatic_complexity"] == 1 + 8
+    assert result["halstead"]["total_operators"] == 2  # `and`, `+`
+    print("  ✓ Cyclomatic, cognitive, nesting, LOC, Halstead and imports in one pass")
+    print()
+
+
+def test_static_stage():
+    print("=== Testing Static Analysis Stage ===")
+    from analysis_engine.code_analyzer import CodeAnalyzer
+    from analysis_engine.diff_index import index_files
+    from analysis_engine.source_cache import FileVersions
+    from analysis_engine.static_stage import StaticAnalysisStage
+
+    files, sources = [], {}
+    for i in range(6):
+        name = f"pkg/mod{i}.py"
+        head = "".join(f"def f{j}(x):\n    if x > {j}:\n        return x\n    return 0\n" for j in range(i + 1))
+        patch = f"@@ -0,0 +1,{4 * (i + 1)} @@\n" + "".join(f"+{line}\n" for line in head.splitlines())
+        files.append({"filename": name, "status": "added", "patch": patch})
+        sources[name] = FileVersions(name, head=head)
+    files.append({"filename": "README.md", "status": "modified", "patch": "@@ -1 +1 @@\n-a\n+b"})
+    index = index_files(files)
+
+    serial = StaticAnalysisStage(CodeAnalyzer()).run(index, sources)
+    assert serial["complexity_metrics"]["function_count"] == 21
+    assert serial["complexity_metrics"]["cyclomatic_complexity"] == 6 + 21
+    assert [f["name"] for f in serial["diff_analysis"]["functions_added"]][:3] == ["f0", "f0", "f1"]
+    assert serial["skipped_files"] == []
+    assert serial["mode"] == "in-process"
+
+    pooled = StaticAnalysisStage(CodeAnalyzer(), processes=2, chunk_size=2, min_files=1).run(index, sources)
+    assert pooled["mode"] == "pool"  # not a silent in-process fallback
+    for key in ("diff_analysis", "complexity_metrics", "function_metrics", "issues", "skipped_files"):
+        assert pooled[key] == serial[key], key
+
+    # A spent budget leaves only the cheap added-line scan
+    capped = StaticAnalysisStage(CodeAnalyzer(), cpu_budget=1e-9).run(index, sources)
+    assert capped["skipped_files"] == [f["filename"] for f in files][1:]
+    assert len(capped["diff_analysis"]["functions_added"]) == 21
+    print("  ✓ Pooled run matches serial run; CPU budget enforced")
+    print()
+
+
+def test_security_scanner():
+    print("=== Testing Local Security Scanner ===")
+    from analysis_engine.code_analyzer import CodeAnalyzer
+    from analysis_engine.confidence_scorer import ConfidenceScorer
+    from analysis_engine.diff_index import index_files
+    from analysis_engine.security_scanner import format_issues, is_doc_file
+    from analysis_engine.source_cache import FileVersions
+
+    head = (
+        "import os, pickle, subprocess, requests, yaml\n"
+        "API_KEY = 'sk_live_4f9a8b7c6d5e'\n"
+        "def handler(cur, name, data, cmd):\n"
+        "    cur.execute(f\"SELECT * FROM users WHERE name = '{name}'\")\n"
+        "    cur.execute('SELECT * FROM users WHERE name = %s', (name,))\n"
+        "    subprocess.run(cmd, shell=True)\n"
+        "    eval(data)\n"
+        "    yaml.load(data)\n"
+        "    yaml.load(data, Loader=yaml.SafeLoader)\n"
+        "    pickle.loads(data)\n"
+        "    requests.get('https://example.com')\n"
+        "    requests.get('https://example.com', timeout=5)\n"
+        "    PASSWORD_HELP = 'Enter your password'\n"
+        "    os.system(cmd)\n"
+    )
+    lines = head.splitlines()
+    # Everything but the last line is new; os.system was already there
+    patch = f"@@ -1 +1,{len(lines)} @@\n" + "".join(f"+{l}\n" for l in lines[:-1]) + f" {lines[-1]}\n"
+    index = index_files([
+        {"filename": "app.py", "status": "modified", "patch": patch},
+        {"filename": "deploy/config.yml", "status": "modified",
+         "patch": "@@ -1 +1,2 @@\n+db_password: s3cr3tPassw0rd\n+token: ${TOKEN}"},
+        {"filename": "broken.py", "status": "modified", "patch": "@@ -1 +1,2 @@\n+    x = eval(data\n+y = 1"},
+    ])
+    analyzer = CodeAnalyzer()
+    result = analyzer.analyze_file(index.get("app.py"), FileVersions("app.py", head=head))
+    found = [(i["line_number"], i["rule_id"]) for i in result["issues"]]
+    assert found == [
+        (2, "hardcoded-secret"), (4, "sql-string-format"), (6, "subprocess-shell"), (7, "eval-exec"),
+        (8, "yaml-unsafe-load"), (10, "unsafe-deserialization"), (11, "request-without-timeout"),
+    ], found
+    assert "CWE-89" in result["issues"][1]["references"]
+    assert "security_issues" not in result["complexity"]
+
+    config = analyzer.analyze_file(index.get("deploy/config.yml"))["issues"]
+    assert [(i["line_number"], i["rule_id"]) for i in config] == [(1, "hardcoded-secret")]
+    # Unparseable Python falls back to the line rules
+    assert [i["rule_id"] for i in analyzer.analyze_file(index.get("broken.py"))["issues"]] == ["eval-exec"]
+
+    assert "app.py:4 [CWE-89]" in format_issues(result["issues"])
+    assert ConfidenceScorer()._score_static_analysis({"issues": result["issues"]}) == 55
+    assert is_doc_file("docs/setup.md") and is_doc_file("LICENSE")
+    assert not is_doc_file("requirements.txt") and not is_doc_file("static/logo.svg")
+    print("  ✓ CWE patterns flagged on added lines only")
+    print()
+
+
+def test_incremental_score_keeps_carried_findings():
+    print("=== Testing Incremental Re-review Scoring ===")
+    from analysis_engine.confidence_scorer import ConfidenceScorer
+
+    scorer = ConfidenceScorer()
+    vuln = {"category": "security", "severity": "critical", "title": "SQL injection",
+            "file_path": "app/db.py", "line_number": 12}
+    common = dict(
+        requirement_result={"completeness_score": 95},
+        static_result={"cyclomatic_complexity": 2},
+        diff_data={"files_changed": [{"filename": "app/db.py"}, {"filename": "tests/test_db.py"}]},
+    )
+    first = scorer.calculate_score(
+        security_result={"security_score": 20, "findings": [vuln], "vulnerabilities": [vuln]},
+        performance_result={"performance_score": 95}, quality_result={"quality_score": 95}, **common
+    )
+
+    # Push touching only tests/test_db.py: the passes only saw the test file
+    passes = {
+        "security": {"security_score": 100, "findings": [], "vulnerabilities": []},
+        "performance": {"performance_score": 95, "findings": []},
+        "quality": {"quality_score": 95, "findings": []},
+    }
+    merged = scorer.merge_carried_findings(passes, [vuln], first["breakdown"])
+    assert passes["security"]["findings"] == []  # inputs untouched
+    rerun = scorer.calculate_score(
+        security_result=merged["security"], performance_result=merged["performance"],
+        quality_result=merged["quality"], **common
+    )
+    assert rerun["breakdown"]["security_safety"] == 20
+    assert rerun["confidence_score"] <= first["confidence_score"]
+    assert rerun["verdict"] == first["verdict"] != "APPROVE"
+    assert "1 high/critical security finding(s)" in rerun["risk_flags"]
+
+    # Without the merge the vulnerability would vanish and the PR flip to APPROVE
+    naive = scorer.calculate_score(
+        security_result=passes["security"], performance_result=passes["performance"],
+        quality_result=passes["quality"], **common
+    )
+    assert naive["verdict"] == "APPROVE"
+    print("  ✓ Findings in unchanged files still count against the score")
+    print()
+
+
+def test_llm_run_passes():
+    print("=== Testing LLM Pass Failures ===")
+    import time
+    from analysis_engine.llm_reviewer import LLMReviewer
+
+    reviewer = LLMReviewer.__new__(LLMReviewer)  # no API client needed
+    reviewer.cache = None
+    reviewer.model = "test-model"
+    reviewer.max_concurrency = 4
+    reviewer.pass_timeout = 0.2
+    reviewer.chunk_tokens = 10000
+    reviewer.max_chunks = 4
+
+    class FakeCompletions:
+        def create(self, **kwargs):
+            raise TimeoutError("Request timed out.")
+
+    class FakeClient:
+        chat = type("Chat", (), {"completions": FakeCompletions()})()
+
+    reviewer.client = FakeClient()
+    try:
+        reviewer._call_llm("prompt", "security_review")
+        assert False, "_call_llm swallowed the API error"
+    except TimeoutError:
+        pass
+
+    def fake_call_llm(prompt, template=""):
+        if template == "security_review":
+            raise ValueError("Expecting value: line 1 column 1 (char 0)")
+        if template == "performance_review":
+            time.sleep(1.5)
+        return {"quality_score": 88, "findings": [{"title": "Long function"}]}
+
+    reviewer._call_llm = fake_call_llm
+    results = reviewer.run_passes({
+        "security": (reviewer._review_security_chunk, ("diff",)),
+        "performance": (reviewer._review_performance_chunk, ("diff",)),
+        "quality": (reviewer._review_quality_chunk, ("diff",)),
+    })
+    assert results["security"]["pass_error"].startswith("Expecting value")
+    assert results["security"]["security_score"] == 50
+    assert results["performance"]["pass_error"] == "timeout"
+    assert "pass_error" not in results["quality"]
+    assert results["quality"]["quality_score"] == 88
+    assert results["quality"]["findings"] == [{"title": "Long function"}]
+
+    # The single-chunk public methods report failures the same way
+    assert reviewer.review_security("diff")["pass_error"].startswith("Expecting value")
+
+    # Past the overall deadline, queued chunks are skipped rather than run
+    reviewer.pass_timeout = 5
+    results = reviewer.run_passes({
+        "performance#0": (reviewer._review_performance_chunk, ("diff",)),
+        "quality#0": (reviewer._review_quality_chunk, ("diff",)),
+        "quality#1": (reviewer._review_quality_chunk, ("diff",)),
+    }, max_concurrency=1, deadline=time.monotonic() + 0.3)
+    assert results["performance#0"]["pass_error"] == "deadline"
+    assert results["quality#0"]["pass_error"] == "deadline"
+    assert results["quality#1"]["pass_error"] == "deadline"
+    print("  ✓ Failed and timed-out passes get pass_error; completed passes keep their results")
+    print()
+
+
+def test_incremental_rereview_stores_carried_once():
+    print("=== Testing Incremental Re-review Finding Storage ===")
+    from analysis_engine.aggregator import ReviewAggregator
+    from analysis_engine.confidence_scorer import ConfidenceScorer
+
+    # Row copied from the previous review for an unchanged file
+    carried = [{"category": "performance", "severity": "high", "title": "N+1 query",
+                "file_path": "app/views.py", "line_number": 30}]
+    fresh = {"category": "performance", "severity": "medium", "title": "Unbounded list",
+             "file_path": "app/api.py", "line_number": 8}
+    passes = {
+        "requirements": {"completeness_score": 90, "findings": []},
+        "security": {"security_score": 100, "findings": [], "vulnerabilities": []},
+        "performance": {"performance_score": 80, "findings": [fresh], "performance_issues": [fresh]},
+        "quality": {"quality_score": 90, "findings": []},
+    }
+    # Same steps as the worker: fold carried findings in for scoring, then
+    # build rows for everything except them
+    merged = ConfidenceScorer().merge_carried_findings(
+        {k: passes[k] for k in ("security", "performance", "quality")}, carried
+    )
+    assert carried[0] in merged["performance"]["findings"]
+    agg = ReviewAggregator()
+    combined = agg.combine_pass_results(
+        {"requirements": passes["requirements"], "security": merged["security"],
+         "performance": merged["performance"], "quality": merged["quality"]},
+        exclude=carried,
+    )
+    rows = agg.build_finding_rows(7, combined, {})
+    assert [r["title"] for r in rows] == ["Unbounded list"]
+    print("  ✓ Carried findings are not inserted a second time")
+    print()
+
+
+def test_all_pass_findings_stored():
+    print("=== Testing Finding Rows From Every Pass ===")
+    from analysis_engine.aggregator import ReviewAggregator
+
+    def finding(category, title):
+        return {"category": category, "severity": "medium", "title": title,
+                "file_path": "app.py", "line_number": 3}
+
+    drift = finding("requirement_drift", "Missing pagination")
+    vuln = finding("security", "Open redirect")
+    perf = finding("performance", "Quadratic loop")
+    smell = finding("code_quality", "Duplicated parser")
+    # Titled vulnerability the pass didn't also list under findings
+    extra = finding("security", "Weak hash")
+    passes = {
+        "requirements": {"findings": [drift], "missing_features": [drift], "scope_creep": []},
+        "security": {"findings": [vuln], "vulnerabilities": [vuln, extra]},
+        "performance": {"findings": [perf], "performance_issues": [perf]},
+        "quality": {"findings": [smell]},
+    }
+    agg = ReviewAggregator()
+    rows = agg.build_finding_rows(1, agg.combine_pass_results(passes), {})
+    assert sorted(r["title"] for r in rows) == sorted(
+        ["Missing pagination", "Open redirect", "Quadratic loop", "Duplicated parser", "Weak hash"]
+    )
+    findings = agg.create_findings(1, agg.combine_pass_results(passes), {})
+    assert {f.category for f in findings} == {"requirement_drift", "security", "performance", "code_quality"}
+    print("  ✓ Structured findings from all four passes become Finding rows")
+    print()
+
+
+class _FakeRedis:
+    """Subset of redis-py used by scheduling.Scheduler and RedisCacheBackend."""
+
+    def __init__(self):
+        self.zsets, self.hashes, self.values = {}, {}, {}
+
+    def pipeline(self):
+        return _FakePipeline(self)
+
+    def zremrangebyscore(self, key, low, high):
+        zset = self.zsets.get(key, {})
+        stale = [m for m, score in zset.items() if float(low) <= score <= float(high)]
+        for member in stale:
+            del zset[member]
+        return len(stale)
+
+    def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    def zrank(self, key, member):
+        ranked = sorted(self.zsets.get(key, {}).items(), key=lambda item: (item[1], item[0]))
+        names = [m for m, _ in ranked]
+        return names.index(member) if member in names else None
+
+    def zrem(self, key, *members):
+        for member in members:
+            if isinstance(member, bytes):
+                member = member.decode("utf-8")
+            self.zsets.get(key, {}).pop(member, None)
+
+    def zcard(self, key):
+        return len(self.zsets.get(key, {}))
+
+    def zrange(self, key, start, end):
+        ranked = sorted(self.zsets.get(key, {}).items(), key=lambda item: (item[1], item[0]))
+        return [m.encode("utf-8") for m, _ in ranked][start:end + 1]
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+
+    def expire(self, key, seconds):
+        return True
+
+    def hincrbyfloat(self, key, field, amount):
+        bucket = self.hashes.setdefault(key, {})
+        bucket[field] = bucket.get(field, 0) + amount
+
+
+class _FakePipeline:
+    def __init__(self, redis):
+        self.redis, self.calls = redis, []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+def test_scheduler_slots():
+    print("=== Testing Per-installation Slots ===")
+    import time
+    from scheduling import Scheduler, SLOT_LEASE_SECONDS
+
+    redis = _FakeRedis()
+    scheduler = Scheduler(redis_client=redis)
+    scheduler.limit = 2
+    assert scheduler.acquire(1, "a") and scheduler.acquire(1, "b")
+    assert not scheduler.acquire(1, "c")  # at the limit: deferred
+    assert scheduler.acquire(2, "x")  # other installations are unaffected
+    scheduler.release(1, "a")
+    assert scheduler.acquire(1, "c")
+    assert not scheduler.acquire(1, "d")
+
+    # A slot held past the lease (crashed worker) is reclaimed
+    key = scheduler._slots_key(1)
+    redis.zsets[key]["b"] = time.time() - SLOT_LEASE_SECONDS - 1
+    assert scheduler.acquire(1, "d")
+    assert set(redis.zsets[key]) == {"c", "d"}
+    assert redis.hashes["smartcode:sched:stats"]["deferred"] == 2
+    print("  ✓ At most `limit` running per installation; release and lease expiry free slots")
+    print()
+
+
+def test_redis_cache_prune():
+    print("=== Testing Redis LLM Cache Pruning ===")
+    import threading
+    import time
+    from analysis_engine.llm_cache import RedisCacheBackend
+
+    cache = RedisCacheBackend.__new__(RedisCacheBackend)  # no server needed
+    cache.ttl, cache.max_entries, cache.PRUNE_EVERY = 60, 3, 5
+    cache._redis, cache._writes, cache._writes_lock = _FakeRedis(), 0, threading.Lock()
+    index = cache._redis.zsets.setdefault(cache.INDEX_KEY, {})
+
+    cache.set("k0", {"n": 0})
+    assert index["k0"] > time.time() + 50  # scored by expiry time
+    index["k0"] = time.time() - 1  # already expired in Redis
+    for i in range(1, 4):
+        cache.set(f"k{i}", {"n": i})
+    assert len(index) == 4  # no pruning yet
+    # The fifth write prunes: k0 is expired, then k1 goes to honour the cap
+    cache.set("k4", {"n": 4})
+    assert sorted(index) == ["k2", "k3", "k4"]
+    assert cache.get("k1") is None and cache.get("k4") == {"n": 4}
+    print("  ✓ Index scored by expiry; expired and overflow entries pruned every PRUNE_EVERY writes")
+    print()
+
+
+def test_schedule_review():
+    print("=== Testing schedule_review ===")
+    import sys
+    import types
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from database import Base
+    from models import Review
+    from scheduling import schedule_review
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+
+    enqueued, revoked = [], []
+
+    def enqueue_analysis(*args, **kwargs):
+        enqueued.append((args, kwargs))
+        return f"task-{len(enqueued)}"
+
+    fake_worker = types.ModuleType("worker")
+    fake_worker.enqueue_analysis = enqueue_analysis
+    fake_worker.revoke_analysis = revoked.append
+    real_worker = sys.modules.get("worker")
+    sys.modules["worker"] = fake_worker
+    try:
+        # No review yet: a new one is created and queued
+        review, queued = schedule_review(db, "o/r", 5, 1, trigger="opened", head_sha="aaa")
+        assert queued and review.status == "pending" and review.task_id == "task-1"
+        assert enqueued[0][1]["head_sha"] == "aaa"
+
+        # Same SHA again (redelivery): reused, nothing queued
+        again, queued = schedule_review(db, "o/r", 5, 1, trigger="opened", head_sha="aaa")
+        assert again.id == review.id and not queued and len(enqueued) == 1
+
+        # New push: the queued job is revoked and the row retargeted
+        newer, queued = schedule_review(db, "o/r", 5, 1, trigger="synchronize", head_sha="bbb")
+        assert queued and newer.id == review.id and revoked == ["task-1"]
+        assert newer.head_sha == "bbb" and newer.task_id == "task-2"
+
+        # Manual trigger without a SHA leaves the in-flight review alone
+        manual, queued = schedule_review(db, "o/r", 5, 1, trigger="manual")
+        assert manual.id == review.id and not queued
+        assert manual.head_sha == "bbb" and revoked == ["task-1"] and len(enqueued) == 2
+        assert db.query(Review).count() == 1
+    finally:
+        if real_worker is not None:
+            sys.modules["worker"] = real_worker
+        else:
+            del sys.modules["worker"]
+        db.close()
+    print("  ✓ Reuse, supersede, manual and new-review paths")
+    print()
+
+
+def _sqlite_session():
+    """In-memory SQLite session with every table, usable from any thread."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+    from database import Base
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
+
+
+def _seed_findings(session, count):
+    from models import Review, Finding
+
+    session.add(Review(id=1, repo_name="o/r", pr_number=5, status="completed"))
+    session.add_all([
+        Finding(review_id=1, category="security", severity="high" if i % 2 else "low", title=f"f{i}",
+                description="d", file_path="a.py", line_number=i, confidence_score=0.9)
+        for i in range(count)
+    ])
+    session.commit()
+
+
+def _review_status(db, **params):
+    """Call the GET /review/{id} handler directly, with its query defaults."""
+    import asyncio
+    from routes.api import get_review_status
+
+    args = dict(limit=None, cursor=None, severity=None, category=None,
+                file_path=None, fields=None, format="json")
+    args.update(params)
+
+    async def _call():
+        response = await get_review_status(1, db=db, **args)
+        if args["format"] == "ndjson":
+            import json
+            return [json.loads(line) async for line in response.body_iterator]
+        return response
+
+    return asyncio.run(_call())
+
+
+def test_review_pagination():
+    print("=== Testing Findings Pagination ===")
+    from fastapi import HTTPException
+    from database import ThreadedSession
+
+    session = _sqlite_session()
+    _seed_findings(session, 5)
+    db = ThreadedSession(session)
+
+    first = _review_status(db, limit=2, fields="title")
+    assert first["findings"] == [{"title": "f0"}, {"title": "f1"}]
+    second = _review_status(db, limit=2, fields="title", cursor=first["next_cursor"])
+    third = _review_status(db, limit=2, fields="title", cursor=second["next_cursor"])
+    assert [f["title"] for f in second["findings"] + third["findings"]] == ["f2", "f3", "f4"]
+    assert third["next_cursor"] is None
+    everything = _review_status(db)
+    assert len(everything["findings"]) == 5 and "next_cursor" not in everything
+    assert [f["title"] for f in _review_status(db, severity="high")["findings"]] == ["f1", "f3"]
+    for bad in ({"cursor": "!!"}, {"fields": "share_password"}):
+        try:
+            _review_status(db, **bad)
+            assert False, f"accepted {bad}"
+        except HTTPException as e:
+            assert e.status_code == 400
+    print("  ✓ JSON pages follow next_cursor; filters and field checks apply")
+
+    # NDJSON: review line, one line per finding, then the cursor
+    lines = _review_status(db, format="ndjson", limit=3, fields="title")
+    assert lines[0]["review"]["id"] == 1
+    assert lines[1:4] == [{"title": "f0"}, {"title": "f1"}, {"title": "f2"}]
+    rest = _review_status(db, format="ndjson", limit=3, fields="title", cursor=lines[4]["next_cursor"])
+    assert rest[1:] == [{"title": "f3"}, {"title": "f4"}]  # last page: no cursor line
+    session.close()
+    print("  ✓ NDJSON stream pages with the same cursor")
+    print()
+
+
+def test_live_metrics_sql():
+    print("=== Testing SQL-side Repository Metrics ===")
+    import asyncio
+    from datetime import datetime
+    from sqlalchemy import select
+    import routes.api as api
+    from database import ThreadedSession
+    from models import Review, Finding
+
+    session = _sqlite_session()
+    reviews = [  # 2024-01-01 and 2024-01-08 are Mondays
+        Review(id=1, repo_name="o/r", created_at=datetime(2024, 1, 1, 10), status="completed",
+               verdict="APPROVE", confidence_score=80),
+        Review(id=2, repo_name="o/r", created_at=datetime(2024, 1, 3, 23), status="completed",
+               verdict="CHANGES_REQUESTED", confidence_score=60),
+        Review(id=3, repo_name="o/r", created_at=datetime(2024, 1, 8, 1), status="running"),
+        Review(id=4, repo_name="other/r", created_at=datetime(2024, 1, 1), status="completed",
+               verdict="APPROVE", confidence_score=10),
+    ]
+    session.add_all(reviews)
+    session.add_all([
+        Finding(review_id=2, severity="high", category="security"),
+        Finding(review_id=2, severity="medium", category=None),
+        Finding(review_id=3, severity="critical", category="security"),  # not completed: not counted
+    ])
+    session.commit()
+
+    # Bucket expressions, evaluated by SQLite itself
+    for bucket, expected in (("day", ["2024-01-01", "2024-01-03", "2024-01-08"]),
+                             ("week", ["2024-01-01", "2024-01-01", "2024-01-08"])):
+        periods = session.execute(
+            select(api._bucket_expr("sqlite", bucket)).where(Review.repo_name == "o/r").order_by(Review.id)
+        ).scalars().all()
+        assert periods == expected, (bucket, periods)
+
+    db = ThreadedSession(session)
+    real_engine, api.engine = api.engine, session.get_bind()
+    try:
+        week = asyncio.run(api._live_metrics(db, "o/r", None, None, "week"))
+        since = asyncio.run(api._live_metrics(db, "o/r", datetime(2024, 1, 2), None, "day"))
+    finally:
+        api.engine = real_engine
+        session.close()
+
+    assert (week["total_reviews"], week["completed_reviews"]) == (3, 2)
+    assert week["average_confidence_score"] == 70.0
+    assert week["verdict_distribution"] == {"APPROVE": 1, "REVIEW_NEEDED": 0, "CHANGES_REQUESTED": 1}
+    assert week["findings_by_severity"] == {"high": 1, "medium": 1}
+    assert week["findings_by_category"] == {"security": 1, "unknown": 1}
+    assert week["trend"]["series"] == [
+        {"period": "2024-01-01", "total_reviews": 2, "completed_reviews": 2, "average_confidence_score": 70.0},
+        {"period": "2024-01-08", "total_reviews": 1, "completed_reviews": 0, "average_confidence_score": None},
+    ]
+    assert [p["period"] for p in since["trend"]["series"]] == ["2024-01-03", "2024-01-08"]
+    assert since["total_reviews"] == 2 and since["average_confidence_score"] == 60.0
+    print("  ✓ Totals, verdicts, finding counts and day/week buckets computed in SQL")
+    print()
+
+
+def test_async_session_path():
+    print("=== Testing Async Session Path ===")
+    import asyncio
+    import json
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+    import database
+    from database import Base, ThreadedSession
+    from routes.api import get_review_status
+
+    params = dict(limit=2, cursor=None, severity=None, category=None, file_path=None, fields="title")
+
+    async def _read_through_get_async_db():
+        gen = database.get_async_db()
+        db = await gen.__anext__()
+        try:
+            page = await get_review_status(1, db=db, format="json", **params)
+            stream = await get_review_status(1, db=db, format="ndjson", **params)
+            lines = [json.loads(line) async for line in stream.body_iterator]
+        finally:
+            await gen.aclose()
+        return type(db), page["findings"], page["next_cursor"], lines[1:]
+
+    async def _with_aiosqlite():
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with AsyncSession(engine) as session:
+            await session.run_sync(_seed_findings, 3)
+        database.AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
+        try:
+            return await _read_through_get_async_db()
+        finally:
+            await engine.dispose()
+
+    real_async, real_sync = database.AsyncSessionLocal, database.SessionLocal
+    try:
+        via_async = asyncio.run(_with_aiosqlite())
+        # No async driver: get_async_db falls back to a threaded sync Session
+        sync_session = _sqlite_session()
+        _seed_findings(sync_session, 3)
+        database.AsyncSessionLocal = None
+        database.SessionLocal = sessionmaker(bind=sync_session.get_bind())
+        via_threads = asyncio.run(_read_through_get_async_db())
+        sync_session.close()
+    finally:
+        database.AsyncSessionLocal, database.SessionLocal = real_async, real_sync
+
+    assert via_async[0] is AsyncSession and via_threads[0] is ThreadedSession
+    assert via_async[1:] == via_threads[1:]
+    findings, next_cursor, lines = via_async[1:]
+    assert findings == [{"title": "f0"}, {"title": "f1"}] and next_cursor
+    assert lines == findings + [{"next_cursor": next_cursor}]
+    print("  ✓ AsyncSession (aiosqlite) and the threaded fallback return the same pages")
+    print()
+
+
 if __name__ == "__main__":
     test_imports()
     test_confidence_scorer()
     test_metrics_calculator()
     test_aggregator()
     test_prompt_templates()
+    test_llm_cache()
+    test_diff_chunker()
+    test_webhook_outbox()
+    test_parse_pr_url()
+    test_installation_token_cache()
+    test_github_rest_layer()
+    test_collector_concurrent_fetch()
+    test_collect_file_versions()
+    test_project_docs()
+    test_diff_index()
+    test_ast_function_diff()
+    test_ast_cache()
+    test_ast_metrics()
+    test_static_stage()
+    test_security_scanner()
+    test_incremental_score_keeps_carried_findings()
+    test_llm_run_passes()
+    test_incremental_rereview_stores_carried_once()
+    test_all_pass_findings_stored()
+    test_scheduler_slots()
+    test_redis_cache_prune()
+    test_schedule_review()
+    test_review_pagination()
+    test_live_metrics_sql()
+    test_async_session_path()
     print("=" * 50)
     print("ALL TESTS PASSED ✓")
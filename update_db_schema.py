@@ -1,8 +1,11 @@
 """Update the database schema to add new columns for SmartCode v2.
 
 Run this script to add:
-  - Review: confidence_score, verdict, score_breakdown
+  - Review: confidence_score, verdict, score_breakdown, file_fingerprints,
+            head_sha, task_id, updated_at
   - Finding: title, suggested_fix, references
+  - ContextCache: commit_sha
+  - Index: reviews (repo_name, status, created_at), reviews (repo_name, updated_at)
 """
 import sqlite3
 import os
@@ -19,6 +22,10 @@ def migrate():
         "confidence_score": "REAL",
         "verdict": "VARCHAR",
         "score_breakdown": "TEXT",  # JSON stored as text in SQLite
+        "file_fingerprints": "TEXT",  # JSON stored as text in SQLite
+        "head_sha": "VARCHAR",
+        "task_id": "VARCHAR",
+        "updated_at": "DATETIME",
     }
     for col, dtype in review_columns.items():
         try:
@@ -27,6 +34,11 @@ def migrate():
         except sqlite3.OperationalError:
             print(f"  – reviews.{col} already exists")
 
+    # Existing rows: last known change
+    cursor.execute(
+        "UPDATE reviews SET updated_at = COALESCE(completed_at, created_at) WHERE updated_at IS NULL"
+    )
+
     # ── Finding table additions ──
     finding_columns = {
         "title": "VARCHAR",
@@ -40,6 +52,25 @@ def migrate():
         except sqlite3.OperationalError:
             print(f"  – findings.{col} already exists")
 
+    # ── ContextCache table additions ──
+    try:
+        cursor.execute("ALTER TABLE context_cache ADD COLUMN commit_sha VARCHAR")
+        print("  ✓ Added context_cache.commit_sha")
+    except sqlite3.OperationalError:
+        print("  – context_cache.commit_sha already exists")
+
+    # ── Indexes ──
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS ix_reviews_repo_status_created "
+        "ON reviews (repo_name, status, created_at)"
+    )
+    print("  ✓ Ensured index ix_reviews_repo_status_created")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS ix_reviews_repo_updated "
+        "ON reviews (repo_name, updated_at)"
+    )
+    print("  ✓ Ensured index ix_reviews_repo_updated")
+
     conn.commit()
     conn.close()
     print("\nSchema migration complete.")
@@ -1,5 +1,6 @@
+import hashlib
 import re
-from typing import List
+from typing import List, Tuple
 
 def parse_issue_references(text: str) -> List[int]:
     """Parse issue references from text (#123, fixes #456, etc.)"""
@@ -11,6 +12,23 @@ def parse_issue_references(text: str) -> List[int]:
     matches = re.findall(pattern, text, re.IGNORECASE)
     return [int(match) for match in matches]
 
+_PR_URL_RE = re.compile(r'^(?:https?://)?(?:www\.)?github\.com/([^/\s]+/[^/\s]+)/pulls?/(\d+)(?:[/?#].*)?$')
+
+def parse_pr_url(url: str) -> Tuple[str, int]:
+    """Split a GitHub PR URL into (owner/repo, pr_number); ValueError if malformed"""
+    match = _PR_URL_RE.match((url or "").strip())
+    if not match:
+        raise ValueError(f"Not a GitHub pull request URL: {url}")
+    return match.group(1), int(match.group(2))
+
+def fingerprint_patch(file_change: dict) -> str:
+    """Stable fingerprint of a changed file's status and patch text"""
+    digest = hashlib.sha256()
+    digest.update((file_change.get("status") or "").encode("utf-8"))
+    digest.update(b"\x00")
+    digest.update((file_change.get("patch") or "").encode("utf-8"))
+    return digest.hexdigest()
+
 def extract_project_docs(repo_path: str) -> dict:
     """Extract project documentation from common files"""
     import os
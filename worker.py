@@ -7,54 +7,207 @@ from config import settings
 try:
     from celery import Celery
     from github_integration.client import GitHubAppClient
+    from github_integration.rest import RateLimited
     from data_pipeline.collector import DataCollector
+    from data_pipeline.project_docs import load_project_docs, project_context_text
     from analysis_engine.requirement_extractor import RequirementExtractor
     from analysis_engine.code_analyzer import CodeAnalyzer
+    from analysis_engine.diff_index import index_files
+    from analysis_engine.static_stage import StaticAnalysisStage
+    from analysis_engine.security_scanner import format_issues, is_doc_file
+    from analysis_engine.source_cache import ASTCache, get_blob_cache
     from analysis_engine.llm_reviewer import LLMReviewer
     from analysis_engine.aggregator import ReviewAggregator
     from analysis_engine.confidence_scorer import ConfidenceScorer
     from analysis_engine.metrics_calculator import MetricsCalculator
     from database import SessionLocal
     from models import Review, Finding
+    from utils.helpers import fingerprint_patch
+    from metrics_rollup import refresh_for_review
+    from scheduling import get_scheduler, LANES, LANE_NORMAL
+    import time
+    from sqlalchemy import insert
     import json
     from datetime import datetime, timezone
 
     celery_app = Celery('smart_review_worker')
     celery_app.conf.broker_url = settings.redis_url
     celery_app.conf.result_backend = settings.redis_url
+    # Priority lanes: workers poll analysis.high, then .normal, then .low
+    celery_app.conf.task_default_queue = LANE_NORMAL
+    celery_app.conf.broker_transport_options = {"queue_order_strategy": "priority"}
+
+    class Superseded(Exception):
+        """A newer push to the PR replaced the head SHA this job was for."""
+
+
+    def enqueue_analysis(repo_name: str, pr_number: int, installation_id: int,
+                         incremental: bool = False, head_sha: str = None,
+                         review_id: int = None, countdown: float = 0,
+                         lane: str = None):
+        """Queue analyze_pull_request on a priority lane; returns the Celery task id."""
+        lane = lane if lane in LANES else LANE_NORMAL
+        result = analyze_pull_request.apply_async(
+            args=(repo_name, pr_number, installation_id),
+            kwargs={
+                "incremental": incremental, "head_sha": head_sha, "review_id": review_id,
+                "lane": lane, "ready_at": time.time() + (countdown or 0),
+            },
+            countdown=countdown or None,
+            queue=lane,
+        )
+        return result.id
+
+
+    def revoke_analysis(task_id: str):
+        """Best-effort cancel of a queued (not yet started) analysis."""
+        try:
+            celery_app.control.revoke(task_id)
+        except Exception as e:
+            print(f"[worker] Warning: could not revoke task {task_id}: {e}")
+
 
-    @celery_app.task
-    def analyze_pull_request(repo_name: str, pr_number: int, installation_id: int):
+    @celery_app.task(bind=True, max_retries=settings.analysis_max_deferrals)
+    def analyze_pull_request(self, repo_name: str, pr_number: int, installation_id: int,
+                             incremental: bool = False, head_sha: str = None,
+                             review_id: int = None, lane: str = None,
+                             ready_at: float = None):
         """Full async analysis pipeline.
 
         PR → Context Extraction → Static Analysis → AI Reasoning
             → Confidence Scoring → Findings Storage → GitHub Comment
+
+        With ``incremental=True`` (synchronize events), only files whose
+        patch fingerprint differs from the last completed review are
+        re-analysed; findings for unchanged files are carried over.
+
+        When ``head_sha`` and ``review_id`` are given (webhook path), the
+        job aborts as soon as it sees the review has moved on to a newer
+        head SHA, leaving the review row to the job for that SHA.
+
+        Jobs whose installation is already running its share of analyses
+        are deferred back onto their lane (see scheduling.py), at most
+        ``analysis_max_deferrals`` times.
         """
-        print(f"[worker] Starting analysis for {repo_name}#{pr_number}")
+        scheduler = get_scheduler()
+        task_id = self.request.id or f"{repo_name}#{pr_number}"
+        if not scheduler.acquire(installation_id, task_id):
+            print(f"[worker] Installation {installation_id} at concurrency limit; deferring {repo_name}#{pr_number}")
+            raise _defer(self, settings.analysis_defer_seconds, lane, review_id)
+        try:
+            scheduler.record_start(lane, ready_at)
+            return _run_analysis(repo_name, pr_number, installation_id,
+                                 incremental, head_sha, review_id)
+        except RateLimited as e:
+            print(f"[worker] {e}; deferring {repo_name}#{pr_number}")
+            raise _defer(self, e.retry_after, lane, review_id)
+        finally:
+            scheduler.release(installation_id, task_id)
 
-        github_client = GitHubAppClient()
-        repo_client = github_client.get_repo_client(installation_id, repo_name)
-        collector = DataCollector(repo_client)
-        requirement_extractor = RequirementExtractor()
-        code_analyzer = CodeAnalyzer()
-        llm_reviewer = LLMReviewer()
-        aggregator = ReviewAggregator()
-        confidence_scorer = ConfidenceScorer()
-        metrics_calc = MetricsCalculator()
 
+    def _defer(task, countdown, lane, review_id):
+        """Re-queue ``task`` on its lane after ``countdown`` seconds.
+
+        ``ready_at`` moves to when the job becomes runnable again, so the
+        deliberate delay isn't reported as queue wait. Once the deferral
+        budget is spent the review is marked as errored and Celery's
+        MaxRetriesExceededError ends the job.
+        """
+        if task.request.retries >= task.max_retries:
+            print(f"[worker] Giving up after {task.request.retries} deferral(s)")
+            _mark_error(review_id)
+        kwargs = dict(task.request.kwargs or {}, ready_at=time.time() + countdown)
+        return task.retry(countdown=countdown, queue=lane or LANE_NORMAL, kwargs=kwargs)
+
+
+    def _mark_error(review_id):
+        if review_id is None:
+            return
         db = SessionLocal()
-        review = None
         try:
+            review = db.get(Review, review_id)
+            if review is not None and review.status in ("pending", "running"):
+                review.status = "error"
+                db.commit()
+                _refresh_rollup(db, review)
+        finally:
+            db.close()
+
+
+    def _run_analysis(repo_name, pr_number, installation_id, incremental, head_sha, review_id):
+        print(f"[worker] Starting analysis for {repo_name}#{pr_number}")
+
+        db = SessionLocal()
+        review = db.get(Review, review_id) if review_id else None
+        try:
+            _ensure_current(db, review, head_sha)
+        except Superseded:
+            _refresh_rollup(db, review)
+            db.close()
+            print(f"[worker] Skipping {repo_name}#{pr_number}@{head_sha}: superseded by a newer push")
+            return {"status": "superseded", "review_id": review_id}
+        if review is not None:
+            review.status = "running"
+            db.commit()
+            _refresh_rollup(db, review)
+
+        try:
+            # Client setup can fail too (bad installation, GitHub 5xx,
+            # missing API key); the handlers below then mark the review as
+            # errored instead of leaving it "running"
+            github_client = GitHubAppClient()
+            collector = DataCollector(github_client.get_api(installation_id),
+                                      max_workers=settings.github_fetch_concurrency,
+                                      raw_diff=settings.github_raw_diff)
+            requirement_extractor = RequirementExtractor()
+            # One parse per blob for every static pass of this analysis
+            code_analyzer = CodeAnalyzer(ASTCache(settings.ast_cache_max_mb * 1024 * 1024))
+            static_stage = StaticAnalysisStage(
+                code_analyzer,
+                processes=settings.static_analysis_processes,
+                chunk_size=settings.static_analysis_chunk_size,
+                min_files=settings.static_analysis_min_files,
+                cpu_budget=settings.static_analysis_cpu_budget,
+                ast_cache_bytes=settings.ast_cache_max_mb * 1024 * 1024,
+            )
+            llm_reviewer = LLMReviewer()
+            aggregator = ReviewAggregator()
+            confidence_scorer = ConfidenceScorer()
+            metrics_calc = MetricsCalculator()
+
             # ── 1. Context Extraction ───────────────────────────────
             print(f"[worker] Collecting PR data...")
             pr_data = collector.collect_pr_data(repo_name, pr_number)
-
-            # Build unified diff from file patches
-            code_diff = "\n".join(
-                f"--- a/{f['filename']}\n+++ b/{f['filename']}\n{f['patch']}"
-                for f in pr_data.get("files_changed", [])
-                if f.get("patch")
-            )
+            if head_sha and pr_data.get("head_sha") and pr_data["head_sha"] != head_sha:
+                # The PR has already moved on; its own webhook will follow
+                raise Superseded()
+            files_changed = pr_data.get("files_changed", [])
+            fingerprints = {f["filename"]: fingerprint_patch(f) for f in files_changed}
+
+            # Incremental re-review: skip files whose patch is unchanged
+            previous = _latest_fingerprinted_review(db, repo_name, pr_number) if incremental else None
+            reviewed_files = files_changed
+            if previous is not None:
+                old_fingerprints = previous.file_fingerprints or {}
+                reviewed_files = [
+                    f for f in files_changed
+                    if old_fingerprints.get(f["filename"]) != fingerprints[f["filename"]]
+                ]
+                print(f"[worker] Incremental review: {len(reviewed_files)}/{len(files_changed)} file(s) changed")
+                if not reviewed_files and set(old_fingerprints) == set(fingerprints):
+                    print(f"[worker] No patches changed since review {previous.id}; nothing to do")
+                    if review is not None and review.id != previous.id:
+                        _copy_review_result(db, previous, review, set(fingerprints))
+                        _refresh_rollup(db, review)
+                    return {"status": "unchanged", "review_id": review.id if review else previous.id}
+            reviewed_names = {f["filename"] for f in reviewed_files}
+
+            # Build unified diff from file patches (for the LLM prompts) and
+            # the hunk index every static pass reads
+            full_diff = _build_diff(files_changed)
+            code_diff = _build_diff(reviewed_files) if previous is not None else full_diff
+            diff_index = index_files(files_changed)
+            reviewed_index = diff_index.subset(reviewed_names) if previous is not None else diff_index
 
             # Extract requirements from linked issues
             issue_requirements = {}
@@ -67,58 +220,125 @@ try:
                 issue_requirements = extracted
                 break  # use first linked issue
 
-            # Project context
-            project_context = pr_data.get("project_docs", {}).get("readme", "")
+            # Project context (cached per repo in ContextCache)
+            try:
+                pr_data["project_docs"] = load_project_docs(
+                    db, collector, repo_name, pr_data.get("default_branch"),
+                    ttl=settings.project_docs_ttl,
+                )
+            except RateLimited:
+                raise
+            except Exception as docs_err:
+                db.rollback()
+                print(f"[worker] Warning: could not load project docs: {docs_err}")
+            project_context = project_context_text(
+                pr_data.get("project_docs", {}), settings.project_docs_max_chars
+            )
 
             # ── 2. Static Analysis ──────────────────────────────────
             print(f"[worker] Running static analysis...")
-            diff_analysis = code_analyzer.analyze_diff(code_diff)
-
-            # Calculate complexity for each changed Python file
-            complexity_metrics = {"cyclomatic_complexity": 0, "function_count": 0, "nesting_depth": 0}
-            for f in pr_data.get("files_changed", []):
-                if f.get("filename", "").endswith(".py") and f.get("patch"):
-                    # Extract added lines as code
-                    added = "\n".join(
-                        line[1:] for line in f["patch"].split("\n")
-                        if line.startswith("+") and not line.startswith("+++")
-                    )
-                    if added.strip():
-                        m = code_analyzer.calculate_complexity(added)
-                        complexity_metrics["cyclomatic_complexity"] += m.get("cyclomatic_complexity", 0)
-                        complexity_metrics["function_count"] += m.get("function_count", 0)
-                        complexity_metrics["nesting_depth"] = max(
-                            complexity_metrics["nesting_depth"],
-                            m.get("nesting_depth", 0)
-                        )
+            # Base/head sources of the changed Python files, for the AST diff
+            py_paths = {
+                fd.filename for fd in reviewed_index
+                if fd.filename.endswith(".py")
+            }
+            py_files = [f for f in files_changed if f["filename"] in py_paths][:settings.ast_diff_max_files]
+            sources = {}
+            try:
+                sources = collector.collect_file_versions(
+                    repo_name, pr_data["base_sha"], pr_data["head_sha"], py_files, get_blob_cache()
+                )
+            except RateLimited:
+                raise
+            except Exception as src_err:
+                print(f"[worker] Warning: could not fetch file sources, diffing added lines only: {src_err}")
+            static = static_stage.run(reviewed_index, sources)
+            diff_analysis = static["diff_analysis"]
+            complexity_metrics = static["complexity_metrics"]
+            function_metrics = static["function_metrics"]
+            security_issues = static["issues"]
+            print(f"[worker] Local security scan: {len(security_issues)} issue(s)")
+            if static["skipped_files"]:
+                print(f"[worker] CPU budget reached; {len(static['skipped_files'])} file(s) only scanned")
+            if diff_analysis["parse_errors"]:
+                print(f"[worker] {len(diff_analysis['parse_errors'])} file(s) failed to parse")
+            print(f"[worker] AST cache: {code_analyzer.ast_cache.stats()}")
 
             # ── 3. AI Reasoning (LLM Reviews) ──────────────────────
             print(f"[worker] Running LLM reviews...")
-            req_result = llm_reviewer.review_feature_completeness(
-                issue_requirements, code_diff, project_context, issue_num
-            )
-            sec_result = llm_reviewer.review_security(code_diff)
-            perf_result = llm_reviewer.review_performance(code_diff)
-            quality_result = llm_reviewer.review_code_quality(
-                code_diff, json.dumps(complexity_metrics)
+            # The most complex changed functions, for the reviewers' attention
+            hotspots = sorted(function_metrics, key=lambda f: f["cognitive_complexity"], reverse=True)[:5]
+            static_summary = {
+                **complexity_metrics,
+                "most_complex_functions": [
+                    {k: f[k] for k in ("file", "name", "line", "cyclomatic_complexity",
+                                       "cognitive_complexity", "nesting_depth", "loc")}
+                    for f in hotspots
+                ],
+                "functions_added": [f["name"] for f in diff_analysis["functions_added"]],
+                "functions_modified": [f["name"] for f in diff_analysis["functions_modified"]],
+                "functions_removed": [f["name"] for f in diff_analysis["functions_removed"]],
+            }
+            # The LLM security pass only sees files that can carry a
+            # vulnerability (or that the scanner flagged); none -> skipped
+            flagged = {issue["file_path"] for issue in security_issues}
+            security_files = [
+                f for f in reviewed_files
+                if not is_doc_file(f["filename"]) or f["filename"] in flagged
+            ]
+            llm_results = llm_reviewer.review_all(
+                issue_requirements, code_diff, project_context, issue_num,
+                json.dumps(static_summary),
+                requirement_diff=full_diff,
+                security_diff=_build_diff(security_files),
+                security_context=format_issues(security_issues),
             )
+            req_result = llm_results["requirements"]
+            sec_result = llm_results["security"]
+            perf_result = llm_results["performance"]
+            quality_result = llm_results["quality"]
+            failed_passes = [n for n, r in llm_results.items() if r.get("pass_error")]
+            if failed_passes:
+                print(f"[worker] Warning: partial LLM results, passes failed: {', '.join(failed_passes)}")
 
             # ── 4. Confidence Scoring ───────────────────────────────
             print(f"[worker] Calculating confidence score...")
+            unchanged = set(fingerprints) - reviewed_names if previous is not None else set()
+            carried_preview = []
+            if unchanged:
+                # Findings still standing in files this run didn't re-review
+                # keep counting against the score
+                carried_preview = [
+                    {"category": f.category, "severity": f.severity, "title": f.title,
+                     "file_path": f.file_path, "line_number": f.line_number}
+                    for f in _findings_for_files(db, previous.id, unchanged)
+                ]
+                merged = confidence_scorer.merge_carried_findings(
+                    {"security": sec_result, "performance": perf_result, "quality": quality_result},
+                    carried_preview, previous.score_breakdown,
+                )
+                sec_result, perf_result, quality_result = (
+                    merged["security"], merged["performance"], merged["quality"]
+                )
             confidence_result = confidence_scorer.calculate_score(
                 requirement_result=req_result,
                 security_result=sec_result,
                 performance_result=perf_result,
-                static_result=complexity_metrics,
+                static_result={**complexity_metrics, "issues": security_issues},
                 quality_result=quality_result,
-                diff_data=pr_data,
+                diff_data={**pr_data, "diff_index": diff_index},
             )
 
             # ── 5. Store Review + Findings ──────────────────────────
-            review = db.query(Review).filter(
-                Review.repo_name == repo_name,
-                Review.pr_number == pr_number,
-            ).first()
+            # Don't store results for a head SHA that was pushed over
+            # while the LLM passes were running.
+            _ensure_current(db, review, head_sha)
+
+            if review is None:
+                review = db.query(Review).filter(
+                    Review.repo_name == repo_name,
+                    Review.pr_number == pr_number,
+                ).first()
 
             if not review:
                 review = Review(
@@ -129,23 +349,28 @@ try:
                 db.add(review)
                 db.commit()
                 db.refresh(review)
-
-            # Merge all findings from each review pass
-            all_findings_raw = (
-                req_result.get("findings", [])
-                + sec_result.get("findings", [])
-                + perf_result.get("findings", [])
-                + quality_result.get("findings", [])
+                _refresh_rollup(db, review)
+
+            # Carried findings were folded into the pass results for
+            # scoring; they are copied as rows by _carry_over_findings
+            combined = aggregator.combine_pass_results(
+                {"requirements": req_result, "security": sec_result,
+                 "performance": perf_result, "quality": quality_result},
+                exclude=carried_preview,
             )
 
-            combined = {"findings": all_findings_raw}
-            combined.update(req_result)
-            combined.update(sec_result)
-            combined.update(perf_result)
+            # Replace this review's earlier findings, keeping those for
+            # files an incremental run did not re-review.
+            carried = _carry_over_findings(db, previous, review, unchanged)
 
-            findings = aggregator.create_findings(review.id, combined, diff_analysis)
-            for finding in findings:
-                db.add(finding)
+            # One executemany INSERT for all new findings, committed in the
+            # same transaction as the review update below.
+            finding_rows = aggregator.build_finding_rows(
+                review.id, combined, {**diff_analysis, "issues": security_issues}, diff_index
+            )
+            if finding_rows:
+                db.execute(insert(Finding), finding_rows)
+            findings = carried + [Finding(**row) for row in finding_rows]
 
             # Update review record
             overall = aggregator.aggregate_scores(
@@ -165,8 +390,11 @@ try:
             review.confidence_score = confidence_result["confidence_score"]
             review.verdict = confidence_result["verdict"]
             review.score_breakdown = confidence_result["breakdown"]
+            review.file_fingerprints = fingerprints
             db.commit()
 
+            _refresh_rollup(db, review)
+
             # ── 6. Post GitHub Comment ──────────────────────────────
             print(f"[worker] Posting GitHub comment...")
             try:
@@ -174,7 +402,7 @@ try:
                     confidence_result, findings, review
                 )
                 github_client.post_review_comment(
-                    repo_client, pr_number, comment_body
+                    installation_id, repo_name, pr_number, comment_body
                 )
             except Exception as comment_err:
                 print(f"[worker] Warning: Could not post GitHub comment: {comment_err}")
@@ -186,19 +414,121 @@ try:
                 "confidence_score": confidence_result["confidence_score"],
                 "verdict": confidence_result["verdict"],
                 "findings_count": len(findings),
+                "llm_cache": llm_reviewer.cache.stats() if llm_reviewer.cache else None,
             }
 
+        except Superseded:
+            db.rollback()
+            _refresh_rollup(db, review)
+            print(f"[worker] Discarding {repo_name}#{pr_number}@{head_sha}: superseded by a newer push")
+            return {"status": "superseded", "review_id": review_id}
+        except RateLimited:
+            # The task re-queues itself once the budget resets
+            db.rollback()
+            if review:
+                review.status = "pending"
+                db.commit()
+            raise
         except Exception:
             import traceback
             traceback.print_exc()
             if review:
                 review.status = "error"
                 db.commit()
+                _refresh_rollup(db, review)
             raise
         finally:
             db.close()
 
 
+    def _refresh_rollup(db, review):
+        """Best-effort refresh of the review's metrics rollup bucket."""
+        if review is None:
+            return
+        try:
+            refresh_for_review(db, review)
+        except Exception as rollup_err:
+            db.rollback()
+            print(f"[worker] Warning: Could not update metrics rollup: {rollup_err}")
+
+
+    def _ensure_current(db, review, head_sha):
+        """Raise Superseded if the review now tracks a different head SHA."""
+        if review is None or not head_sha:
+            return
+        db.refresh(review)
+        if review.head_sha and review.head_sha != head_sha:
+            raise Superseded()
+
+
+    def _copy_review_result(db, previous, review, files):
+        """Complete ``review`` with ``previous``'s verdict and findings."""
+        _carry_over_findings(db, previous, review, files)
+        review.summary = previous.summary
+        review.confidence_score = previous.confidence_score
+        review.verdict = previous.verdict
+        review.score_breakdown = previous.score_breakdown
+        review.file_fingerprints = previous.file_fingerprints
+        review.status = "completed"
+        review.completed_at = datetime.now(timezone.utc)
+        db.commit()
+
+
+    def _build_diff(files):
+        """Rebuild a unified diff from per-file patches."""
+        return "\n".join(
+            f"--- a/{f['filename']}\n+++ b/{f['filename']}\n{f['patch']}"
+            for f in files
+            if f.get("patch")
+        )
+
+
+    def _latest_fingerprinted_review(db, repo_name, pr_number):
+        """Most recent completed review of this PR that stored file fingerprints."""
+        return db.query(Review).filter(
+            Review.repo_name == repo_name,
+            Review.pr_number == pr_number,
+            Review.status == "completed",
+            Review.file_fingerprints.isnot(None),
+        ).order_by(Review.completed_at.desc()).first()
+
+
+    def _findings_for_files(db, review_id, files):
+        """Findings of ``review_id`` located in one of ``files``."""
+        return [
+            f for f in db.query(Finding).filter(Finding.review_id == review_id).all()
+            if f.file_path and f.file_path in files
+        ]
+
+
+    def _carry_over_findings(db, previous, review, unchanged_files):
+        """Keep findings for ``unchanged_files`` and drop the rest.
+
+        Findings are carried from ``previous`` onto ``review`` (copied if
+        they are different rows). PR-level findings without a file path
+        are always regenerated.
+        """
+        source_id = previous.id if previous is not None else review.id
+        kept = _findings_for_files(db, source_id, unchanged_files)
+
+        if source_id == review.id:
+            db.query(Finding).filter(
+                Finding.review_id == review.id,
+                Finding.id.notin_([f.id for f in kept]),
+            ).delete(synchronize_session=False)
+            return kept
+
+        db.query(Finding).filter(Finding.review_id == review.id).delete(synchronize_session=False)
+        columns = [c.name for c in Finding.__table__.columns if c.name != "id"]
+        rows = [
+            {**{name: getattr(f, name) for name in columns}, "review_id": review.id}
+            for f in kept
+        ]
+        if rows:
+            db.execute(insert(Finding), rows)
+        return [Finding(**row) for row in rows]
+
+
     def _format_github_comment(confidence_result, findings, review):
         """Format the AI review as a GitHub PR comment."""
         score = confidence_result["confidence_score"]
@@ -284,11 +614,25 @@ except Exception:
     # Celery (or other optional deps) not available — provide a no-op
     # analyze_pull_request with a .delay attribute so callers can use
     # `analyze_pull_request.delay(...)` without raising ImportError.
-    def analyze_pull_request(repo_name: str, pr_number: int, installation_id: int):
+    def analyze_pull_request(repo_name: str, pr_number: int, installation_id: int,
+                             incremental: bool = False, head_sha: str = None,
+                             review_id: int = None, lane: str = None,
+                             ready_at: float = None):
         print(f"[worker] Celery not available — skipping analysis for {repo_name}#{pr_number}")
         return {"status": "skipped"}
 
-    def _delay(repo_name: str, pr_number: int, installation_id: int):
-        return analyze_pull_request(repo_name, pr_number, installation_id)
+    def _delay(repo_name: str, pr_number: int, installation_id: int, **kwargs):
+        return analyze_pull_request(repo_name, pr_number, installation_id, **kwargs)
+
+    analyze_pull_request.delay = _delay
+
+    def enqueue_analysis(repo_name: str, pr_number: int, installation_id: int,
+                         incremental: bool = False, head_sha: str = None,
+                         review_id: int = None, countdown: float = 0,
+                         lane: str = None):
+        analyze_pull_request(repo_name, pr_number, installation_id,
+                             incremental=incremental, head_sha=head_sha, review_id=review_id)
+        return None
 
-    analyze_pull_request.delay = _delay
\ No newline at end of file
+    def revoke_analysis(task_id: str):
+        pass
\ No newline at end of file